@@ -2,7 +2,14 @@ from django.contrib import admin
 
 from .models import Category, Ingredient, Recipe, RecipeIngredient
 
+
+class RecipeAdmin(admin.ModelAdmin):
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        form.instance.update_ingredients_index()
+
+
 admin.site.register(Ingredient)
 admin.site.register(RecipeIngredient)
 admin.site.register(Category)
-admin.site.register(Recipe)
+admin.site.register(Recipe, RecipeAdmin)
@@ -1,29 +1,115 @@
+from catalogs.mixins import SparseFieldsetsMixin
 from catalogs.models import Category, Ingredient, Recipe
+from catalogs.names import get_ingredient_names_index
+from catalogs.pagination import NamesPagination, RecipesPagination
+from catalogs.search import search_recipes
 from catalogs.serializers import (
     CategorySerializer,
+    IngredientAutocompleteParametersSerializer,
     IngredientSerializer,
+    RecipeSearchParametersSerializer,
     RecipeSerializer,
 )
 from rest_framework import authentication, permissions, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from versions.mixins import ConditionalListMixin
 
 
-class IngredientViewSet(viewsets.ModelViewSet):
+class IngredientViewSet(ConditionalListMixin, viewsets.ModelViewSet):
     queryset = Ingredient.objects.all()
     permission_classes = [permissions.AllowAny]
     authentication_classes = [authentication.TokenAuthentication]
     serializer_class = IngredientSerializer
+    pagination_class = NamesPagination
+    versioned_by = ("catalogs",)
     lookup_field = "name"
 
+    @action(detail=False, methods=["get"])
+    def autocomplete(self, request):
+        """Give the ingredients whose name starts with the query parameter ``q``.
 
-class RecipeViewSet(viewsets.ModelViewSet):
-    queryset = Recipe.objects.all()
+        Accents and case are ignored. Only the ``limit`` first ingredients (10 by
+        default) are returned, sorted by name. They are read from the in-memory
+        index of catalogs.names, not from the database.
+
+        """
+        parameters = IngredientAutocompleteParametersSerializer(
+            data=request.query_params
+        )
+        parameters.is_valid(raise_exception=True)
+        names = get_ingredient_names_index().complete(
+            parameters.validated_data["q"], parameters.validated_data["limit"]
+        )
+        return Response([{"name": name} for name in names])
+
+
+class RecipeViewSet(SparseFieldsetsMixin, ConditionalListMixin, viewsets.ModelViewSet):
+    """Provides a CRUD API for recipes.
+
+    The recipes are read with their ingredients and categories (see
+    RecipeQuerySet.with_ingredients), so that listing or retrieving them costs a
+    number of queries that depends neither on the number of recipes nor on the
+    number of their ingredients.
+
+    When the ``limit`` or ``cursor`` query parameter is given, only a page of
+    the recipes is returned, by creation date, with a cursor to the next one.
+    The ``fields`` query parameter restricts the returned fields, for example
+    ``fields=id,title,duration`` leaves out the description, the ingredients
+    and the categories, which are then not read from the database.
+
+    """
+
+    queryset = Recipe.objects.with_ingredients()
     permission_classes = [permissions.AllowAny]
     authentication_classes = [authentication.TokenAuthentication]
     serializer_class = RecipeSerializer
+    pagination_class = RecipesPagination
+    versioned_by = ("catalogs", "units")
+
+    def get_queryset(self):
+        fields = self.get_requested_fields()
+        queryset = Recipe.objects.all()
+        if fields is None or "ingredients" in fields:
+            queryset = queryset.with_recipe_ingredients()
+        if fields is None or "categories" in fields:
+            queryset = queryset.prefetch_related("categories")
+        return self.defer_unused_fields(queryset)
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """Search the recipes by title and description, with the query parameter ``q``.
+
+        The recipes are sorted by relevance (see catalogs.search). Only the
+        ``limit`` first ones (20 by default) are returned, after skipping
+        ``offset`` ones, with the URL of the ``next`` results, if any.
+
+        """
+        parameters = RecipeSearchParametersSerializer(data=request.query_params)
+        parameters.is_valid(raise_exception=True)
+        query, limit, offset = (
+            parameters.validated_data[name] for name in ("q", "limit", "offset")
+        )
+        # one more recipe tells whether there are next results
+        recipes = search_recipes(query, limit + 1, offset)
+        next_url = None
+        if len(recipes) > limit:
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "offset", offset + limit
+            )
+        return Response(
+            {
+                "next": next_url,
+                "results": self.get_serializer(recipes[:limit], many=True).data,
+            }
+        )
 
 
-class CategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class CategoryViewSet(ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Category.objects.all()
     permission_classes = [permissions.AllowAny]
     authentication_classes = [authentication.TokenAuthentication]
     serializer_class = CategorySerializer
+    pagination_class = NamesPagination
+    versioned_by = ("catalogs",)
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class CatalogsConfig(AppConfig):
     name = "catalogs"
+
+    def ready(self):
+        from catalogs import names  # noqa: F401
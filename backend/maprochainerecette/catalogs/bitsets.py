@@ -0,0 +1,29 @@
+"""Encoding of sets of catalog ingredients as bitsets.
+
+Each catalog ingredient used by a recipe is given a fixed bit position
+(Ingredient.bit), and the ingredients of each recipe are stored as a bitset
+(Recipe.ingredients_bitset). As the positions and the bitsets are stored in
+the database, they are shared by all the processes. They are only read by the
+vectorized matching engine (see fridge.vectorized), which checks them as words
+of 64 bits; the default matching engine finds the recipes of the fridge
+ingredients with the ingredient to recipes index instead.
+
+"""
+
+
+def to_bitset(bits):
+    """Give the integer whose set bits are the given positions."""
+    bitset = 0
+    for bit in bits:
+        bitset |= 1 << bit
+    return bitset
+
+
+def encode(bitset):
+    """Encode a bitset into bytes, to store it in a BinaryField."""
+    return bitset.to_bytes((bitset.bit_length() + 7) // 8, "little")
+
+
+def decode(value):
+    """Decode a bitset stored in a BinaryField (bytes or memoryview)."""
+    return int.from_bytes(bytes(value), "little")
@@ -0,0 +1,92 @@
+import datetime
+import random
+import statistics
+import time
+
+from catalogs.models import Recipe
+from catalogs.search import search_recipes
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+BATCH_SIZE = 5000
+# Like real recipes, each recipe has a few ingredients among many, named in its
+# title and in its description, the rest of which is made of common words: the
+# searched words are only in a fraction of the recipes.
+INGREDIENTS = (
+    "tomate courgette aubergine poivron oignon échalote ail carotte poireau "
+    "pomme poire citron fraise framboise chocolat vanille crème beurre farine "
+    "sucre œuf lait riz pâtes lentilles pois chiches saumon cabillaud poulet "
+    "bœuf agneau porc jambon fromage chèvre comté basilic persil ciboulette "
+    "thym romarin laurier cumin curry"
+).split()
+DISHES = (
+    "gratin tarte soupe salade velouté risotto ragoût quiche clafoutis crumble "
+    "mousse sauté rôti braisé"
+).split()
+COMMON_WORDS = (
+    "faire revenir dans une poêle avec un peu de huile puis ajouter le sel et "
+    "poivre laisser cuire à feu doux pendant minutes remuer temps en servir chaud "
+    "couper morceaux éplucher laver égoutter mélanger verser au four préchauffé "
+    "degrés plat bol saladier cuillère pincée les des du la sur fin jusqu'à ce que "
+    "soit doré réserver casserole eau bouillante émincer hacher finement "
+    "assaisonner napper décorer tiède froid réfrigérateur heures"
+).split()
+INGREDIENTS_PER_RECIPE = 8
+DESCRIPTION_LENGTH = 80
+QUERIES = ["tomate", "gratin courgette", "choc", "salade chèvre", "soupe poireau"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures the time needed to search the recipes. The recipes needed by the "
+        "benchmark are created in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes", type=int, default=100000, help="Number of recipes."
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=20, help="Number of runs of each query."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._create_recipes(options["recipes"])
+            self.stdout.write(
+                f"{options['recipes']} recipes on {connection.vendor}, "
+                f"median and maximum times of {options['repeat']} searches "
+                "of the 20 best recipes:"
+            )
+            for query in QUERIES:
+                times = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    search_recipes(query, 20)
+                    times.append(time.perf_counter() - start)
+                self.stdout.write(
+                    f"  {query!r}: {statistics.median(times) * 1000:.1f} ms, "
+                    f"{max(times) * 1000:.1f} ms"
+                )
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def _create_recipes(count):
+        generator = random.Random(0)  # noqa: S311
+        for first in range(0, count, BATCH_SIZE):
+            Recipe.objects.bulk_create(
+                _recipe(generator) for _ in range(first, min(first + BATCH_SIZE, count))
+            )
+
+
+def _recipe(generator):
+    ingredients = generator.sample(INGREDIENTS, INGREDIENTS_PER_RECIPE)
+    words = ingredients + generator.choices(
+        COMMON_WORDS, k=DESCRIPTION_LENGTH - INGREDIENTS_PER_RECIPE
+    )
+    generator.shuffle(words)
+    return Recipe(
+        title=" ".join([generator.choice(DISHES), *ingredients[:2]]),
+        description=" ".join(words),
+        duration=datetime.timedelta(minutes=30),
+    )
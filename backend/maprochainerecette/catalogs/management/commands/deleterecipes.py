@@ -1,4 +1,10 @@
-from catalogs.models import Category, Ingredient, Recipe, RecipeIngredient
+from catalogs.models import (
+    Category,
+    Ingredient,
+    IngredientRecipeIndex,
+    Recipe,
+    RecipeIngredient,
+)
 from django.core.management.base import BaseCommand, CommandError
 from django.db.models import ProtectedError
 from units.models import Unit, UnitType
@@ -10,6 +16,7 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         try:
+            IngredientRecipeIndex.objects.all().delete()
             Recipe.objects.all().delete()
             Category.objects.all().delete()
             RecipeIngredient.objects.all().delete()
@@ -0,0 +1,92 @@
+# Generated by Django 4.1.2 on 2026-10-18 12:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import uuid
+
+
+def build_ingredients_index(apps, schema_editor):
+    Recipe = apps.get_model("catalogs", "Recipe")
+    IngredientRecipeIndex = apps.get_model("catalogs", "IngredientRecipeIndex")
+    for recipe in Recipe.objects.all():
+        ingredient_ids = set(recipe.ingredients.values_list("ingredient", flat=True))
+        IngredientRecipeIndex.objects.bulk_create(
+            IngredientRecipeIndex(ingredient_id=ingredient_id, recipe=recipe)
+            for ingredient_id in ingredient_ids
+        )
+        recipe.ingredients_count = len(ingredient_ids)
+        recipe.save(update_fields=["ingredients_count"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="recipe",
+            name="ingredients_count",
+            field=models.PositiveIntegerField(
+                default=0,
+                editable=False,
+                verbose_name="Number of distinct catalog ingredients",
+            ),
+        ),
+        migrations.CreateModel(
+            name="IngredientRecipeIndex",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "ingredient",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recipes_index",
+                        to="catalogs.ingredient",
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="ingredients_index",
+                        to="catalogs.recipe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="ingredientrecipeindex",
+            constraint=models.UniqueConstraint(
+                fields=("ingredient", "recipe"), name="unique_ingredient_recipe_index"
+            ),
+        ),
+        migrations.RunPython(build_ingredients_index, migrations.RunPython.noop),
+    ]
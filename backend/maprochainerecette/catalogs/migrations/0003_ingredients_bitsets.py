@@ -0,0 +1,51 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:21
+
+from django.db import migrations, models
+
+
+def build_ingredients_bitsets(apps, schema_editor):
+    Ingredient = apps.get_model("catalogs", "Ingredient")
+    Recipe = apps.get_model("catalogs", "Recipe")
+    IngredientRecipeIndex = apps.get_model("catalogs", "IngredientRecipeIndex")
+    used_ingredients = Ingredient.objects.filter(
+        id__in=IngredientRecipeIndex.objects.values("ingredient")
+    ).order_by("id")
+    for bit, ingredient in enumerate(used_ingredients):
+        ingredient.bit = bit
+        ingredient.save(update_fields=["bit"])
+    for recipe in Recipe.objects.all():
+        bitset = 0
+        for bit in recipe.ingredients_index.values_list("ingredient__bit", flat=True):
+            bitset |= 1 << bit
+        recipe.ingredients_bitset = bitset.to_bytes(
+            (bitset.bit_length() + 7) // 8, "little"
+        )
+        recipe.save(update_fields=["ingredients_bitset"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0002_ingredientrecipeindex"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="ingredient",
+            name="bit",
+            field=models.PositiveIntegerField(
+                editable=False,
+                null=True,
+                unique=True,
+                verbose_name="Position in the recipes ingredients bitsets",
+            ),
+        ),
+        migrations.AddField(
+            model_name="recipe",
+            name="ingredients_bitset",
+            field=models.BinaryField(
+                default=b"", verbose_name="Bitset of the catalog ingredients"
+            ),
+        ),
+        migrations.RunPython(build_ingredients_bitsets, migrations.RunPython.noop),
+    ]
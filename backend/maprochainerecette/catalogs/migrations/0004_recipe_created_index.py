@@ -0,0 +1,19 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0003_ingredients_bitsets"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="recipe",
+            index=models.Index(
+                fields=["created", "id"], name="catalogs_re_created_751458_idx"
+            ),
+        ),
+    ]
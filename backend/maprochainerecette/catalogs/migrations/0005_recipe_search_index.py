@@ -0,0 +1,81 @@
+from django.db import migrations
+
+SQLITE_INDEX = [
+    """
+    CREATE VIRTUAL TABLE catalogs_recipe_fts USING fts5(
+        recipe_id, title, description, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER catalogs_recipe_fts_insert AFTER INSERT ON catalogs_recipe
+    BEGIN
+        INSERT INTO catalogs_recipe_fts (recipe_id, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER catalogs_recipe_fts_update
+    AFTER UPDATE OF id, title, description ON catalogs_recipe
+    BEGIN
+        DELETE FROM catalogs_recipe_fts
+        WHERE catalogs_recipe_fts MATCH 'recipe_id : "' || old.id || '"';
+        INSERT INTO catalogs_recipe_fts (recipe_id, title, description)
+        VALUES (new.id, new.title, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER catalogs_recipe_fts_delete AFTER DELETE ON catalogs_recipe
+    BEGIN
+        DELETE FROM catalogs_recipe_fts
+        WHERE catalogs_recipe_fts MATCH 'recipe_id : "' || old.id || '"';
+    END
+    """,
+    """
+    INSERT INTO catalogs_recipe_fts (recipe_id, title, description)
+    SELECT id, title, description FROM catalogs_recipe
+    """,
+]
+
+SQLITE_DROP_INDEX = [
+    "DROP TRIGGER catalogs_recipe_fts_insert",
+    "DROP TRIGGER catalogs_recipe_fts_update",
+    "DROP TRIGGER catalogs_recipe_fts_delete",
+    "DROP TABLE catalogs_recipe_fts",
+]
+
+POSTGRESQL_INDEX = [
+    """
+    CREATE INDEX catalogs_recipe_search_idx ON catalogs_recipe USING GIN ((
+        setweight(to_tsvector('french', title), 'A')
+        || setweight(to_tsvector('french', description), 'B')
+    ))
+    """
+]
+
+POSTGRESQL_DROP_INDEX = ["DROP INDEX catalogs_recipe_search_idx"]
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, SQLITE_INDEX, POSTGRESQL_INDEX)
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor, SQLITE_DROP_INDEX, POSTGRESQL_DROP_INDEX)
+
+
+def _execute(schema_editor, sqlite_statements, postgresql_statements):
+    statements = {
+        "sqlite": sqlite_statements,
+        "postgresql": postgresql_statements,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0004_recipe_created_index"),
+    ]
+
+    operations = [migrations.RunPython(create_search_index, drop_search_index)]
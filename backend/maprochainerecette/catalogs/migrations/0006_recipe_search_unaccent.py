@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# The french configuration keeps the accents, which the unaccent dictionary
+# removes before the stemming, like the remove_diacritics option of the FTS5
+# tokenizer on SQLite.
+POSTGRESQL_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    "CREATE TEXT SEARCH CONFIGURATION french_unaccent (COPY = french)",
+    """
+    ALTER TEXT SEARCH CONFIGURATION french_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, french_stem
+    """,
+    "DROP INDEX catalogs_recipe_search_idx",
+    """
+    CREATE INDEX catalogs_recipe_search_idx ON catalogs_recipe USING GIN ((
+        setweight(to_tsvector('french_unaccent', title), 'A')
+        || setweight(to_tsvector('french_unaccent', description), 'B')
+    ))
+    """,
+]
+
+POSTGRESQL_DROP_INDEX = [
+    "DROP INDEX catalogs_recipe_search_idx",
+    """
+    CREATE INDEX catalogs_recipe_search_idx ON catalogs_recipe USING GIN ((
+        setweight(to_tsvector('french', title), 'A')
+        || setweight(to_tsvector('french', description), 'B')
+    ))
+    """,
+    "DROP TEXT SEARCH CONFIGURATION french_unaccent",
+]
+
+
+def create_unaccent_search_index(apps, schema_editor):
+    _execute(schema_editor, POSTGRESQL_INDEX)
+
+
+def drop_unaccent_search_index(apps, schema_editor):
+    _execute(schema_editor, POSTGRESQL_DROP_INDEX)
+
+
+def _execute(schema_editor, postgresql_statements):
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in postgresql_statements:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0005_recipe_search_index"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_unaccent_search_index, drop_unaccent_search_index)
+    ]
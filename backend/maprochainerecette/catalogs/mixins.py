@@ -0,0 +1,73 @@
+from rest_framework import exceptions, permissions
+
+
+class SparseFieldsetsMixin:
+    """Let the clients choose the fields of the objects they read.
+
+    The ``fields`` query parameter of a GET request gives the comma separated
+    names of the fields of the serializer to return. The view should read its
+    queryset through defer_unused_fields, so that the columns of the model
+    that are not returned are not loaded either.
+
+    """
+
+    fields_query_param = "fields"
+
+    def get_requested_fields(self):
+        """Give the names of the fields asked for, or None to return all the fields.
+
+        Raises:
+            ValidationError: a field is unknown.
+
+        """
+        request = self.request  # type: ignore[attr-defined]
+        if (
+            request.method not in permissions.SAFE_METHODS
+            or self.fields_query_param not in request.query_params
+        ):
+            return None
+        fields: set = set(
+            filter(None, request.query_params[self.fields_query_param].split(","))
+        )
+        unknown = ", ".join(sorted(fields - set(self._serializer_fields())))
+        if unknown:
+            raise exceptions.ValidationError(
+                {self.fields_query_param: [f"Unknown fields: {unknown}."]}
+            )
+        return fields
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)  # type: ignore[misc]
+        fields = self.get_requested_fields()
+        if fields is not None:
+            child = getattr(serializer, "child", serializer)
+            for name in set(child.fields) - fields:
+                child.fields.pop(name)
+        return serializer
+
+    def defer_unused_fields(self, queryset):
+        """Defer the loading of the model fields that are not returned, on GET requests.
+
+        The fields of the ordering of the pagination are always loaded.
+
+        """
+        request = self.request  # type: ignore[attr-defined]
+        if request.method not in permissions.SAFE_METHODS:
+            return queryset
+        fields = self.get_requested_fields()
+        if fields is None:
+            fields = set(self._serializer_fields())
+        paginator = self.paginator  # type: ignore[attr-defined]
+        fields |= {
+            name.lstrip("-") for name in getattr(paginator, "ordering", None) or ()
+        }
+        return queryset.defer(
+            *(
+                field.name
+                for field in queryset.model._meta.concrete_fields
+                if not field.primary_key and field.name not in fields
+            )
+        )
+
+    def _serializer_fields(self):
+        return self.get_serializer_class()().fields  # type: ignore[attr-defined]
@@ -1,17 +1,162 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from model_utils.models import TimeStampedModel
 from units.models import Unit
+from versions.models import VersionStamp
+
+from . import bitsets
+from .signals import recipe_ingredients_changed
+
+
+class IngredientQuerySet(models.QuerySet):
+    def assign_bits(self):
+        """Give a bit position to the ingredients that do not have one yet.
+
+        Positions are never changed once given, so that the stored bitsets
+        stay valid. Concurrent assignments are serialized, so that they never
+        give the same position twice.
+
+        Returns:
+            A dictionary giving the bit position of each ingredient id.
+
+        """
+        positions = dict(self.values_list("id", "bit"))
+        if None not in positions.values():
+            return positions
+        with transaction.atomic():
+            # Bumping the stamp locks its row until the end of the transaction,
+            # and takes the database write lock at once on SQLite, before the
+            # positions and the maximal one are read again.
+            VersionStamp.objects.bump("ingredient_bits")
+            positions = dict(self.values_list("id", "bit"))
+            next_bit = Ingredient.objects.aggregate(models.Max("bit"))["bit__max"]
+            next_bit = -1 if next_bit is None else next_bit
+            for ingredient_id in sorted(
+                ingredient_id for ingredient_id, bit in positions.items() if bit is None
+            ):
+                next_bit += 1
+                Ingredient.objects.filter(id=ingredient_id).update(bit=next_bit)
+                positions[ingredient_id] = next_bit
+        return positions
 
 
 class Ingredient(TimeStampedModel):
     name = models.CharField("Ingredient name", max_length=255, unique=True)
+    bit = models.PositiveIntegerField(
+        "Position in the recipes ingredients bitsets",
+        unique=True,
+        null=True,
+        editable=False,
+    )
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
+    objects = models.Manager.from_queryset(IngredientQuerySet)()
+
     def __str__(self) -> str:
         return self.name
 
+    def save(self, *args, **kwargs):
+        """Save the ingredient, keeping its stored bit position.
+
+        The bit position is only given by IngredientQuerySet.assign_bits, which
+        updates the database directly, so an instance loaded before would clear
+        it otherwise. It is read again before a save of all the fields of a
+        stored ingredient, which is still inserted when its row is gone.
+
+        """
+        if (
+            not self._state.adding
+            and not kwargs.get("force_insert")
+            and kwargs.get("update_fields") is None
+        ):
+            stored_bit = (
+                Ingredient.objects.filter(pk=self.pk)
+                .values_list("bit", flat=True)
+                .first()
+            )
+            if stored_bit is not None:
+                self.bit = stored_bit
+        super().save(*args, **kwargs)
+
+
+class RecipeQuerySet(models.QuerySet):
+    def covered_by(self, ingredients):
+        """Keep only the recipes whose ingredients are all among the given ones.
+
+        The matching is done with the ingredient to recipes index, so its cost
+        depends on the number of given ingredients rather than on the size of
+        the catalog. Recipes without any ingredient are never returned.
+
+        Args:
+            ingredients: a queryset, or a list, of catalog ingredients or of their ids.
+
+        Returns:
+            The filtered queryset.
+
+        """
+        covered_recipes = (
+            IngredientRecipeIndex.objects.filter(ingredient__in=ingredients)
+            .values("recipe", "recipe__ingredients_count")
+            .annotate(covered_count=models.Count("ingredient"))
+            .filter(covered_count=models.F("recipe__ingredients_count"))
+            .values("recipe")
+        )
+        return self.filter(id__in=covered_recipes)
+
+    def update_ingredients_bitsets(self):
+        """Rebuild the ingredients bitsets of the recipes from the ingredient to recipes index.
+
+        Useful after recipes have been created in bulk, without calling
+        Recipe.update_ingredients_index. The bulk update sends no signal, so
+        the "ingredient_bits" version stamp is bumped, like by assign_bits.
+
+        """
+        with transaction.atomic():
+            VersionStamp.objects.bump("ingredient_bits")
+            index_entries = IngredientRecipeIndex.objects.filter(recipe__in=self)
+            positions = Ingredient.objects.filter(
+                id__in=index_entries.values("ingredient")
+            ).assign_bits()
+            recipes_bits: dict = {
+                recipe_id: [] for recipe_id in self.values_list("id", flat=True)
+            }
+            for recipe_id, ingredient_id in index_entries.values_list(
+                "recipe", "ingredient"
+            ):
+                recipes_bits[recipe_id].append(positions[ingredient_id])
+            Recipe.objects.bulk_update(
+                [
+                    Recipe(
+                        id=recipe_id,
+                        ingredients_bitset=bitsets.encode(bitsets.to_bitset(bits)),
+                    )
+                    for recipe_id, bits in recipes_bits.items()
+                ],
+                ["ingredients_bitset"],
+                batch_size=1000,
+            )
+
+    def with_ingredients(self):
+        """Prefetch the recipe ingredients, their catalog ingredient and unit, and the categories.
+
+        Recipes loaded this way can be serialized, or checked against the fridge,
+        with a number of queries that does not depend on the number of recipes.
+
+        """
+        return self.with_recipe_ingredients().prefetch_related("categories")
+
+    def with_recipe_ingredients(self):
+        """Prefetch the recipe ingredients, with their catalog ingredient and unit."""
+        return self.prefetch_related(
+            models.Prefetch(
+                "ingredients",
+                queryset=RecipeIngredient.objects.select_related(
+                    "ingredient", "unit__type"
+                ),
+            )
+        )
+
 
 class Recipe(TimeStampedModel):
     title = models.CharField("Title of the recipe", max_length=255)
@@ -19,11 +164,44 @@ class Recipe(TimeStampedModel):
     duration = models.DurationField("Total duration of the recipe")
     ingredients = models.ManyToManyField("RecipeIngredient")
     categories = models.ManyToManyField("Category")
+    ingredients_count = models.PositiveIntegerField(
+        "Number of distinct catalog ingredients", default=0, editable=False
+    )
+    ingredients_bitset = models.BinaryField(
+        "Bitset of the catalog ingredients", default=b"", editable=False
+    )
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 
+    objects = models.Manager.from_queryset(RecipeQuerySet)()
+
+    class Meta:
+        # for the pagination of the recipes (see catalogs.pagination)
+        indexes = [models.Index(fields=["created", "id"])]
+
     def __str__(self) -> str:
         return self.title
 
+    def update_ingredients_index(self):
+        """Synchronize the ingredient to recipes index with the recipe ingredients.
+
+        The ingredients count and the ingredients bitset of the recipe are
+        updated too. Must be called each time the ingredients of the recipe are
+        changed. The recipe_ingredients_changed signal is sent once the index is
+        updated.
+
+        """
+        ingredient_ids = set(self.ingredients.values_list("ingredient", flat=True))
+        IngredientRecipeIndex.objects.filter(recipe=self).delete()
+        IngredientRecipeIndex.objects.bulk_create(
+            IngredientRecipeIndex(ingredient_id=ingredient_id, recipe=self)
+            for ingredient_id in ingredient_ids
+        )
+        positions = Ingredient.objects.filter(id__in=ingredient_ids).assign_bits()
+        self.ingredients_count = len(ingredient_ids)
+        self.ingredients_bitset = bitsets.encode(bitsets.to_bitset(positions.values()))
+        self.save(update_fields=["ingredients_count", "ingredients_bitset"])
+        recipe_ingredients_changed.send(sender=self.__class__, recipe=self)
+
 
 class RecipeIngredient(TimeStampedModel):
     ingredient = models.ForeignKey(Ingredient, on_delete=models.PROTECT)
@@ -35,6 +213,28 @@ class RecipeIngredient(TimeStampedModel):
         return self.ingredient.name
 
 
+class IngredientRecipeIndex(TimeStampedModel):
+    """Inverted index giving, for a catalog ingredient, the recipes that need it."""
+
+    ingredient = models.ForeignKey(
+        Ingredient, on_delete=models.CASCADE, related_name="recipes_index"
+    )
+    recipe = models.ForeignKey(
+        Recipe, on_delete=models.CASCADE, related_name="ingredients_index"
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ingredient", "recipe"], name="unique_ingredient_recipe_index"
+            )
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.ingredient} -> {self.recipe}"
+
+
 class Category(TimeStampedModel):
     name = models.CharField("Category name", max_length=255, unique=True)
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -0,0 +1,460 @@
+"""In-memory index of the names of the catalog ingredients.
+
+The names are normalized (see normalize) and indexed twice, without querying
+the database:
+
+- for their autocompletion, they are kept sorted, so that the names starting
+  with a prefix are found by bisection (see PrefixIndex),
+- for the resolution of the names with typos, they are kept in a BK-tree, so
+  that the names within an edit distance of a given one are found without
+  comparing it with all of them (see BKTree and resolve_ingredient_names).
+
+Each process has its own index, loaded on first use. It is patched with the
+ingredients saved or deleted by the process once their transaction is committed,
+and loaded again when it is older than MAX_AGE seconds, to get the changes made
+by the other processes, or without sending the model signals (bulk_create,
+update on a queryset, ...). This reload is done by a background thread, along
+with the BK-tree if the previous index had built it, while the previous index
+keeps being used, so that no request waits for it. The patches committed
+during the reload are applied to both indexes.
+
+"""
+import bisect
+import threading
+import time
+import unicodedata
+
+from catalogs.models import Ingredient
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+MAX_AGE = 300
+# maximal edit distance of a name with a typo to the normalized name it matches
+MAX_DISTANCE = 2
+
+# guards the variables below, and is only held to read or set them
+_index_lock = threading.Lock()
+# serializes the loads of the index, which read the database
+_load_lock = threading.Lock()
+_index = None
+_loading = _reloading = False
+# the patches committed during a load, as tuples (ingredient id, name or None)
+_patches: list = []
+
+
+def normalize(name):
+    """Give the form of a name used to compare it, without accents and case.
+
+    Args:
+        name: a name.
+
+    Returns:
+        The name without its diacritical marks, case folded.
+
+    """
+    decomposed = unicodedata.normalize("NFKD", name)
+    return "".join(
+        character for character in decomposed if not unicodedata.combining(character)
+    ).casefold()
+
+
+class PrefixIndex:
+    """Names sorted by normalized form, searchable by prefix.
+
+    Args:
+        names: a dictionary giving the name of each ingredient id.
+
+    """
+
+    def __init__(self, names):
+        self._lock = threading.Lock()
+        self._names = dict(names)
+        self._entries = sorted((normalize(name), name) for name in self._names.values())
+        self._keys = [key for key, _ in self._entries]
+
+    def complete(self, prefix, limit):
+        """Give the names starting with a prefix, ignoring accents and case.
+
+        Args:
+            prefix: the start of the names.
+            limit: the maximum number of names to give.
+
+        Returns:
+            A list of names, sorted by normalized form.
+
+        """
+        prefix = normalize(prefix)
+        with self._lock:
+            position = bisect.bisect_left(self._keys, prefix)
+            end = position + limit
+            names = []
+            for key, name in self._entries[position:end]:
+                if not key.startswith(prefix):
+                    break
+                names.append(name)
+        return names
+
+    def set(self, ingredient_id, name):
+        """Add an ingredient name, or replace the name of the ingredient."""
+        with self._lock:
+            self._remove(ingredient_id)
+            self._names[ingredient_id] = name
+            entry = normalize(name), name
+            position = bisect.bisect_left(self._entries, entry)
+            self._entries.insert(position, entry)
+            self._keys.insert(position, entry[0])
+
+    def remove(self, ingredient_id):
+        """Remove the name of an ingredient, if it is in the index."""
+        with self._lock:
+            self._remove(ingredient_id)
+
+    def _remove(self, ingredient_id):
+        name = self._names.pop(ingredient_id, None)
+        if name is not None:
+            position = bisect.bisect_left(self._entries, (normalize(name), name))
+            del self._entries[position]
+            del self._keys[position]
+
+
+class BKTree:
+    """Names indexed by the edit distance between their normalized forms.
+
+    Each node of the tree keeps the names of a normalized form, and its children
+    by their distance to it. By the triangle inequality, the names within a
+    distance k of a searched name are only under the children at a distance
+    between d - k and d + k of a node at distance d, so the search skips the
+    other subtrees.
+
+    Args:
+        names: a dictionary giving the name of each ingredient id.
+
+    """
+
+    def __init__(self, names):
+        self._lock = threading.Lock()
+        self._root = None
+        self._nodes: dict = {}
+        self._keys: dict = {}
+        for ingredient_id, name in names.items():
+            self._add(ingredient_id, name)
+
+    def closest(self, name, max_distance):
+        """Give the names closest to a name, ignoring accents and case.
+
+        Args:
+            name: the searched name.
+            max_distance: the maximal edit distance of the returned names.
+
+        Returns:
+            A sorted list of the names at the smallest edit distance from the
+            searched one, empty if there are none within max_distance.
+
+        """
+        distance = edit_distance_from(normalize(name))
+        best_distance = max_distance
+        names: list = []
+        with self._lock:
+            nodes = [self._root] if self._root is not None else []
+            while nodes:
+                node = nodes.pop()
+                node_distance = distance(node.key)
+                if node.names and node_distance <= best_distance:
+                    if node_distance < best_distance:
+                        best_distance = node_distance
+                        names = []
+                    names.extend(node.names.values())
+                nodes.extend(
+                    child
+                    for child_distance, child in node.children.items()
+                    if abs(child_distance - node_distance) <= best_distance
+                )
+        return sorted(names)
+
+    def set(self, ingredient_id, name):
+        """Add an ingredient name, or replace the name of the ingredient."""
+        with self._lock:
+            self._remove(ingredient_id)
+            self._add(ingredient_id, name)
+
+    def remove(self, ingredient_id):
+        """Remove the name of an ingredient, if it is in the tree."""
+        with self._lock:
+            self._remove(ingredient_id)
+
+    def _add(self, ingredient_id, name):
+        key = normalize(name)
+        self._keys[ingredient_id] = key
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._nodes[key] = _Node(key)
+            if self._root is None:
+                self._root = node
+            else:
+                distance = edit_distance_from(key)
+                parent = self._root
+                while (child_distance := distance(parent.key)) in parent.children:
+                    parent = parent.children[child_distance]
+                parent.children[child_distance] = node
+        node.names[ingredient_id] = name
+
+    def _remove(self, ingredient_id):
+        # the node is kept, even without names, as its children are under it
+        key = self._keys.pop(ingredient_id, None)
+        if key is not None:
+            del self._nodes[key].names[ingredient_id]
+
+
+class _Node:
+    __slots__ = ("key", "names", "children")
+
+    def __init__(self, key):
+        self.key = key
+        self.names: dict = {}
+        self.children: dict = {}
+
+
+def edit_distance_from(pattern):
+    """Give a function computing the Levenshtein distance of a text to a pattern.
+
+    The distance is computed with the bit-parallel algorithm of Myers, in the
+    version of Hyyrö, which updates a column of the distance matrix at once,
+    with the bits of integers, for each character of the text.
+
+    """
+    length = len(pattern)
+    matches: dict = {}
+    for position, character in enumerate(pattern):
+        matches[character] = matches.get(character, 0) | 1 << position
+    mask = (1 << length) - 1
+    last = 1 << (length - 1) if length else 0
+
+    def distance(text):
+        if not length:
+            return len(text)
+        positive, negative, score = mask, 0, length
+        for character in text:
+            equal = matches.get(character, 0)
+            vertical = equal | negative
+            horizontal = (((equal & positive) + positive) ^ positive) | equal
+            horizontal_positive = negative | ~(horizontal | positive)
+            horizontal_negative = positive & horizontal
+            if horizontal_positive & last:
+                score += 1
+            elif horizontal_negative & last:
+                score -= 1
+            horizontal_positive = (horizontal_positive << 1) | 1
+            horizontal_negative <<= 1
+            positive = (horizontal_negative | ~(vertical | horizontal_positive)) & mask
+            negative = horizontal_positive & vertical & mask
+        return score
+
+    return distance
+
+
+class IngredientNamesIndex:
+    """Prefix index and BK-tree of the ingredient names, patched together.
+
+    The BK-tree, longer to build, is only built when a name is first resolved.
+
+    Args:
+        names: a dictionary giving the name of each ingredient id.
+
+    """
+
+    def __init__(self, names):
+        self._lock = threading.Lock()
+        self._names = dict(names)
+        self._prefixes = PrefixIndex(names)
+        self._tree = None
+
+    def complete(self, prefix, limit):
+        """Give the names starting with a prefix (see PrefixIndex.complete)."""
+        return self._prefixes.complete(prefix, limit)
+
+    def closest(self, name):
+        """Give the names closest to a name (see BKTree.closest).
+
+        The maximal edit distance is MAX_DISTANCE, and less for short names, for
+        which a few edits give another ingredient.
+
+        """
+        return self.build_tree().closest(name, min(MAX_DISTANCE, len(name) // 4))
+
+    @property
+    def has_tree(self):
+        """Whether the BK-tree is built."""
+        return self._tree is not None
+
+    def build_tree(self):
+        """Build the BK-tree, if it is not built yet.
+
+        Returns:
+            The BK-tree.
+
+        """
+        with self._lock:
+            if self._tree is None:
+                self._tree = BKTree(self._names)
+            return self._tree
+
+    def set(self, ingredient_id, name):
+        """Add an ingredient name, or replace the name of the ingredient."""
+        with self._lock:
+            self._names[ingredient_id] = name
+            self._prefixes.set(ingredient_id, name)
+            if self._tree is not None:
+                self._tree.set(ingredient_id, name)
+
+    def remove(self, ingredient_id):
+        """Remove the name of an ingredient, if it is in the index."""
+        with self._lock:
+            self._names.pop(ingredient_id, None)
+            self._prefixes.remove(ingredient_id)
+            if self._tree is not None:
+                self._tree.remove(ingredient_id)
+
+
+def resolve_ingredient_names(names):
+    """Find the catalog ingredients of names that may contain typos.
+
+    The names are first searched as they are, with one query. Each name not
+    found is matched with the closest ingredient name of the index, if there is
+    a single one, and these ingredients are read with one more query.
+
+    Args:
+        names: an iterable of ingredient names.
+
+    Returns:
+        A tuple (ingredients, suggestions): a dictionary giving the ingredient of
+        each resolved name, and a dictionary giving, for each name that could
+        not be resolved, the sorted list of the equally close ingredient names,
+        empty if there are none.
+
+    """
+    names = set(names)
+    ingredients = Ingredient.objects.in_bulk(names, field_name="name")
+    matches, suggestions = {}, {}
+    unknown = names - ingredients.keys()
+    if unknown:
+        index = get_ingredient_names_index()
+        for name in unknown:
+            closest = index.closest(name)
+            if len(closest) == 1:
+                matches[name] = closest[0]
+            else:
+                suggestions[name] = closest
+    if matches:
+        matched = Ingredient.objects.in_bulk(set(matches.values()), field_name="name")
+        for name, match in matches.items():
+            if match in matched:
+                ingredients[name] = matched[match]
+            else:
+                # deleted by another process since the index was loaded
+                suggestions[name] = []
+    return ingredients, suggestions
+
+
+def unknown_ingredient_message(name, suggestions):
+    """Give the validation error message of an ingredient name that was not resolved."""
+    message = f"Object with name={name} does not exist."
+    if suggestions:
+        message += f" Did you mean {' or '.join(suggestions)}?"
+    return message
+
+
+def get_ingredient_names_index():
+    """Give the index of the ingredient names.
+
+    The index is loaded on first use, and reloaded in the background when it is
+    older than MAX_AGE seconds.
+
+    """
+    global _reloading
+    with _index_lock:
+        index = _index
+        reload = (
+            index is not None
+            and not _reloading
+            and time.monotonic() - index[0] > MAX_AGE
+        )
+        if reload:
+            _reloading = True
+    if index is None:
+        with _load_lock:
+            with _index_lock:
+                index = _index
+            if index is None:
+                return _load()
+    if reload:
+        _reload_in_background(index[1])
+    return index[1]
+
+
+def clear_ingredient_names_index():
+    """Forget the index of the ingredient names, so that it is loaded again."""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def _reload_in_background(previous):
+    def reload():
+        global _reloading
+        try:
+            with _load_lock:
+                _load(previous)
+        finally:
+            with _index_lock:
+                _reloading = False
+            connection.close()
+
+    threading.Thread(target=reload, daemon=True).start()
+
+
+def _load(previous=None):
+    # called with _load_lock held
+    global _index, _loading
+    with _index_lock:
+        _loading = True
+        _patches.clear()
+    try:
+        index = IngredientNamesIndex(dict(Ingredient.objects.values_list("id", "name")))
+        if previous is not None and previous.has_tree:
+            index.build_tree()
+    except BaseException:
+        with _index_lock:
+            _loading = False
+        raise
+    with _index_lock:
+        for ingredient_id, name in _patches:
+            _patch(index, ingredient_id, name)
+        _loading = False
+        _index = time.monotonic(), index
+    return index
+
+
+def _patch(index, ingredient_id, name):
+    if name is None:
+        index.remove(ingredient_id)
+    else:
+        index.set(ingredient_id, name)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def patch_ingredient_names_index(sender, instance, signal, **kwargs):
+    # the primary key of a deleted instance is cleared after the signal
+    ingredient_id = instance.pk
+    name = None if signal is post_delete else instance.name
+
+    def patch():
+        with _index_lock:
+            if _loading:
+                _patches.append((ingredient_id, name))
+            index = _index[1] if _index is not None else None
+        if index is not None:
+            _patch(index, ingredient_id, name)
+
+    transaction.on_commit(patch)
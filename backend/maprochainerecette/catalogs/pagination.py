@@ -0,0 +1,38 @@
+from rest_framework import pagination
+
+
+class OptionalCursorPagination(pagination.CursorPagination):
+    """Cursor pagination that is only applied when the ``limit`` or ``cursor`` query parameter is given.
+
+    Clients can thus still get the whole list at once. The first page is read
+    with an ordered scan that stops after ``limit`` rows, and the next pages
+    start after the position of the cursor, so that rows inserted meanwhile
+    don't shift the pages.
+
+    """
+
+    page_size_query_param = "limit"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if (
+            self.page_size_query_param not in request.query_params
+            and self.cursor_query_param not in request.query_params
+        ):
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class RecipesPagination(OptionalCursorPagination):
+    """Cursor pagination of the recipes, by creation date."""
+
+    ordering = ("created", "pk")
+    page_size = 50
+    max_page_size = 200
+
+
+class NamesPagination(OptionalCursorPagination):
+    """Cursor pagination of the ingredients or the categories, by name."""
+
+    ordering = ("name",)
+    page_size = 100
+    max_page_size = 500
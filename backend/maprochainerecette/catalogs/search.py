@@ -0,0 +1,84 @@
+"""Full-text search of the recipes, by title and description.
+
+The recipes are indexed by the database (see the migrations
+0005_recipe_search_index and 0006_recipe_search_unaccent):
+
+- on SQLite, by the FTS5 table catalogs_recipe_fts, which triggers on the
+  recipes table keep up to date. It is keyed by the recipe id, stored as an
+  indexed column: the rowids of the recipes table can change when the database
+  is vacuumed. The ties of the ranking are broken by the rowid of the FTS5
+  table, which is stable, as sorting by the recipe id would double the time of
+  a search matching many recipes,
+- on PostgreSQL, by a GIN index on the text search vector of the title and the
+  description of the recipes, which the database keeps up to date. The vector
+  is built with the french_unaccent configuration, which removes the accents
+  before stemming the words.
+
+Accents and case are ignored, the last word of the query is matched as a
+prefix, and the recipes are ranked by relevance, a word of the title weighing
+more than a word of the description.
+
+"""
+import re
+import uuid
+
+from catalogs.models import Recipe
+from django.db import NotSupportedError, connection
+
+SQLITE_SEARCH_SQL = """
+    SELECT recipe_id FROM catalogs_recipe_fts
+    WHERE catalogs_recipe_fts MATCH %s
+    ORDER BY bm25(catalogs_recipe_fts, 0.0, 10.0, 1.0), rowid
+    LIMIT %s OFFSET %s
+"""
+
+# The expression of the vector must be the one of the index.
+POSTGRESQL_SEARCH_SQL = """
+    SELECT id FROM catalogs_recipe, to_tsquery('french_unaccent', %s) AS query
+    WHERE (
+        setweight(to_tsvector('french_unaccent', title), 'A')
+        || setweight(to_tsvector('french_unaccent', description), 'B')
+    ) @@ query
+    ORDER BY ts_rank(
+        setweight(to_tsvector('french_unaccent', title), 'A')
+        || setweight(to_tsvector('french_unaccent', description), 'B'),
+        query
+    ) DESC, id
+    LIMIT %s OFFSET %s
+"""
+
+
+def search_recipes(query, limit, offset=0):
+    """Search the recipes whose title or description contain all the words of a query.
+
+    Args:
+        query: the searched words.
+        limit: the maximum number of recipes to return.
+        offset: the number of best ranked recipes to skip.
+
+    Returns:
+        A list of recipes, sorted by relevance, with their ingredients and
+        categories prefetched.
+
+    Raises:
+        NotSupportedError: the database is neither SQLite nor PostgreSQL.
+
+    """
+    words = re.findall(r"\w+", query)
+    if not words:
+        return []
+    if connection.vendor == "sqlite":
+        # the words are quoted, so that they are never read as FTS5 operators
+        terms = " ".join(f'"{word}"' for word in words)
+        sql, search = SQLITE_SEARCH_SQL, f"{{title description}} : ({terms}*)"
+    elif connection.vendor == "postgresql":
+        sql, search = POSTGRESQL_SEARCH_SQL, " & ".join(words) + ":*"
+    else:
+        raise NotSupportedError(
+            f"The search of the recipes is not supported on {connection.vendor}."
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [search, limit, offset])
+        recipe_ids = [uuid.UUID(str(recipe_id)) for recipe_id, in cursor.fetchall()]
+    recipes = Recipe.objects.with_ingredients().in_bulk(recipe_ids)
+    return [recipes[recipe_id] for recipe_id in recipe_ids if recipe_id in recipes]
@@ -1,6 +1,7 @@
 from datetime import timedelta
 
 from catalogs.models import Category, Ingredient, Recipe, RecipeIngredient
+from catalogs.names import resolve_ingredient_names, unknown_ingredient_message
 from rest_framework import serializers
 from units.models import Unit
 
@@ -20,13 +21,36 @@ class CategorySerializer(serializers.ModelSerializer):
         return value.name
 
 
+class IngredientNameField(serializers.SlugRelatedField):
+    """A field for a catalog ingredient, given by its name, tolerating typos.
+
+    A name that is not the one of an ingredient is matched with the closest
+    ingredient name, if there is a single one (see
+    catalogs.names.resolve_ingredient_names), otherwise the error suggests the
+    closest ones.
+
+    """
+
+    def __init__(self, **kwargs):
+        kwargs.setdefault("queryset", Ingredient.objects.all())
+        super().__init__(slug_field="name", **kwargs)
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail("invalid")
+        ingredients, suggestions = resolve_ingredient_names([data])
+        if data not in ingredients:
+            raise serializers.ValidationError(
+                unknown_ingredient_message(data, suggestions[data])
+            )
+        return ingredients[data]
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     unit = serializers.SlugRelatedField(
         queryset=Unit.objects.all(), slug_field="abbreviation"
     )
-    ingredient = serializers.SlugRelatedField(
-        queryset=Ingredient.objects.all(), slug_field="name"
-    )
+    ingredient = IngredientNameField()
 
     class Meta:
         model = RecipeIngredient
@@ -67,6 +91,7 @@ class RecipeSerializer(serializers.ModelSerializer):
         for ingredient_data in ingredients_data:
             ingredient = RecipeIngredient.objects.create(**ingredient_data)
             recipe.ingredients.add(ingredient)
+        recipe.update_ingredients_index()
         return recipe
 
     def update(self, instance, validated_data):
@@ -81,4 +106,16 @@ class RecipeSerializer(serializers.ModelSerializer):
         for ingredient_data in ingredients_data:
             ingredients.append(RecipeIngredient.objects.create(**ingredient_data))
         instance.ingredients.set(ingredients)
+        instance.update_ingredients_index()
         return super().update(instance, validated_data)
+
+
+class RecipeSearchParametersSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=255)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+    offset = serializers.IntegerField(min_value=0, default=0)
+
+
+class IngredientAutocompleteParametersSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=255)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
@@ -0,0 +1,4 @@
+from django.dispatch import Signal
+
+# Sent by Recipe.update_ingredients_index, with the recipe as ``recipe`` argument.
+recipe_ingredients_changed = Signal()
@@ -41,6 +41,7 @@ class RecipeFactory(factory.django.DjangoModelFactory):
         if extracted:
             for ingredient in extracted:
                 self.ingredients.add(ingredient)
+        self.update_ingredients_index()
 
     @factory.post_generation
     def categories(self, create, extracted, **kwargs):
@@ -5,7 +5,14 @@ from decimal import Decimal
 
 import pytest
 from catalogs.api import CategoryViewSet, IngredientViewSet, RecipeViewSet
-from catalogs.models import Ingredient, Recipe
+from catalogs.models import (
+    Category,
+    Ingredient,
+    IngredientRecipeIndex,
+    Recipe,
+    RecipeIngredient,
+)
+from django.utils import timezone
 from pytest_django.asserts import assertContains
 from rest_framework.test import APIRequestFactory
 from units.tests.factories import UnitFactory, UnitTypeFactory
@@ -45,6 +52,16 @@ def _get_list_absolute_url(viewset_class, viewset_basename):
     return view.reverse_action("list")
 
 
+def test_ingredient_list_is_paginated_by_name():
+    for name in ["navets", "carottes", "poireaux"]:
+        IngredientFactory(name=name)
+    url = _get_ingredients_list_absolute_url()
+    request = APIRequestFactory().get(url, {"limit": 2})
+    response = IngredientViewSet.as_view({"get": "list"})(request)
+    assert response.data["results"] == [{"name": "carottes"}, {"name": "navets"}]
+    assert response.data["next"] is not None
+
+
 def test_adding_ingredient():
     request_data = {"name": "ingredient name"}
     url = _get_ingredients_list_absolute_url()
@@ -97,6 +114,19 @@ def test_recipes_list_contains_2_recipes():
     assertContains(response, recipe2.title)
 
 
+def test_recipes_list_returns_304_while_the_catalog_is_unchanged():
+    recipe = RecipeFactory(title="Recipe 1")
+    url = _get_recipes_list_absolute_url()
+    view = RecipeViewSet.as_view({"get": "list"})
+    etag = view(APIRequestFactory().get(url))["ETag"]
+    response = view(APIRequestFactory().get(url, HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 304
+    recipe.delete()
+    response = view(APIRequestFactory().get(url, HTTP_IF_NONE_MATCH=etag))
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
 def _create_ingredients_and_categories():
     ingredients, categories = [], []
     for _ in range(10):
@@ -142,6 +172,105 @@ def test_recipes_list_serialises_correctly_duration_field():
     assert recipe_data["duration"] == "03:40"
 
 
+@pytest.mark.parametrize("recipes_count", [1, 2000])
+def test_recipes_list_runs_a_constant_number_of_queries(
+    recipes_count, django_assert_num_queries
+):
+    _bulk_create_recipes(recipes_count)
+    url = _get_recipes_list_absolute_url()
+    request = APIRequestFactory().get(url)
+    # version stamps, recipes, recipe ingredients with their ingredient and
+    # unit, and categories
+    with django_assert_num_queries(4):
+        response = RecipeViewSet.as_view({"get": "list"})(request)
+        response.render()
+    assert len(response.data) == recipes_count
+    assert len(response.data[0]["ingredients"]) == 3
+    assert len(response.data[0]["categories"]) == 2
+
+
+def test_recipe_detail_runs_a_constant_number_of_queries(django_assert_num_queries):
+    (recipe,) = _bulk_create_recipes(1, ingredients_count=50)
+    url = _get_recipes_detail_absolute_url(recipe.id)
+    request = APIRequestFactory().get(url)
+    with django_assert_num_queries(3):
+        response = RecipeViewSet.as_view({"get": "retrieve"})(request, pk=recipe.id)
+        response.render()
+    assert len(response.data["ingredients"]) == 50
+    assert sorted(response.data["categories"]) == ["catégorie 0", "catégorie 1"]
+
+
+def _bulk_create_recipes(count, ingredients_count=3):
+    unit = UnitFactory()
+    ingredients = Ingredient.objects.bulk_create(
+        Ingredient(name=f"ingrédient {i}") for i in range(ingredients_count)
+    )
+    categories = Category.objects.bulk_create(
+        Category(name=f"catégorie {i}") for i in range(2)
+    )
+    created = timezone.now() - timedelta(days=1)
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            title=f"recette {i}",
+            description="",
+            duration=timedelta(minutes=30),
+            created=created + timedelta(seconds=i),
+        )
+        for i in range(count)
+    )
+    recipe_ingredients = RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(ingredient=ingredient, amount=1, unit=unit)
+        for _ in recipes
+        for ingredient in ingredients
+    )
+    Recipe.ingredients.through.objects.bulk_create(
+        Recipe.ingredients.through(
+            recipe_id=recipes[i // ingredients_count].pk,
+            recipeingredient_id=recipe_ingredient.pk,
+        )
+        for i, recipe_ingredient in enumerate(recipe_ingredients)
+    )
+    Recipe.categories.through.objects.bulk_create(
+        Recipe.categories.through(recipe_id=recipe.pk, category_id=category.pk)
+        for recipe in recipes
+        for category in categories
+    )
+    return recipes
+
+
+def test_recipes_list_is_paginated_by_creation_date_despite_insertions():
+    _bulk_create_recipes(5)
+    view = RecipeViewSet.as_view({"get": "list"})
+    url = _get_recipes_list_absolute_url()
+    response = view(APIRequestFactory().get(url, {"limit": 3}))
+    titles = [recipe["title"] for recipe in response.data["results"]]
+    RecipeFactory(title="nouvelle recette")
+    response = view(APIRequestFactory().get(response.data["next"]))
+    titles += [recipe["title"] for recipe in response.data["results"]]
+    assert titles == [f"recette {i}" for i in range(5)] + ["nouvelle recette"]
+    assert response.data["next"] is None
+
+
+def test_recipes_list_returns_only_the_requested_fields(django_assert_num_queries):
+    _bulk_create_recipes(3)
+    url = _get_recipes_list_absolute_url()
+    request = APIRequestFactory().get(url, {"fields": "id,title"})
+    # version stamps and recipes, without the ingredients and categories
+    with django_assert_num_queries(2) as captured:
+        response = RecipeViewSet.as_view({"get": "list"})(request)
+        response.render()
+    assert set(response.data[0]) == {"id", "title"}
+    assert '"description"' not in captured.captured_queries[-1]["sql"]
+    assert '"ingredients_bitset"' not in captured.captured_queries[-1]["sql"]
+
+
+def test_recipes_list_rejects_unknown_fields():
+    url = _get_recipes_list_absolute_url()
+    request = APIRequestFactory().get(url, {"fields": "title,secret"})
+    response = RecipeViewSet.as_view({"get": "list"})(request)
+    assert response.status_code == 400
+
+
 def test_adding_recipe():
     assert Recipe.objects.count() == 0
     _add_recipe()
@@ -162,6 +291,16 @@ def test_adding_recipe_deserializes_correctly_all_fields():
     assert recipe_added.categories.first().name == "dessert"
 
 
+def test_adding_recipe_updates_ingredients_index():
+    _add_recipe()
+    recipe_added = Recipe.objects.first()
+    assert recipe_added.ingredients_count == 1
+    assert (
+        IngredientRecipeIndex.objects.get(recipe=recipe_added).ingredient.name
+        == "deuxième ingrédient"
+    )
+
+
 def test_updating_recipe_deserializes_correctly_all_fields():
     masse = UnitTypeFactory(name="masse")
     UnitFactory(abbreviation="g", type=masse)
@@ -205,6 +344,12 @@ def test_updating_recipe_deserializes_correctly_all_fields():
     )
     assert recipe_modified.categories.count() == 1
     assert recipe_modified.categories.first().name == categories[4].name
+    assert recipe_modified.ingredients_count == 2
+    assert set(
+        IngredientRecipeIndex.objects.filter(recipe=recipe_modified).values_list(
+            "ingredient", flat=True
+        )
+    ) == {ingredients[0].ingredient.id, ingredients[4].ingredient.id}
 
 
 def _add_recipe():
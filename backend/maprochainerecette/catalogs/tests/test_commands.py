@@ -1,5 +1,12 @@
 import pytest
-from catalogs.models import Category, Ingredient, Recipe, RecipeIngredient
+from catalogs.models import (
+    Category,
+    Ingredient,
+    IngredientRecipeIndex,
+    Recipe,
+    RecipeIngredient,
+)
+from catalogs.tests.factories import RecipeFactory, RecipeIngredientFactory
 from django.core.management import call_command
 from django.core.management.base import CommandError
 from units.models import Unit, UnitType
@@ -43,3 +50,10 @@ def test_deleterecipes_deletes_all_elements_linked_to_recipes():
     assert len(Ingredient.objects.all()) == 0
     assert len(Unit.objects.all()) == 0
     assert len(UnitType.objects.all()) == 0
+
+
+def test_deleterecipes_empties_ingredients_index():
+    RecipeFactory(ingredients=[RecipeIngredientFactory(), RecipeIngredientFactory()])
+    assert IngredientRecipeIndex.objects.count() == 2
+    call_command("deleterecipes")
+    assert IngredientRecipeIndex.objects.count() == 0
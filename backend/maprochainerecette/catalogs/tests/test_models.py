@@ -0,0 +1,168 @@
+import threading
+
+import pytest
+from catalogs import bitsets
+from catalogs.models import Ingredient, IngredientRecipeIndex, Recipe
+from django.db import connection
+
+from .factories import IngredientFactory, RecipeFactory, RecipeIngredientFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_recipe_ingredients_index_contains_distinct_ingredients_of_the_recipe():
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes),
+            RecipeIngredientFactory(ingredient=tomates),
+            RecipeIngredientFactory(ingredient=carottes),
+        ]
+    )
+    recipe.refresh_from_db()
+    assert recipe.ingredients_count == 2
+    assert set(
+        IngredientRecipeIndex.objects.filter(recipe=recipe).values_list(
+            "ingredient__name", flat=True
+        )
+    ) == {"Carottes", "Tomates"}
+
+
+def test_updating_recipe_ingredients_index_removes_old_ingredients():
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    recipe = RecipeFactory(ingredients=[RecipeIngredientFactory(ingredient=carottes)])
+    recipe.ingredients.set([RecipeIngredientFactory(ingredient=tomates)])
+    recipe.update_ingredients_index()
+    assert list(
+        IngredientRecipeIndex.objects.filter(recipe=recipe).values_list(
+            "ingredient__name", flat=True
+        )
+    ) == ["Tomates"]
+
+
+def test_recipes_covered_by_ingredients_have_all_their_ingredients_among_them():
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    oignons = IngredientFactory(name="Oignons")
+    recipe1 = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes),
+            RecipeIngredientFactory(ingredient=tomates),
+        ]
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes),
+            RecipeIngredientFactory(ingredient=oignons),
+        ]
+    )
+    recipe3 = RecipeFactory(ingredients=[RecipeIngredientFactory(ingredient=tomates)])
+    RecipeFactory()
+    covered_recipes = Recipe.objects.covered_by([carottes, tomates])
+    assert set(covered_recipes) == {recipe1, recipe3}
+
+
+def test_recipe_ingredients_bitset_has_the_bits_of_its_ingredients():
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    oignons = IngredientFactory(name="Oignons")
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes),
+            RecipeIngredientFactory(ingredient=tomates),
+        ]
+    )
+    recipe.refresh_from_db()
+    carottes.refresh_from_db()
+    tomates.refresh_from_db()
+    oignons.refresh_from_db()
+    assert oignons.bit is None
+    assert bitsets.decode(recipe.ingredients_bitset) == bitsets.to_bitset(
+        [carottes.bit, tomates.bit]
+    )
+
+
+def test_ingredients_bits_are_not_changed_by_new_recipes():
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    RecipeFactory(ingredients=[RecipeIngredientFactory(ingredient=carottes)])
+    carottes_bit = Ingredient.objects.get(id=carottes.id).bit
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=tomates),
+            RecipeIngredientFactory(ingredient=carottes),
+        ]
+    )
+    assert Ingredient.objects.get(id=carottes.id).bit == carottes_bit
+    assert Ingredient.objects.get(id=tomates.id).bit != carottes_bit
+
+
+def test_saving_an_ingredient_keeps_the_bit_given_meanwhile():
+    carottes = IngredientFactory(name="Carottes")
+    RecipeFactory(ingredients=[RecipeIngredientFactory(ingredient=carottes)])
+    carottes.name = "Carottes nouvelles"
+    carottes.save()
+    carottes.refresh_from_db()
+    assert carottes.name == "Carottes nouvelles"
+    assert carottes.bit is not None
+
+
+def test_saving_a_deleted_ingredient_inserts_it_again():
+    carottes = IngredientFactory(name="Carottes")
+    Ingredient.objects.filter(pk=carottes.pk).delete()
+    carottes.save()
+    assert Ingredient.objects.get().name == "Carottes"
+    Ingredient.objects.all().delete()
+    carottes.save(force_insert=True)
+    assert Ingredient.objects.get().name == "Carottes"
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_bits_assignments_give_distinct_bits():
+    ingredients = [IngredientFactory() for _ in range(20)]
+    errors = []
+
+    def assign(ingredient):
+        try:
+            Ingredient.objects.filter(pk=ingredient.pk).assign_bits()
+        except Exception as error:  # noqa: B902
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [
+        threading.Thread(target=assign, args=(ingredient,))
+        for ingredient in ingredients
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    bits = list(Ingredient.objects.values_list("bit", flat=True))
+    assert sorted(bits) == list(range(20))
+
+
+def test_update_ingredients_bitsets_rebuilds_bitsets_from_the_index():
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes),
+            RecipeIngredientFactory(ingredient=tomates),
+        ]
+    )
+    Recipe.objects.update(ingredients_bitset=b"")
+    Recipe.objects.all().update_ingredients_bitsets()
+    recipe.refresh_from_db()
+    positions = dict(Ingredient.objects.values_list("id", "bit"))
+    assert bitsets.decode(recipe.ingredients_bitset) == bitsets.to_bitset(
+        [positions[carottes.id], positions[tomates.id]]
+    )
+
+
+def test_bitset_is_decoded_from_its_encoding():
+    bitset = bitsets.to_bitset([0, 70])
+    assert bitsets.decode(bitsets.encode(bitset)) == bitset
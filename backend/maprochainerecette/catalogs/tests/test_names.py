@@ -0,0 +1,222 @@
+import math
+import random
+
+import pytest
+from catalogs import names
+from catalogs.api import IngredientViewSet
+from catalogs.models import Ingredient
+from catalogs.names import (
+    BKTree,
+    PrefixIndex,
+    edit_distance_from,
+    get_ingredient_names_index,
+    normalize,
+    resolve_ingredient_names,
+)
+from catalogs.serializers import RecipeIngredientSerializer
+from rest_framework.test import APIRequestFactory
+from units.tests.factories import UnitFactory
+
+from .factories import IngredientFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_normalize_removes_accents_and_case():
+    assert normalize("Échalotte") == "echalotte"
+    assert normalize("pièce(s)") == "piece(s)"
+
+
+def test_prefix_index_completes_ignoring_accents_and_case():
+    index = PrefixIndex({1: "Échalotte", 2: "échine de porc", 3: "Ail", 4: "ecorce"})
+    assert index.complete("ECH", 10) == ["Échalotte", "échine de porc"]
+    assert index.complete("éch", 1) == ["Échalotte"]
+    assert index.complete("z", 10) == []
+
+
+def test_prefix_index_is_patched():
+    index = PrefixIndex({1: "Carotte"})
+    index.set(2, "Céleri")
+    index.set(1, "Courgette")
+    index.remove(3)
+    assert index.complete("c", 10) == ["Céleri", "Courgette"]
+    index.remove(2)
+    assert index.complete("c", 10) == ["Courgette"]
+
+
+def test_prefix_index_completes_with_a_logarithmic_number_of_comparisons():
+    index = PrefixIndex({i: f"ingrédient {i}" for i in range(50000)})
+    index._keys = [_CountedKey(key) for key in index._keys]
+    _CountedKey.comparisons = 0
+    assert len(index.complete("INGREDIENT 1", 10)) == 10
+    # a bisection of the 50000 keys, instead of a scan
+    assert _CountedKey.comparisons <= math.ceil(math.log2(50000)) + 1
+
+
+def test_index_follows_committed_changes(django_capture_on_commit_callbacks):
+    ingredient = IngredientFactory(name="Pâtes")
+    assert get_ingredient_names_index().complete("pat", 10) == ["Pâtes"]
+    with django_capture_on_commit_callbacks(execute=True):
+        ingredient.name = "Patate douce"
+        ingredient.save()
+        IngredientFactory(name="Pâtisson")
+    assert get_ingredient_names_index().complete("pat", 10) == [
+        "Patate douce",
+        "Pâtisson",
+    ]
+    with django_capture_on_commit_callbacks(execute=True):
+        Ingredient.objects.filter(name="Pâtisson").delete()
+    assert get_ingredient_names_index().complete("pat", 10) == ["Patate douce"]
+
+
+def test_stale_index_is_used_while_it_is_reloaded_in_the_background(
+    monkeypatch, django_assert_num_queries
+):
+    IngredientFactory(name="Pâtes")
+    index = get_ingredient_names_index()
+    reloads: list = []
+    monkeypatch.setattr(names, "MAX_AGE", -1)
+    monkeypatch.setattr(names, "_reload_in_background", reloads.append)
+    with django_assert_num_queries(0):
+        assert get_ingredient_names_index() is index
+        assert get_ingredient_names_index() is index
+    assert reloads == [index]
+
+
+def test_reload_keeps_the_patches_committed_meanwhile(
+    monkeypatch, django_capture_on_commit_callbacks
+):
+    IngredientFactory(name="Pâtes")
+    previous = get_ingredient_names_index()
+    previous.closest("pates")
+    names_index = names.IngredientNamesIndex
+
+    def names_index_missing_a_committed_ingredient(ingredient_names):
+        with django_capture_on_commit_callbacks(execute=True):
+            IngredientFactory(name="Pâtisson")
+        return names_index(ingredient_names)
+
+    monkeypatch.setattr(
+        names, "IngredientNamesIndex", names_index_missing_a_committed_ingredient
+    )
+    index = names._load(previous)
+    assert index.has_tree
+    assert index.complete("pat", 10) == ["Pâtes", "Pâtisson"]
+    assert get_ingredient_names_index() is index
+
+
+def test_autocomplete_endpoint_does_not_query_the_database(django_assert_num_queries):
+    for name in ("Échalotte", "Échine de porc", "Écorce d'orange"):
+        IngredientFactory(name=name)
+    get_ingredient_names_index()
+    request = APIRequestFactory().get(_get_autocomplete_url(), {"q": "ech", "limit": 5})
+    with django_assert_num_queries(0):
+        response = IngredientViewSet.as_view({"get": "autocomplete"})(request)
+    assert response.status_code == 200
+    assert response.data == [{"name": "Échalotte"}, {"name": "Échine de porc"}]
+
+
+def test_autocomplete_endpoint_requires_a_query():
+    request = APIRequestFactory().get(_get_autocomplete_url(), {"limit": 0})
+    response = IngredientViewSet.as_view({"get": "autocomplete"})(request)
+    assert response.status_code == 400
+    assert set(response.data) == {"q", "limit"}
+
+
+def test_edit_distance_is_the_levenshtein_distance():
+    generator = random.Random(0)  # noqa: S311
+    for _ in range(1000):
+        pattern, text = (
+            "".join(generator.choices("abcé ", k=generator.randint(0, 10)))
+            for _ in range(2)
+        )
+        assert edit_distance_from(pattern)(text) == _levenshtein(pattern, text)
+
+
+def test_bk_tree_gives_the_closest_names():
+    tree = BKTree({1: "Échalotte", 2: "Carotte", 3: "Carottes", 4: "Navet"})
+    assert tree.closest("echalote", 2) == ["Échalotte"]
+    assert tree.closest("carote", 2) == ["Carotte"]
+    assert tree.closest("carottess", 2) == ["Carottes"]
+    assert tree.closest("navots", 1) == []
+    tree.set(5, "Navets")
+    tree.remove(4)
+    assert tree.closest("navots", 1) == ["Navets"]
+
+
+def test_bk_tree_finds_the_same_names_as_a_full_scan():
+    generator = random.Random(0)  # noqa: S311
+    names = dict(
+        enumerate(
+            {
+                "".join(generator.choices("abcde", k=generator.randint(3, 8)))
+                for _ in range(500)
+            }
+        )
+    )
+    tree = BKTree(names)
+    for query in ("abcd", "eeeee", "cabba", "ddaaebc"):
+        distances = {name: _levenshtein(query, name) for name in names.values()}
+        best = min(distances.values())
+        expected = sorted(name for name, d in distances.items() if d == best)
+        assert tree.closest(query, 2) == (expected if best <= 2 else [])
+
+
+def test_resolve_ingredient_names_tolerates_typos():
+    echalotte = IngredientFactory(name="échalotte")
+    IngredientFactory(name="pâte")
+    IngredientFactory(name="pâté")
+    IngredientFactory(name="ail")
+    ingredients, suggestions = resolve_ingredient_names(
+        ["échalotte", "Echalote", "pate", "al", "inconnu"]
+    )
+    assert ingredients == {"échalotte": echalotte, "Echalote": echalotte}
+    assert suggestions == {"pate": ["pâte", "pâté"], "al": [], "inconnu": []}
+
+
+def test_recipe_ingredient_serializer_resolves_names_with_typos():
+    IngredientFactory(name="échalotte")
+    unit = UnitFactory(abbreviation="g")
+    serializer = RecipeIngredientSerializer(
+        data={"ingredient": "echalote", "amount": "10", "unit": unit.abbreviation}
+    )
+    assert serializer.is_valid(), serializer.errors
+    assert serializer.validated_data["ingredient"].name == "échalotte"
+    serializer = RecipeIngredientSerializer(
+        data={"ingredient": "chalut", "amount": "10", "unit": unit.abbreviation}
+    )
+    assert not serializer.is_valid()
+    assert serializer.errors["ingredient"] == [
+        "Object with name=chalut does not exist."
+    ]
+
+
+class _CountedKey(str):
+    comparisons = 0
+
+    def __lt__(self, other):
+        _CountedKey.comparisons += 1
+        return super().__lt__(other)
+
+
+def _levenshtein(first, second):
+    previous = list(range(len(second) + 1))
+    for i, first_character in enumerate(first, start=1):
+        current = [i]
+        for j, second_character in enumerate(second, start=1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (first_character != second_character),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+def _get_autocomplete_url():
+    view = IngredientViewSet()
+    view.basename = "ingredients"
+    view.request = None
+    return view.reverse_action("autocomplete")
@@ -0,0 +1,81 @@
+import pytest
+from catalogs.api import RecipeViewSet
+from catalogs.models import Recipe
+from catalogs.search import search_recipes
+from rest_framework.test import APIRequestFactory
+
+from .factories import RecipeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_search_ranks_the_title_before_the_description():
+    RecipeFactory(title="Gratin", description="Un gratin de courgettes")
+    RecipeFactory(title="Courgettes farcies", description="Des légumes farcis")
+    RecipeFactory(title="Tarte", description="Une tarte aux pommes")
+    assert [recipe.title for recipe in search_recipes("courgettes", 10)] == [
+        "Courgettes farcies",
+        "Gratin",
+    ]
+
+
+def test_search_ignores_accents_and_case_and_completes_the_last_word():
+    RecipeFactory(title="Crème brûlée", description="Un dessert")
+    assert [recipe.title for recipe in search_recipes("CREME brul", 10)] == [
+        "Crème brûlée"
+    ]
+    assert search_recipes("crème dessert salé", 10) == []
+
+
+def test_search_treats_operators_as_words():
+    RecipeFactory(title="Soupe", description="Une soupe de légumes")
+    assert search_recipes('"soupe" AND (', 10) == []
+    assert search_recipes('"soupe" (', 10)[0].title == "Soupe"
+    assert search_recipes('" * -', 10) == []
+
+
+def test_search_index_follows_updates_and_deletions():
+    recipe = RecipeFactory(title="Ratatouille", description="Des légumes")
+    recipe.title = "Piperade"
+    recipe.save()
+    assert search_recipes("ratatouille", 10) == []
+    assert search_recipes("piperade", 10) == [recipe]
+    Recipe.objects.filter(pk=recipe.pk).delete()
+    assert search_recipes("piperade", 10) == []
+
+
+def test_search_endpoint_pages_through_the_results():
+    for i in range(3):
+        RecipeFactory(title=f"Salade {i}", description="Une salade")
+    view = RecipeViewSet.as_view({"get": "search"})
+    response = view(
+        APIRequestFactory().get(_get_search_url(), {"q": "salade", "limit": 2})
+    )
+    assert response.status_code == 200
+    titles = [recipe["title"] for recipe in response.data["results"]]
+    response = view(APIRequestFactory().get(response.data["next"]))
+    titles += [recipe["title"] for recipe in response.data["results"]]
+    assert sorted(titles) == ["Salade 0", "Salade 1", "Salade 2"]
+    assert response.data["next"] is None
+
+
+def test_search_endpoint_returns_the_requested_fields():
+    RecipeFactory(title="Salade", description="Une salade")
+    request = APIRequestFactory().get(
+        _get_search_url(), {"q": "salade", "fields": "id,title"}
+    )
+    response = RecipeViewSet.as_view({"get": "search"})(request)
+    assert set(response.data["results"][0]) == {"id", "title"}
+
+
+def test_search_endpoint_requires_a_query():
+    request = APIRequestFactory().get(_get_search_url())
+    response = RecipeViewSet.as_view({"get": "search"})(request)
+    assert response.status_code == 400
+
+
+def _get_search_url():
+    view = RecipeViewSet()
+    view.basename = "recipes"
+    view.request = None
+    return view.reverse_action("search")
@@ -12,3 +12,11 @@ def test_ingredient_detail_resolve_does_not_raise_404(ingredient):
 def test_recipe_detail_resolve_does_not_raise_404(recipe):
     url = f"/api/catalogs/recipes/{recipe.id}/"
     assert resolve(url)
+
+
+def test_recipe_search_resolve_does_not_raise_404():
+    assert resolve("/api/catalogs/recipes/search/")
+
+
+def test_ingredient_autocomplete_resolve_does_not_raise_404():
+    assert resolve("/api/catalogs/ingredients/autocomplete/")
@@ -0,0 +1,35 @@
+import pytest
+from django.conf import settings
+
+
+@pytest.fixture(scope="session")
+def django_db_modify_db_settings(
+    django_db_modify_db_settings_parallel_suffix, tmp_path_factory
+):
+    """Use a database file for the tests on SQLite.
+
+    Concurrent connections to the default in-memory test database fail as soon as
+    a table is locked, instead of waiting for the lock to be released. The
+    waiting is longer than the default one, as the tests of concurrent writes
+    make many connections wait for each other.
+
+    """
+    database = settings.DATABASES["default"]
+    if database["ENGINE"] == "django.db.backends.sqlite3":
+        database["TEST"]["NAME"] = str(tmp_path_factory.mktemp("db") / "test.sqlite3")
+        database["OPTIONS"]["timeout"] = 60
+
+
+@pytest.fixture(autouse=True)
+def _clear_ingredient_names_index():
+    """Forget the index of the ingredient names loaded by a previous test.
+
+    It could contain ingredients created in the rolled back transaction of the
+    test.
+
+    """
+    from catalogs.names import clear_ingredient_names_index
+
+    clear_ingredient_names_index()
+    yield
+    clear_ingredient_names_index()
@@ -1,11 +1,116 @@
-from typing import Any, Dict
+import codecs
+import json
 
 from catalogs.models import Recipe
+from django.http import StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from fridge import events
+from fridge.bulk import add_fridge_ingredients
+from fridge.consumption import (
+    InsufficientStock,
+    consume_recipe,
+    consume_recipes,
+    plan_recipe_consumption,
+)
+from fridge.expiration import expiring_stock
+from fridge.filters import FridgeIngredientFilter
+from fridge.inventory import (
+    CONTENT_TYPES,
+    InvalidInventory,
+    export_inventory,
+    import_inventory,
+)
+from fridge.matching import almost_feasible_recipes, feasible_recipes
 from fridge.models import FridgeIngredient
-from fridge.serializers import FridgeIngredientSerializer, RecipeFridgeSerializer
-from rest_framework import authentication, permissions, viewsets
+from fridge.pagination import FeasibleRecipesPagination, FridgeIngredientsPagination
+from fridge.serializers import (
+    AddedFridgeIngredientSerializer,
+    AlmostFeasibleRecipeSerializer,
+    AlmostFeasibleRecipesParametersSerializer,
+    BulkFridgeIngredientsSerializer,
+    ConsumedRecipeSerializer,
+    ConsumeRecipesSerializer,
+    ExpiringParametersSerializer,
+    ExpiringStockSerializer,
+    FridgeIngredientSerializer,
+    PlannedDeductionSerializer,
+    RecipeFridgeSerializer,
+)
+from rest_framework import (
+    authentication,
+    exceptions,
+    generics,
+    permissions,
+    status,
+    viewsets,
+)
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
 from rest_framework.views import APIView
+from versions.mixins import ConditionalListMixin
+
+
+class FridgeEvents(APIView):
+    """View to stream the changes of the fridge with Server-Sent Events.
+
+    Each committed change of the fridge is sent as a ``fridge`` event, whose data
+    gives the fridge ingredients added, changed (with all their fields) or
+    removed (their ids), and the ids of the recipes that became feasible or
+    unfeasible (see fridge.events), so that clients don't need to poll the
+    fridge ingredients and the feasible recipes.
+
+    Changes too large to be sent as a delta are sent as a ``reset`` event, after
+    which the client should read the fridge again. A client that reconnects with
+    the ``Last-Event-ID`` header first gets the events that it missed. When some
+    events are lost, or the header is an id given before the server restarted,
+    a ``reset`` event is sent and the stream ends: the client should then read
+    the fridge again before reconnecting. A comment is sent after ``keep_alive``
+    seconds without event, so that the connection is not closed by proxies.
+
+    The events are only received from the changes made by the same process with
+    the default broker, fridge.events.InProcessBroker, which is thus rejected by
+    the system checks when there are several worker processes (see
+    fridge.checks).
+
+    Each client holds a worker thread while it is connected. Under ASGI, the
+    stream is read in a thread too, so that it doesn't stall the event loop (see
+    maprochainerecette.asgi.StreamingASGIHandler).
+
+    """
+
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.AllowAny]
+    keep_alive = 15
+
+    def get(self, request):
+        subscription = events.get_broker().subscribe(
+            request.headers.get("Last-Event-ID")
+        )
+        response = StreamingHttpResponse(
+            self._stream(subscription), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        # disables the buffering of the responses by nginx
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    def _stream(self, subscription):
+        try:
+            while not subscription.overflowed:
+                event = subscription.get(timeout=self.keep_alive)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                event_id, data = event
+                if data is None:
+                    yield f"id: {event_id}\nevent: reset\ndata: {{}}\n\n"
+                    continue
+                data = json.dumps(data, cls=JSONEncoder, separators=(",", ":"))
+                yield f"id: {event_id}\nevent: fridge\ndata: {data}\n\n"
+            yield "event: reset\ndata: {}\n\n"
+        finally:
+            events.get_broker().unsubscribe(subscription)
 
 
 class ConsumeIngredients(APIView):
@@ -15,181 +120,279 @@ class ConsumeIngredients(APIView):
     def post(self, request, recipe_id):
         """View to remove all the corresponding fridge ingredients of a consumed feasible recipe.
 
-        Currently this action doesn't work for recipes with unsure ingredients.
+        The unsure ingredients of the recipe are not consumed, like with the
+        consumption of several recipes. See fridge.consumption.consume_recipe.
 
         """
-        recipe = Recipe.objects.get(id=recipe_id)
-        for recipe_ingredient in recipe.ingredients.all():
-            ingredient_id = recipe_ingredient.ingredient.id
-            fridge_ingredients = FridgeIngredient.objects.filter(
-                ingredient=ingredient_id
-            ).order_by("expiration_date")
-            consumed_amount = 0
-            for fridge_ingredient in fridge_ingredients.all():
-                initial_fridge_ingredient_amount = fridge_ingredient.amount
-                fridge_ingredient.amount = max(
-                    0,
-                    fridge_ingredient.amount
-                    - (recipe_ingredient.amount - consumed_amount),
-                )
-                if fridge_ingredient.amount == 0:
-                    fridge_ingredients.delete()
-                    consumed_amount += initial_fridge_ingredient_amount
-                else:
-                    fridge_ingredient.save()
-                    break
+        recipe = get_object_or_404(Recipe, id=recipe_id)
+        consume_recipe(recipe)
         return Response()
 
 
-class FridgeIngredientViewSet(viewsets.ModelViewSet):
-    """Provides a CRUD API for fridge ingredients."""
+class ConsumeIngredientsPreview(APIView):
+    """View to preview the consumption of a recipe, without removing anything.
+
+    The response lists the fridge ingredients that consuming the recipe would
+    shrink or delete, with their current and remaining amounts, in the order of
+    consumption. The deductions are planned by the same code as the consumption
+    (see fridge.consumption.plan_recipe_consumption), with a single query, so
+    an unknown recipe gives an empty list instead of a 404.
+
+    """
 
-    queryset = FridgeIngredient.objects.all()
-    permission_classes = [permissions.AllowAny]
     authentication_classes = [authentication.TokenAuthentication]
-    serializer_class = FridgeIngredientSerializer
+    permission_classes = [permissions.AllowAny]
 
+    def get(self, request, recipe_id):
+        deductions = plan_recipe_consumption(recipe_id)
+        return Response(PlannedDeductionSerializer(deductions, many=True).data)
+
+
+class ConsumeRecipes(APIView):
+    """View to remove from the fridge the ingredients of several recipes cooked at once.
+
+    The body gives a list of ``recipes``, each with its ``recipe`` id and a
+    ``servings`` multiplier (1 by default) of its amounts. The recipes are
+    checked jointly against the fridge stock, then consumed in a single
+    transaction (see fridge.consumption.consume_recipes). When the fridge
+    doesn't contain enough of some ingredients, nothing is consumed and a 409
+    is returned with the names of these ``missing_ingredients``.
+
+    The response gives, for each recipe, the consumed amounts of its ingredients
+    and its unsure ingredients, which are not consumed, and the resulting
+    fridge ingredients.
+
+    """
 
-class FridgeRecipes(APIView):
     authentication_classes = [authentication.TokenAuthentication]
     permission_classes = [permissions.AllowAny]
 
-    def get(self, request):
-        """View to list feasible recipes according to fridge ingredients.
+    def post(self, request):
+        serializer = ConsumeRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        servings = serializer.validated_data["recipes"]
+        try:
+            results = consume_recipes(
+                {recipe.id: amount for recipe, amount in servings.items()}
+            )
+        except InsufficientStock as error:
+            return Response(
+                {"missing_ingredients": error.ingredients},
+                status=status.HTTP_409_CONFLICT,
+            )
+        for recipe, amount in servings.items():
+            recipe.servings = amount
+            recipe.consumed_ingredients = results[recipe.id]["consumed_ingredients"]
+            recipe.unsure_ingredients = results[recipe.id]["unsure_ingredients"]
+        fridge_ingredients = FridgeIngredient.objects.select_related(
+            "ingredient", "unit"
+        )
+        return Response(
+            {
+                "recipes": ConsumedRecipeSerializer(servings, many=True).data,
+                "fridge": FridgeIngredientSerializer(
+                    fridge_ingredients, many=True
+                ).data,
+            }
+        )
+
+
+class FridgeIngredientViewSet(ConditionalListMixin, viewsets.ModelViewSet):
+    """Provides a CRUD API for fridge ingredients.
+
+    The list can be filtered by ingredient name prefix, unit type and
+    expiration date, and ordered by expiration date or ingredient name (see
+    FridgeIngredientFilter). When the ``limit`` or ``cursor`` query parameter is
+    given, only a page of the list is returned, with a cursor to the next one.
+    The catalog ingredients and units are read with the fridge ingredients, so
+    that a page costs a fixed number of queries.
+
+    """
 
-        Recipes are sorted according to the expiration date of the most
-        priority ingredient of each recipe.
+    queryset = FridgeIngredient.objects.select_related("ingredient", "unit")
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = [authentication.TokenAuthentication]
+    serializer_class = FridgeIngredientSerializer
+    filter_backends = [FridgeIngredientFilter]
+    pagination_class = FridgeIngredientsPagination
+    versioned_by = ("fridge", "catalogs", "units")
 
-        If an ingredient needed by a recipe is present in the fridge but
-        with a unit that is not convertible in the unit of the recipe's
-        ingredient, the recipe is returned with a field called unsure_ingredient
-        that contains the name of these ingredients.
+    @action(detail=False, methods=["post"])
+    def bulk(self, request):
+        """Add a list of ``ingredients`` to the fridge at once.
 
-        An additional field called priority_ingredients contains the name
-        of the most priority ingredient (ie: the ingredient that will expire
-        the sooner.) of the recipe.
+        The ingredients are merged with each other and with the fridge
+        ingredients already in the fridge, like when they are added one by one,
+        in a single transaction (see fridge.bulk.add_fridge_ingredients).
+
+        The response gives, for each added ingredient in the same order, the
+        ``id`` of the fridge ingredient it was added to, and its ``outcome``:
+        "created" or "merged". It also gives the resulting
+        ``fridge_ingredients``.
 
         """
-        fridge_ingredients = self._build_fridge_ingredients_data()
-        recipes = Recipe.objects.all()
-        feasible_recipes = []
-        unsure_ingredients: Dict[int, list] = {}
-        priority_ingredients: Dict[int, Dict[str, Any]] = {}
-        for recipe in recipes:
-            ingredients_available = True
-            for recipe_ingredient in recipe.ingredients.all():
-                name = recipe_ingredient.ingredient.name
-                (
-                    ingredient_available,
-                    ingredient_unsure,
-                    ingredient_date,
-                ) = self._check_recipe_ingredient_against_fridge(
-                    recipe_ingredient, fridge_ingredients
-                )
-                if not ingredient_available:
-                    ingredients_available = False
-                else:
-                    priority_ingredients = self._build_priority_ingredients_field(
-                        recipe.id, name, ingredient_date, priority_ingredients
-                    )
-                    unsure_ingredients = self._build_unsure_ingredients_field(
-                        recipe.id, name, ingredient_unsure, unsure_ingredients
-                    )
-            if ingredients_available:
-                feasible_recipes.append(recipe)
-        feasible_recipes = self._sort_recipes(feasible_recipes, priority_ingredients)
-        serializer = RecipeFridgeSerializer(
-            feasible_recipes,
-            many=True,
-            context={
-                "unsure_ingredients": unsure_ingredients,
-                "priority_ingredients": priority_ingredients,
+        serializer = BulkFridgeIngredientsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results = add_fridge_ingredients(serializer.validated_data["ingredients"])
+        outcomes = [
+            {
+                "id": fridge_ingredient.id,
+                "outcome": "created" if created else "merged",
+            }
+            for fridge_ingredient, created in results
+        ]
+        fridge_ingredients = list(
+            {
+                fridge_ingredient.id: fridge_ingredient
+                for fridge_ingredient, _ in results
+            }.values()
+        )
+        return Response(
+            {
+                "ingredients": AddedFridgeIngredientSerializer(
+                    outcomes, many=True
+                ).data,
+                "fridge_ingredients": FridgeIngredientSerializer(
+                    fridge_ingredients, many=True
+                ).data,
             },
+            status=status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=["get"])
+    def expiring(self, request):
+        """List the fridge ingredients expiring within ``days`` days (3 by default).
+
+        The fridge ingredients already expired are included. They are grouped by
+        catalog ingredient and unit type, with their total amount converted into
+        the unit of the unit type that has a ratio equal to 1, and the groups
+        are sorted by earliest expiration date (see
+        fridge.expiration.expiring_stock).
+
+        """
+        parameters = ExpiringParametersSerializer(data=request.query_params)
+        parameters.is_valid(raise_exception=True)
+        stock = expiring_stock(parameters.validated_data["days"])
+        return Response(ExpiringStockSerializer(stock, many=True).data)
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """Stream the fridge inventory, in NDJSON, or in CSV with ``output=csv``.
+
+        See fridge.inventory for the format of the inventory.
+
+        """
+        file_format = request.query_params.get("output", "ndjson")
+        if file_format not in CONTENT_TYPES:
+            raise exceptions.ValidationError(
+                {"output": [f"Choose among {', '.join(CONTENT_TYPES)}."]}
+            )
+        response = StreamingHttpResponse(
+            export_inventory(file_format), content_type=CONTENT_TYPES[file_format]
         )
-        return Response(serializer.data)
-
-    @staticmethod
-    def _build_fridge_ingredients_data():
-        # Amounts are converted into the unit that has the ratio equal to 1
-        # For each ingredient and unit type, we keep only the erliest date
-        data: Dict[str, Dict[str, Dict[str, Any]]] = {}
-        # {name : {unit_type: {amount or date: ingredient amount or date}}}
-        for fridge_ingredient in FridgeIngredient.objects.all():
-            name = fridge_ingredient.ingredient.name
-            unit_type = fridge_ingredient.unit.type.name
-            date = fridge_ingredient.expiration_date
-            converted_amount = fridge_ingredient.amount * fridge_ingredient.unit.rapport
-            if name not in data:
-                data[name] = {unit_type: {"amount": converted_amount, "date": date}}
-            else:
-                if unit_type not in data[name]:
-                    data[name][unit_type] = {"amount": converted_amount, "date": date}
-                else:
-                    data[name][unit_type]["amount"] += converted_amount
-                    data[name][unit_type]["date"] = min(
-                        data[name][unit_type]["date"], date
-                    )
-        return data
-
-    @staticmethod
-    def _check_recipe_ingredient_against_fridge(recipe_ingredient, fridge_ingredients):
-        name = recipe_ingredient.ingredient.name
-        unit_type = recipe_ingredient.unit.type.name
-        converted_amount = recipe_ingredient.amount * recipe_ingredient.unit.rapport
-        ingredient_available = True
-        ingredient_unsure = False
-        ingredient_date = None
-        if name in fridge_ingredients:
-            enough_amount_of_same_unit_type = (
-                unit_type in fridge_ingredients[name]
-                and fridge_ingredients[name][unit_type]["amount"] >= converted_amount
+        response["Content-Disposition"] = f'attachment; filename="fridge.{file_format}"'
+        return response
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def import_inventory(self, request):
+        """Add the fridge ingredients of an inventory sent as the request body.
+
+        The inventory is read as a stream, in NDJSON or in CSV according to the
+        content type of the request (application/x-ndjson or text/csv), and is
+        imported in batches (see fridge.inventory.import_inventory). The request
+        must give its Content-Length: without it, as with a chunked transfer
+        encoding, the body would not be read, so a 411 is returned.
+
+        The response gives the number of ``created`` fridge ingredients, and of
+        the fridge ingredients ``merged`` into existing ones. When a record is
+        invalid, the import stops before its batch, and the response gives its
+        ``line`` and its ``errors``, with the numbers of ``created`` and
+        ``merged`` fridge ingredients of the batches imported before.
+
+        """
+        formats = {content_type: name for name, content_type in CONTENT_TYPES.items()}
+        file_format = formats.get(request.content_type.split(";")[0].strip())
+        if file_format is None:
+            raise exceptions.UnsupportedMediaType(request.content_type)
+        if "CONTENT_LENGTH" not in request.META:
+            return Response(
+                {"detail": "The Content-Length of the inventory is required."},
+                status=status.HTTP_411_LENGTH_REQUIRED,
             )
-            other_unit_type = set(fridge_ingredients[name].keys()).difference(
-                {unit_type}
+        lines = codecs.iterdecode(request.stream or [], "utf-8")
+        try:
+            created, merged = import_inventory(lines, file_format)
+        except InvalidInventory as error:
+            return Response(
+                {
+                    "line": error.line,
+                    "errors": error.errors,
+                    "created": error.created,
+                    "merged": error.merged,
+                },
+                status=status.HTTP_400_BAD_REQUEST,
             )
-            if enough_amount_of_same_unit_type:
-                ingredient_date = fridge_ingredients[name][unit_type]["date"]
-            elif other_unit_type:
-                ingredient_unsure = True
-                ingredient_date = min(
-                    amount_date["date"]
-                    for amount_date in fridge_ingredients[name].values()
-                )
-            else:
-                ingredient_available = False
-        else:
-            ingredient_available = False
-        return ingredient_available, ingredient_unsure, ingredient_date
-
-    @staticmethod
-    def _build_priority_ingredients_field(
-        recipe_id, ingredient_name, ingredient_date, priority_ingredients
-    ):
-        if recipe_id not in priority_ingredients:
-            priority_ingredients[recipe_id] = {
-                "date": ingredient_date,
-                "name": ingredient_name,
-            }
-        if ingredient_date < priority_ingredients[recipe_id]["date"]:
-            priority_ingredients[recipe_id]["date"] = ingredient_date
-            priority_ingredients[recipe_id]["name"] = ingredient_name
-        return priority_ingredients
-
-    @staticmethod
-    def _build_unsure_ingredients_field(
-        recipe_id, ingredient_name, ingredient_unsure, unsure_ingredients
-    ):
-        if ingredient_unsure:
-            if recipe_id not in unsure_ingredients:
-                unsure_ingredients[recipe_id] = [ingredient_name]
-            else:
-                unsure_ingredients[recipe_id] += [ingredient_name]
-        elif recipe_id not in unsure_ingredients:
-            unsure_ingredients[recipe_id] = []
-        return unsure_ingredients
-
-    @staticmethod
-    def _sort_recipes(feasible_recipes, priority_ingredients):
-        return sorted(
-            feasible_recipes, key=lambda recipe: priority_ingredients[recipe.id]["date"]
+        return Response({"created": created, "merged": merged})
+
+
+class FridgeRecipes(ConditionalListMixin, generics.ListAPIView):
+    """View to list feasible recipes according to fridge ingredients.
+
+    The feasibility of the recipes is stored, and kept up to date when the
+    fridge or the catalog change (see fridge.matching), so that the view only
+    reads it. Recipes are sorted according to the expiration date of the most
+    priority ingredient of each recipe.
+
+    If an ingredient needed by a recipe is present in the fridge but
+    with a unit that is not convertible in the unit of the recipe's
+    ingredient, the recipe is returned with a field called unsure_ingredient
+    that contains the name of these ingredients.
+
+    An additional field called priority_ingredients contains the name
+    of the most priority ingredient (ie: the ingredient that will expire
+    the sooner.) of the recipe.
+
+    When the ``limit`` query parameter is given, only the ``limit`` first recipes
+    are returned, with a cursor to the next ones (see FeasibleRecipesPagination).
+
+    Conditional requests are answered with a 304, without reading the feasible
+    recipes, when neither the fridge nor the catalog have changed.
+
+    """
+
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.AllowAny]
+    serializer_class = RecipeFridgeSerializer
+    pagination_class = FeasibleRecipesPagination
+    versioned_by = ("fridge", "catalogs", "units")
+
+    def get_queryset(self):
+        return feasible_recipes().with_ingredients()
+
+
+class AlmostFeasibleRecipes(APIView):
+    """View to list the recipes that could be cooked by buying a few ingredients.
+
+    Recipes that are not feasible, but miss at most ``max_missing`` ingredients
+    (2 by default), are returned with a field called missing_ingredients that
+    gives, for each ingredient that is absent from the fridge or whose fridge
+    amount is too short, the missing amount in the unit of the recipe. Recipes
+    are sorted by number of missing ingredients, then by expiration date of
+    their priority ingredient, and only the ``limit`` first ones are returned
+    (20 by default).
+
+    The number of missing ingredients of every recipe is stored and indexed,
+    so that the catalog is never scanned as a whole (see fridge.matching).
+
+    """
+
+    authentication_classes = [authentication.TokenAuthentication]
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        parameters = AlmostFeasibleRecipesParametersSerializer(
+            data=request.query_params
         )
+        parameters.is_valid(raise_exception=True)
+        recipes = almost_feasible_recipes(**parameters.validated_data)
+        return Response(AlmostFeasibleRecipeSerializer(recipes, many=True).data)
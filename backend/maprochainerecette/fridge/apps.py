@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class FridgeConfig(AppConfig):
     name = "fridge"
+
+    def ready(self):
+        from fridge import checks, signals  # noqa: F401
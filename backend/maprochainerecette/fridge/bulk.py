@@ -0,0 +1,204 @@
+"""Addition of many fridge ingredients at once, for example after a big shop."""
+import uuid
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from fridge import events
+from fridge.matching import deferred_refresh, refresh_feasible_recipes
+from fridge.models import MERGED_AMOUNT_ROUNDING, FridgeIngredient
+from versions.models import VersionStamp
+
+MAX_ATTEMPTS = 3
+
+
+def add_fridge_ingredients(items):
+    """Add fridge ingredients, merging them like FridgeIngredient.save.
+
+    The items that have the same catalog ingredient, expiration date and unit
+    type are merged with each other, and with the fridge ingredient already in
+    the fridge, if any. The merged amount is expressed in the unit that has the
+    biggest ratio.
+
+    Everything is done in a single transaction, with one query to read the
+    fridge ingredients to merge into, one bulk create and one bulk update, and
+    the feasible recipes are refreshed once. The changes are published as a
+    single event (see fridge.events). When a fridge ingredient to create was
+    inserted meanwhile by a concurrent transaction, the merge is done again, up
+    to MAX_ATTEMPTS times.
+
+    Args:
+        items: a list of dictionaries with the keys ``ingredient`` (the catalog
+            Ingredient), ``amount``, ``unit`` (the Unit) and ``expiration_date``.
+
+    Returns:
+        A list giving for each item, in the same order, a tuple (fridge
+        ingredient, created), where created is False when the item was merged
+        into an existing fridge ingredient or into a previous item.
+
+    """
+    keys = [
+        (item["ingredient"].pk, item["expiration_date"], item["unit"].type_id)
+        for item in items
+    ]
+    with transaction.atomic(), deferred_refresh():
+        # Writing first takes the database write lock at once on SQLite, which
+        # has no row locks, so that the additions are serialized there.
+        VersionStamp.objects.bump("fridge")
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                with transaction.atomic():
+                    created, updated, results = _add(items, keys)
+                break
+            except IntegrityError:
+                # On PostgreSQL, the row locks don't cover the fridge ingredients
+                # inserted meanwhile by a concurrent transaction, which are read
+                # when trying again.
+                if attempt == MAX_ATTEMPTS:
+                    raise
+        # bulk writes send no signals
+        events.record_fridge_changes(
+            added=[fridge_ingredient.pk for fridge_ingredient in created.values()],
+            changed=[fridge_ingredient.pk for fridge_ingredient in updated.values()],
+        )
+        refresh_feasible_recipes(ingredients=list({key[0] for key in keys}))
+    return results
+
+
+def _add(items, keys):
+    fridge_ingredients = _lock_fridge_ingredients(keys)
+    created, updated, results = {}, {}, []
+    for item, key in zip(items, keys):
+        fridge_ingredient = fridge_ingredients.get(key)
+        if fridge_ingredient is None:
+            fridge_ingredient = FridgeIngredient(
+                id=uuid.uuid4(),
+                ingredient=item["ingredient"],
+                amount=item["amount"],
+                unit=item["unit"],
+                unit_type_id=item["unit"].type_id,
+                expiration_date=item["expiration_date"],
+            )
+            fridge_ingredients[key] = created[key] = fridge_ingredient
+            results.append((fridge_ingredient, True))
+            continue
+        _merge(fridge_ingredient, item["amount"], item["unit"])
+        if key not in created:
+            updated[key] = fridge_ingredient
+        results.append((fridge_ingredient, False))
+    FridgeIngredient.objects.bulk_create(created.values())
+    now = timezone.now()
+    for fridge_ingredient in updated.values():
+        fridge_ingredient.modified = now
+    FridgeIngredient.objects.bulk_update(
+        updated.values(), ["amount", "unit", "modified"]
+    )
+    return created, updated, results
+
+
+def _lock_fridge_ingredients(keys):
+    return {
+        (
+            fridge_ingredient.ingredient_id,
+            fridge_ingredient.expiration_date,
+            fridge_ingredient.unit_type_id,
+        ): fridge_ingredient
+        for fridge_ingredient in FridgeIngredient.objects.select_for_update(
+            of=("self",)
+        )
+        .select_related("ingredient", "unit")
+        .filter(
+            ingredient__in={key[0] for key in keys},
+            expiration_date__in={key[1] for key in keys},
+        )
+    }
+
+
+def move_fridge_ingredients_to_unit_type(unit):
+    """Give the fridge ingredients in a unit the unit type of the unit.
+
+    Used when the type of a unit changes: the fridge ingredients in the unit that
+    have the catalog ingredient and expiration date of a fridge ingredient of
+    the new unit type are merged into it, like with add_fridge_ingredients, so
+    that the fridge ingredients stay unique.
+
+    Everything is done in a single transaction, the feasible recipes are
+    refreshed once, and the changes are published as a single event (see
+    fridge.events).
+
+    Args:
+        unit: the Unit, with its new type.
+
+    """
+    with transaction.atomic(), deferred_refresh():
+        # Writing first takes the database write lock at once on SQLite, which
+        # has no row locks, so that the merges are serialized there.
+        VersionStamp.objects.bump("fridge")
+        moved = list(
+            FridgeIngredient.objects.select_for_update()
+            .filter(unit=unit)
+            .exclude(unit_type=unit.type_id)
+        )
+        if not moved:
+            return
+        targets = {
+            (
+                fridge_ingredient.ingredient_id,
+                fridge_ingredient.expiration_date,
+            ): fridge_ingredient
+            for fridge_ingredient in FridgeIngredient.objects.select_for_update(
+                of=("self",)
+            )
+            .select_related("unit")
+            .filter(
+                unit_type=unit.type_id,
+                ingredient__in={
+                    fridge_ingredient.ingredient_id for fridge_ingredient in moved
+                },
+            )
+        }
+        kept, merged, removed = [], {}, []
+        now = timezone.now()
+        for fridge_ingredient in moved:
+            key = fridge_ingredient.ingredient_id, fridge_ingredient.expiration_date
+            target = targets.get(key)
+            if target is None:
+                kept.append(fridge_ingredient.pk)
+                continue
+            _merge(target, fridge_ingredient.amount, unit)
+            target.modified = now
+            merged[key] = target
+            removed.append(fridge_ingredient.pk)
+        FridgeIngredient.objects.filter(pk__in=removed).delete()
+        FridgeIngredient.objects.bulk_update(
+            merged.values(), ["amount", "unit", "modified"]
+        )
+        FridgeIngredient.objects.filter(pk__in=kept).update(
+            unit_type=unit.type_id, modified=now
+        )
+        # bulk writes send no signals
+        events.record_fridge_changes(
+            changed=[*kept, *(target.pk for target in merged.values())],
+            removed=removed,
+        )
+        refresh_feasible_recipes(
+            ingredients=list(
+                {fridge_ingredient.ingredient_id for fridge_ingredient in moved}
+            )
+        )
+
+
+def _merge(fridge_ingredient, amount, unit):
+    # like with FridgeIngredient.save, the new unit wins in case of a tie
+    if fridge_ingredient.unit.rapport <= unit.rapport:
+        big_unit = unit
+    else:
+        big_unit = fridge_ingredient.unit
+    canonical_amount = (
+        fridge_ingredient.amount * fridge_ingredient.unit.rapport
+        + amount * unit.rapport
+    )
+    fridge_ingredient.amount = (canonical_amount / big_unit.rapport).quantize(
+        Decimal("0.01"), rounding=MERGED_AMOUNT_ROUNDING
+    )
+    fridge_ingredient.unit = big_unit
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core import checks
+
+
+@checks.register(checks.Tags.compatibility)
+def check_event_broker(app_configs, **kwargs):
+    """Reject the in-process event broker when there are several worker processes.
+
+    The subscribers of fridge.events.InProcessBroker only get the events of their
+    own process.
+
+    """
+    if (
+        settings.FRIDGE_EVENT_BROKER == "fridge.events.InProcessBroker"
+        and settings.WEB_CONCURRENCY > 1
+    ):
+        return [
+            checks.Error(
+                "The in-process event broker only works with a single worker "
+                f"process, but WEB_CONCURRENCY is {settings.WEB_CONCURRENCY}.",
+                hint="Set FRIDGE_EVENT_BROKER to a broker shared by the processes.",
+                id="fridge.E001",
+            )
+        ]
+    return []
@@ -0,0 +1,375 @@
+"""Consumption of the fridge ingredients used by cooked recipes.
+
+Amounts are compared in the unit of their unit type that has a ratio equal to 1
+(see Unit.rapport), so that a recipe ingredient is deducted from fridge
+ingredients stored in any unit of the same unit type. For each catalog
+ingredient and unit type, the fridge ingredients are consumed by expiration
+date, the earliest first, until the amount needed by the recipes is reached.
+The remaining amount of a fridge ingredient is written back in its own unit,
+rounded down to its decimal places so that the stock is never overstated, and
+fully consumed fridge ingredients are deleted. Unlike the sums of merged fridge
+ingredients, rounded half up (see fridge.models.MERGED_AMOUNT_ROUNDING), a
+remaining amount is never rounded up to what the fridge no longer contains.
+
+Amounts are not converted between unit types: like for the matching of the
+feasible recipes, a recipe ingredient that is not in the fridge in a sufficient
+amount with its unit type, but is with another unit type, is unsure, and is not
+consumed.
+
+A consumption is done in a single transaction, in which the fridge ingredients
+of the recipes are locked, so that concurrent consumptions never consume the
+same stock twice. The converted amounts are computed by the database, the
+deductions are computed in one pass, then written with one bulk update and one
+bulk delete, and the feasible recipes are refreshed once.
+
+"""
+from collections import defaultdict
+from decimal import ROUND_DOWN, Decimal
+
+from catalogs.models import RecipeIngredient
+from django.db import models, transaction
+from fridge import events
+from fridge.matching import deferred_refresh, refresh_feasible_recipes
+from fridge.models import FridgeIngredient
+from versions.models import VersionStamp
+
+
+class InsufficientStock(Exception):
+    """The fridge doesn't contain enough of some ingredients of the recipes.
+
+    Attributes:
+        ingredients: the names of the missing ingredients.
+
+    """
+
+    def __init__(self, ingredients):
+        super().__init__(f"Not enough {', '.join(ingredients)} in the fridge.")
+        self.ingredients = ingredients
+
+
+def consume_recipe(recipe):
+    """Remove from the fridge the ingredients used by a cooked recipe.
+
+    The unsure ingredients are not consumed, and the other ingredients that are
+    not in the fridge in a sufficient amount are consumed as much as possible.
+
+    Args:
+        recipe: the cooked recipe.
+
+    """
+    with transaction.atomic(), deferred_refresh():
+        _lock_fridge()
+        fridge_ingredients = list(
+            _needed_by_recipe(recipe.pk).select_for_update(of=("self",))
+        )
+        needed_amounts = _needed_amounts(fridge_ingredients)
+        _, unsure = _check_stock(fridge_ingredients, needed_amounts)
+        _apply(_plan(fridge_ingredients, _excluding(needed_amounts, unsure)))
+
+
+def plan_recipe_consumption(recipe_id):
+    """Compute the deductions that consuming a recipe would do, without writing.
+
+    The deductions are planned like with consume_recipe, from the fridge
+    ingredients read with a single query.
+
+    Args:
+        recipe_id: the id of the recipe.
+
+    Returns:
+        A list of dictionaries, one for each fridge ingredient that would be
+        consumed, in the order of consumption, with the keys ``id``,
+        ``ingredient`` (its name), ``unit`` (its abbreviation), ``amount`` (the
+        current amount) and ``remaining_amount`` (0 when the fridge ingredient
+        would be deleted).
+
+    """
+    fridge_ingredients = list(_needed_by_recipe(recipe_id))
+    needed_amounts = _needed_amounts(fridge_ingredients)
+    _, unsure = _check_stock(fridge_ingredients, needed_amounts)
+    return [
+        {
+            "id": fridge_ingredient["pk"],
+            "ingredient": fridge_ingredient["ingredient__name"],
+            "unit": fridge_ingredient["unit__abbreviation"],
+            "amount": fridge_ingredient["amount"],
+            "remaining_amount": remaining,
+        }
+        for fridge_ingredient, remaining in _plan(
+            fridge_ingredients, _excluding(needed_amounts, unsure)
+        )
+    ]
+
+
+def consume_recipes(servings):
+    """Remove from the fridge the ingredients used by several recipes cooked at once.
+
+    The amounts of each recipe are multiplied by its servings multiplier, and
+    the recipes are checked jointly against the fridge stock before anything
+    is consumed.
+
+    Args:
+        servings: a dictionary giving the servings multiplier of each cooked
+            recipe id.
+
+    Returns:
+        A dictionary giving for each recipe id a dictionary with the keys
+        ``consumed_ingredients``, a list sorted by name of dictionaries with the
+        keys ``ingredient`` (its name), ``amount`` (the consumed amount, in the
+        unit of the recipe) and ``unit`` (its abbreviation), and
+        ``unsure_ingredients``, the names of the unsure ingredients.
+
+    Raises:
+        InsufficientStock: the fridge doesn't contain enough of some ingredients
+            for all the recipes, in which case nothing is consumed.
+
+    """
+    recipe_ingredients = list(
+        _with_canonical_amount(RecipeIngredient.objects.filter(recipe__in=servings))
+        .order_by("recipe", "ingredient__name", "pk")
+        .values_list(
+            "recipe",
+            "ingredient",
+            "ingredient__name",
+            "unit__type",
+            "amount",
+            "unit__abbreviation",
+            "canonical_amount",
+        )
+    )
+    needed_amounts: dict = defaultdict(Decimal)
+    names = {}
+    for (
+        recipe_id,
+        ingredient_id,
+        name,
+        unit_type_id,
+        *_,
+        canonical_amount,
+    ) in recipe_ingredients:
+        needed_amounts[ingredient_id, unit_type_id] += (
+            canonical_amount * servings[recipe_id]
+        )
+        names[ingredient_id] = name
+    unsure = _consume(needed_amounts, names=names)
+    results: dict = {
+        recipe_id: {"consumed_ingredients": [], "unsure_ingredients": []}
+        for recipe_id in servings
+    }
+    for (
+        recipe_id,
+        ingredient_id,
+        name,
+        unit_type_id,
+        amount,
+        unit,
+        _,
+    ) in recipe_ingredients:
+        if (ingredient_id, unit_type_id) in unsure:
+            results[recipe_id]["unsure_ingredients"].append(name)
+        else:
+            results[recipe_id]["consumed_ingredients"].append(
+                {
+                    "ingredient": name,
+                    "amount": amount * servings[recipe_id],
+                    "unit": unit,
+                }
+            )
+    return results
+
+
+def _consume(needed_amounts, names):
+    """Consume the amounts needed for each catalog ingredient and unit type ids.
+
+    The stock is checked before anything is consumed, and the unsure amounts
+    are not consumed.
+
+    Args:
+        needed_amounts: a dictionary giving the needed canonical amount for each
+            tuple (catalog ingredient id, unit type id).
+        names: a dictionary giving the name of each catalog ingredient id.
+
+    Returns:
+        The set of the keys of needed_amounts that are unsure.
+
+    Raises:
+        InsufficientStock: the stock is not sufficient.
+
+    """
+    with transaction.atomic(), deferred_refresh():
+        _lock_fridge()
+        fridge_ingredients = list(
+            _fridge_ingredients()
+            .select_for_update(of=("self",))
+            .filter(ingredient__in={key[0] for key in needed_amounts})
+        )
+        short, unsure = _check_stock(fridge_ingredients, needed_amounts)
+        missing = {names[key[0]] for key in short - unsure}
+        if missing:
+            raise InsufficientStock(sorted(missing))
+        _apply(_plan(fridge_ingredients, _excluding(needed_amounts, unsure)))
+    return unsure
+
+
+def _lock_fridge():
+    # Writing first takes the database write lock at once on SQLite, which has
+    # no row locks, so that the consumptions are serialized there.
+    VersionStamp.objects.bump("fridge")
+
+
+def _fridge_ingredients():
+    return (
+        _with_canonical_amount(FridgeIngredient.objects.all())
+        .order_by("ingredient", "unit__type", "expiration_date", "pk")
+        .values(
+            "pk",
+            "ingredient",
+            "ingredient__name",
+            "unit__type",
+            "unit__rapport",
+            "unit__abbreviation",
+            "amount",
+            "canonical_amount",
+        )
+    )
+
+
+def _needed_by_recipe(recipe_id):
+    """Read the fridge ingredients consumed by a recipe, with the needed amounts.
+
+    All the fridge ingredients of the catalog ingredients of the recipe are
+    read, so that its unsure ingredients can be found. Each one is annotated
+    with ``needed_amount``, the canonical amount of its catalog ingredient and
+    unit type needed by the recipe, which is None for another unit type.
+
+    """
+    recipe_ingredients = RecipeIngredient.objects.filter(recipe=recipe_id)
+    needed_amount = (
+        _with_canonical_amount(
+            recipe_ingredients.filter(
+                ingredient=models.OuterRef("ingredient"),
+                unit__type=models.OuterRef("unit__type"),
+            )
+        )
+        .order_by()
+        .values("ingredient")
+        .annotate(total=models.Sum("canonical_amount"))
+        .values("total")
+    )
+    return (
+        _fridge_ingredients()
+        .filter(ingredient__in=recipe_ingredients.values("ingredient"))
+        .annotate(needed_amount=models.Subquery(needed_amount))
+    )
+
+
+def _needed_amounts(fridge_ingredients):
+    return {
+        _key(fridge_ingredient): fridge_ingredient["needed_amount"]
+        for fridge_ingredient in fridge_ingredients
+        if fridge_ingredient["needed_amount"] is not None
+    }
+
+
+def _check_stock(fridge_ingredients, needed_amounts):
+    """Compare the needed amounts with the stock of the fridge ingredients.
+
+    Args:
+        fridge_ingredients: all the fridge ingredients of the needed catalog
+            ingredients, whatever their unit type.
+        needed_amounts: a dictionary giving the needed canonical amount for each
+            tuple (catalog ingredient id, unit type id).
+
+    Returns:
+        A tuple of two sets of keys of needed_amounts: the ones not in the fridge
+        in a sufficient amount with their unit type, and among them the unsure
+        ones, which are in the fridge with another unit type.
+
+    """
+    stock: dict = defaultdict(Decimal)
+    unit_types = defaultdict(set)
+    for fridge_ingredient in fridge_ingredients:
+        ingredient_id, unit_type_id = key = _key(fridge_ingredient)
+        stock[key] += fridge_ingredient["canonical_amount"]
+        unit_types[ingredient_id].add(unit_type_id)
+    short = {key for key, needed in needed_amounts.items() if stock[key] < needed}
+    unsure = {key for key in short if unit_types[key[0]] - {key[1]}}
+    return short, unsure
+
+
+def _excluding(needed_amounts, keys):
+    return {key: needed for key, needed in needed_amounts.items() if key not in keys}
+
+
+def _key(fridge_ingredient):
+    return fridge_ingredient["ingredient"], fridge_ingredient["unit__type"]
+
+
+def _plan(fridge_ingredients, needed_amounts):
+    """Plan the consumption of the needed amounts from the fridge ingredients.
+
+    Args:
+        fridge_ingredients: the fridge ingredients that can be consumed, sorted by
+            catalog ingredient, unit type and expiration date.
+        needed_amounts: a dictionary giving the needed canonical amount for each
+            tuple (catalog ingredient id, unit type id).
+
+    Returns:
+        A list of tuples (fridge ingredient, remaining amount in its unit), one
+        for each consumed fridge ingredient.
+
+    """
+    needed_amounts = dict(needed_amounts)
+    deductions = []
+    for fridge_ingredient in fridge_ingredients:
+        key = _key(fridge_ingredient)
+        needed = needed_amounts.get(key)
+        if not needed:
+            continue
+        amount = fridge_ingredient["canonical_amount"]
+        consumed = min(needed, amount)
+        needed_amounts[key] -= consumed
+        remaining = (amount - consumed) / fridge_ingredient["unit__rapport"]
+        deductions.append(
+            (
+                fridge_ingredient,
+                remaining.quantize(Decimal("0.01"), rounding=ROUND_DOWN),
+            )
+        )
+    return deductions
+
+
+def _apply(deductions):
+    updated = [
+        FridgeIngredient(
+            pk=fridge_ingredient["pk"],
+            ingredient_id=fridge_ingredient["ingredient"],
+            amount=remaining,
+        )
+        for fridge_ingredient, remaining in deductions
+        if remaining
+    ]
+    FridgeIngredient.objects.bulk_update(updated, ["amount"])
+    FridgeIngredient.objects.filter(
+        pk__in=[
+            fridge_ingredient["pk"]
+            for fridge_ingredient, remaining in deductions
+            if not remaining
+        ]
+    ).delete()
+    # bulk updates send no post_save signal
+    events.record_fridge_changes(
+        changed=[fridge_ingredient.pk for fridge_ingredient in updated]
+    )
+    refresh_feasible_recipes(
+        ingredients=[fridge_ingredient.ingredient_id for fridge_ingredient in updated]
+    )
+
+
+def _with_canonical_amount(queryset):
+    return queryset.annotate(
+        canonical_amount=models.ExpressionWrapper(
+            models.F("amount") * models.F("unit__rapport"),
+            output_field=models.DecimalField(max_digits=40, decimal_places=12),
+        )
+    )
@@ -0,0 +1,273 @@
+"""Notification of the changes of the fridge to the clients, as they happen.
+
+Each committed change of the fridge publishes an event that carries only the
+delta: the fridge ingredients added, changed or removed, and the recipes that
+became feasible or unfeasible. The events are published to the broker selected
+with the FRIDGE_EVENT_BROKER setting, and streamed to the clients by the
+fridge events view, with Server-Sent Events.
+
+The default broker, InProcessBroker, keeps the subscriptions in memory, which
+is enough when the application runs in a single process. A deployment with
+several processes needs a broker shared between them, with the same methods:
+with the in-process one, the clients would silently miss the changes made by
+the other processes (see fridge.checks).
+
+The changes recorded inside a batched block, such as the ones of a
+fridge.matching.deferred_refresh block, are gathered into a single event. When
+they concern more than MAX_DELTA_SIZE fridge ingredients and recipes, as after
+a big import or a purge, they are not kept, and a reset event is published
+instead, telling the clients to read the fridge again.
+
+"""
+import collections
+import contextlib
+import functools
+import itertools
+import queue
+import secrets
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+from fridge.models import FridgeIngredient
+from fridge.serializers import FridgeIngredientSerializer
+
+MAX_DELTA_SIZE = 500
+
+_batch = threading.local()
+
+
+class Subscription:
+    """Queue of the events published to a subscriber.
+
+    Attributes:
+        overflowed: whether events were lost, because the subscriber didn't read
+            them fast enough or asked for events that are not kept anymore. The
+            subscriber should then read the whole fridge again.
+
+    """
+
+    def __init__(self, max_size):
+        self._queue: queue.Queue = queue.Queue(max_size)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Wait for the next event.
+
+        Returns:
+            The event, or None if no event was published before the timeout.
+
+        """
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class InProcessBroker:
+    """Broker that publishes the events to the subscribers of the same process.
+
+    The last events are kept, so that a client that reconnects gets the events
+    that it missed. The event ids start with an epoch drawn when the broker is
+    created, so that the ids given before a restart of the process are not
+    taken for the ones given after.
+
+    Attributes:
+        epoch: the random prefix of the ids of the events of the broker.
+
+    """
+
+    history_size = 1000
+    subscription_size = 100
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.epoch = secrets.token_hex(4)
+        self._numbers = itertools.count(1)
+        self._history: collections.deque = collections.deque(maxlen=self.history_size)
+        self._subscriptions: set = set()
+
+    def publish(self, data):
+        """Publish an event to the current subscribers.
+
+        Args:
+            data: the JSON serializable data of the event, or None for a reset
+                event.
+
+        """
+        with self._lock:
+            number = next(self._numbers)
+            event = (f"{self.epoch}-{number}", data)
+            self._history.append((number, event))
+            for subscription in self._subscriptions:
+                subscription.put(event)
+
+    def subscribe(self, last_event_id=None):
+        """Subscribe to the events.
+
+        Args:
+            last_event_id: the id of the last event received by the subscriber,
+                whose following events are sent first, if any. An id of another
+                epoch overflows the subscription.
+
+        Returns:
+            A Subscription, whose events are tuples (id, data).
+
+        """
+        subscription = Subscription(self.subscription_size)
+        with self._lock:
+            if last_event_id is not None:
+                last_number = self._number(last_event_id)
+                first = self._history[0][0] if self._history else 1
+                last = self._history[-1][0] if self._history else 0
+                if last_number is not None and first - 1 <= last_number <= last:
+                    for number, event in self._history:
+                        if number > last_number:
+                            subscription.put(event)
+                else:
+                    subscription.overflowed = True
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def _number(self, event_id):
+        epoch, _, number = event_id.partition("-")
+        if epoch != self.epoch or not number.isdigit():
+            return None
+        return int(number)
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    """Give the broker selected with the FRIDGE_EVENT_BROKER setting."""
+    return import_string(settings.FRIDGE_EVENT_BROKER)()
+
+
+@contextlib.contextmanager
+def batched():
+    """Gather the changes recorded in the block into a single event.
+
+    The changes recorded by a nested block are published at the end of the
+    outermost one. Nothing is published if the block raises an exception.
+
+    """
+    if getattr(_batch, "delta", None) is not None:
+        yield
+        return
+    _batch.delta = _Delta()
+    try:
+        yield
+        delta = _batch.delta
+    finally:
+        _batch.delta = None
+    delta.publish_on_commit()
+
+
+def record_fridge_changes(added=(), changed=(), removed=()):
+    """Record changes of fridge ingredients, to publish them once committed.
+
+    Args:
+        added: the ids of the added fridge ingredients.
+        changed: the ids of the changed fridge ingredients.
+        removed: the ids of the removed fridge ingredients.
+
+    """
+    with batched():
+        _batch.delta.record_fridge_changes(added, changed, removed)
+
+
+def record_feasibility_changes(feasible=(), unfeasible=()):
+    """Record changes of the feasible recipes, to publish them once committed.
+
+    Args:
+        feasible: the ids of the recipes that became feasible.
+        unfeasible: the ids of the recipes that are not feasible anymore.
+
+    """
+    with batched():
+        _batch.delta.record_feasibility_changes(feasible, unfeasible)
+
+
+class _Delta:
+    def __init__(self):
+        self.added, self.changed, self.removed = set(), set(), set()
+        self.feasible, self.unfeasible = set(), set()
+        self.too_large = False
+
+    def record_fridge_changes(self, added, changed, removed):
+        if self.too_large:
+            return
+        self.added.update(added)
+        self.changed.update(set(changed) - self.added)
+        self.added.difference_update(removed)
+        self.changed.difference_update(removed)
+        self.removed.update(removed)
+        self._check_size()
+
+    def record_feasibility_changes(self, feasible, unfeasible):
+        if self.too_large:
+            return
+        for recipe_id in feasible:
+            _toggle(recipe_id, self.feasible, self.unfeasible)
+        for recipe_id in unfeasible:
+            _toggle(recipe_id, self.unfeasible, self.feasible)
+        self._check_size()
+
+    def publish_on_commit(self):
+        if self.too_large or any(self._sets()):
+            transaction.on_commit(lambda: get_broker().publish(self.to_data()))
+
+    def to_data(self):
+        if self.too_large:
+            return None
+        rows = {
+            fridge_ingredient.pk: fridge_ingredient
+            for fridge_ingredient in FridgeIngredient.objects.select_related(
+                "ingredient", "unit"
+            ).filter(pk__in=self.added | self.changed)
+        }
+        return {
+            "fridge_ingredients": {
+                "added": _serialize(rows, self.added),
+                "changed": _serialize(rows, self.changed),
+                "removed": sorted(str(pk) for pk in self.removed),
+            },
+            "recipes": {
+                "feasible": sorted(str(pk) for pk in self.feasible),
+                "unfeasible": sorted(str(pk) for pk in self.unfeasible),
+            },
+        }
+
+    def _sets(self):
+        return self.added, self.changed, self.removed, self.feasible, self.unfeasible
+
+    def _check_size(self):
+        if sum(map(len, self._sets())) > MAX_DELTA_SIZE:
+            self.too_large = True
+            for ids in self._sets():
+                ids.clear()
+
+
+def _toggle(recipe_id, entered, left):
+    # entering then leaving the feasible recipes in the same batch cancels out
+    if recipe_id in left:
+        left.remove(recipe_id)
+    else:
+        entered.add(recipe_id)
+
+
+def _serialize(rows, pks):
+    # the fridge ingredients may have been removed since, by another transaction
+    return FridgeIngredientSerializer(
+        [rows[pk] for pk in sorted(pks, key=str) if pk in rows], many=True
+    ).data
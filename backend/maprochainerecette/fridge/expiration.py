@@ -0,0 +1,113 @@
+"""Fridge ingredients that expire soon, and purge of the expired ones.
+
+Both use the index on the expiration date of the fridge ingredients, so that
+neither scans the whole fridge.
+
+"""
+import datetime
+
+from django.db import models, transaction
+from django.utils import timezone
+from fridge.inventory import export_inventory
+from fridge.matching import deferred_refresh
+from fridge.models import FridgeIngredient
+from units.models import Unit
+
+
+def expiring_stock(days):
+    """Aggregate the fridge ingredients expiring within some days.
+
+    The fridge ingredients already expired are included. They are grouped by
+    catalog ingredient and unit type, like with FridgeIngredientQuerySet.stock,
+    with two queries.
+
+    Args:
+        days: the number of days from today.
+
+    Returns:
+        A list sorted by earliest expiration date of dictionaries with the keys
+        ``ingredient`` (its name), ``unit_type`` (its name), ``canonical_unit``
+        (the abbreviation of the unit of the unit type that has a ratio equal to
+        1), ``canonical_amount`` (the summed converted amount),
+        ``earliest_expiration_date`` and ``fridge_ingredients``, a list sorted by
+        expiration date of dictionaries with the keys ``id``, ``amount``,
+        ``unit`` (its abbreviation) and ``expiration_date``.
+
+    """
+    fridge_ingredients = FridgeIngredient.objects.filter(
+        expiration_date__lte=timezone.localdate() + datetime.timedelta(days=days)
+    )
+    canonical_unit = Unit.objects.filter(
+        type=models.OuterRef("unit__type"), rapport=1
+    ).values("abbreviation")[:1]
+    groups = {
+        (group["ingredient"], group["unit__type"]): {
+            "ingredient": group["ingredient__name"],
+            "unit_type": group["unit__type__name"],
+            "canonical_unit": group["canonical_unit"],
+            "canonical_amount": group["canonical_amount"],
+            "earliest_expiration_date": group["earliest_expiration_date"],
+            "fridge_ingredients": [],
+        }
+        for group in fridge_ingredients.stock()
+        .annotate(canonical_unit=models.Subquery(canonical_unit))
+        .order_by("earliest_expiration_date", "ingredient__name", "unit__type__name")
+    }
+    for fridge_ingredient in fridge_ingredients.order_by(
+        "expiration_date", "pk"
+    ).values(
+        "id",
+        "ingredient",
+        "unit__type",
+        "amount",
+        "unit__abbreviation",
+        "expiration_date",
+    ):
+        key = fridge_ingredient["ingredient"], fridge_ingredient["unit__type"]
+        groups[key]["fridge_ingredients"].append(
+            {
+                "id": fridge_ingredient["id"],
+                "amount": fridge_ingredient["amount"],
+                "unit": fridge_ingredient["unit__abbreviation"],
+                "expiration_date": fridge_ingredient["expiration_date"],
+            }
+        )
+    return list(groups.values())
+
+
+def purge_expired_fridge_ingredients(before, batch_size, archive=None):
+    """Delete the fridge ingredients expired before a date, in batches.
+
+    Each batch is deleted in its own transaction, so that the rows are never
+    locked for long, and the feasible recipes are refreshed once per batch. The
+    archive of a batch is written once its transaction is committed, so that it
+    never contains fridge ingredients that are still in the fridge.
+
+    Args:
+        before: the fridge ingredients expiring strictly before this date are
+            deleted.
+        batch_size: the maximal number of fridge ingredients deleted by batch.
+        archive: a text file to which the deleted fridge ingredients are
+            appended, in the NDJSON format of fridge.inventory, if given.
+
+    Returns:
+        The number of deleted fridge ingredients.
+
+    """
+    deleted = 0
+    while True:
+        with transaction.atomic(), deferred_refresh():
+            pks = list(
+                FridgeIngredient.objects.select_for_update()
+                .filter(expiration_date__lt=before)
+                .order_by("expiration_date", "pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                return deleted
+            batch = FridgeIngredient.objects.filter(pk__in=pks)
+            lines = [] if archive is None else list(export_inventory("ndjson", batch))
+            batch.delete()
+        if archive is not None:
+            archive.writelines(lines)
+        deleted += len(pks)
@@ -0,0 +1,83 @@
+from django.db import connections, models
+from rest_framework import filters, serializers
+
+# Orderings of the fridge ingredients, the first field being the position of the
+# cursor pagination. Each one starts like an index, except the ingredient name,
+# which is on another table.
+FRIDGE_INGREDIENT_ORDERINGS = {
+    "expiration_date": ("expiration_date", "pk"),
+    "-expiration_date": ("-expiration_date", "-pk"),
+    "ingredient": ("ingredient_name", "expiration_date", "pk"),
+    "-ingredient": ("-ingredient_name", "expiration_date", "pk"),
+}
+
+
+class FridgeIngredientFiltersSerializer(serializers.Serializer):
+    ingredient = serializers.CharField(max_length=255, required=False)
+    unit_type = serializers.CharField(max_length=255, required=False)
+    expires_after = serializers.DateField(required=False)
+    expires_before = serializers.DateField(required=False)
+    ordering = serializers.ChoiceField(
+        choices=list(FRIDGE_INGREDIENT_ORDERINGS), default="expiration_date"
+    )
+
+
+class FridgeIngredientFilter(filters.BaseFilterBackend):
+    """Filter and order the fridge ingredients according to the query parameters.
+
+    The query parameters are:
+
+    - ``ingredient``: a prefix of the name of the catalog ingredient, matched
+      with its case and accents, like the names given by the autocompletion of
+      the catalog ingredients,
+    - ``unit_type``: the name of the unit type,
+    - ``expires_after`` and ``expires_before``: the bounds, included, of the
+      expiration date,
+    - ``ordering``: one of FRIDGE_INGREDIENT_ORDERINGS, by expiration date by
+      default.
+
+    The filters are backed by indexes: the one of the names of the catalog
+    ingredients, then the unique constraint of the fridge ingredients, the one
+    of the unit type and expiration date, and the one of the expiration date.
+    The prefix is searched with LIKE on PostgreSQL, where the names have a
+    varchar_pattern_ops index and the range of a prefix depends on the
+    collation. On SQLite, where LIKE ignores the case and doesn't use the index,
+    it is searched by range instead, the names sorting by code points with the
+    default BINARY collation.
+
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        parameters = self._parameters(request)
+        if "ingredient" in parameters:
+            prefix = parameters["ingredient"]
+            if connections[queryset.db].vendor == "sqlite":
+                # the names starting with the prefix sort between the prefix and
+                # the prefix followed by the last character of the BMP
+                queryset = queryset.filter(
+                    ingredient__name__gte=prefix,
+                    ingredient__name__lt=prefix + "\uffff",
+                )
+            else:
+                queryset = queryset.filter(ingredient__name__startswith=prefix)
+        if "unit_type" in parameters:
+            queryset = queryset.filter(unit_type__name=parameters["unit_type"])
+        if "expires_after" in parameters:
+            queryset = queryset.filter(expiration_date__gte=parameters["expires_after"])
+        if "expires_before" in parameters:
+            queryset = queryset.filter(
+                expiration_date__lte=parameters["expires_before"]
+            )
+        return queryset.annotate(ingredient_name=models.F("ingredient__name")).order_by(
+            *FRIDGE_INGREDIENT_ORDERINGS[parameters["ordering"]]
+        )
+
+    def get_ordering(self, request, queryset, view):
+        """Give the ordering used by the cursor pagination."""
+        return FRIDGE_INGREDIENT_ORDERINGS[self._parameters(request)["ordering"]]
+
+    @staticmethod
+    def _parameters(request):
+        parameters = FridgeIngredientFiltersSerializer(data=request.query_params)
+        parameters.is_valid(raise_exception=True)
+        return parameters.validated_data
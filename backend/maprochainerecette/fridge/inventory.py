@@ -0,0 +1,164 @@
+"""Streaming export and import of the fridge inventory, in NDJSON or CSV.
+
+An inventory is a sequence of records with the fields of FIELDS: the name of the
+catalog ingredient, the amount, the abbreviation of the unit and the expiration
+date. In NDJSON, each line is a JSON object with these keys, and in CSV, the
+first line gives the names of the columns.
+
+The export reads the fridge ingredients with a server-side cursor, on the
+databases that support it, and the import parses and merges the records in
+batches of BATCH_SIZE records, each in its own transaction, so that neither the
+memory use nor the time the database is locked depend on the size of the
+inventory.
+
+"""
+import csv
+import itertools
+import json
+
+from fridge.bulk import add_fridge_ingredients
+from fridge.models import FridgeIngredient
+from fridge.serializers import BulkFridgeIngredientsSerializer
+
+FIELDS = ("ingredient", "amount", "unit", "expiration_date")
+CONTENT_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+BATCH_SIZE = 500
+CHUNK_SIZE = 2000
+
+
+class InvalidInventory(Exception):
+    """A record of an imported inventory is invalid.
+
+    Attributes:
+        line: the number of the line of the record, starting at 1.
+        errors: a dictionary giving the list of the errors of each field.
+        created: the number of fridge ingredients created by the batches
+            imported before the one of the record.
+        merged: the number of records of these batches merged into an existing
+            fridge ingredient or into a previous record.
+
+    """
+
+    def __init__(self, line, errors, created=0, merged=0):
+        super().__init__(f"Invalid record on line {line}: {errors}")
+        self.line = line
+        self.errors = errors
+        self.created = created
+        self.merged = merged
+
+
+class _Echo:
+    """File-like object whose write method gives back what is written."""
+
+    def write(self, value):
+        return value
+
+
+def export_inventory(file_format, fridge_ingredients=None):
+    """Generate the lines of the fridge inventory.
+
+    The fridge ingredients are sorted by ingredient name and expiration date.
+
+    Args:
+        file_format: "ndjson" or "csv".
+        fridge_ingredients: the queryset of the fridge ingredients to export, the
+            whole fridge by default.
+
+    Yields:
+        The lines of the inventory, each ending with a newline.
+
+    """
+    if fridge_ingredients is None:
+        fridge_ingredients = FridgeIngredient.objects.all()
+    records = (
+        fridge_ingredients.order_by(
+            "ingredient__name", "expiration_date", "unit__abbreviation"
+        )
+        .values_list(
+            "ingredient__name", "amount", "unit__abbreviation", "expiration_date"
+        )
+        .iterator(chunk_size=CHUNK_SIZE)
+    )
+    if file_format == "csv":
+        writer = csv.writer(_Echo(), lineterminator="\n")
+        yield writer.writerow(FIELDS)
+        for record in records:
+            yield writer.writerow(record)
+        return
+    for name, amount, unit, expiration_date in records:
+        record = dict(zip(FIELDS, (name, str(amount), unit, str(expiration_date))))
+        yield json.dumps(record, ensure_ascii=False) + "\n"
+
+
+def import_inventory(lines, file_format):
+    """Add the fridge ingredients of an inventory to the fridge.
+
+    The fridge ingredients are merged with each other and with the stock, like
+    with fridge.bulk.add_fridge_ingredients. Each batch is imported in its own
+    transaction, after which the feasible recipes are refreshed and the changes
+    published, so that a big inventory neither holds the database lock for the
+    whole import nor accumulates its changes in memory.
+
+    Args:
+        lines: an iterable of the lines of the inventory.
+        file_format: "ndjson" or "csv".
+
+    Returns:
+        A tuple (number of created fridge ingredients, number of records merged
+        into an existing fridge ingredient or into a previous record).
+
+    Raises:
+        InvalidInventory: a record is invalid, in which case nothing of its
+            batch is imported, but the previous batches stay imported.
+
+    """
+    created_count = merged_count = 0
+    try:
+        for batch in _batches(_records(lines, file_format)):
+            serializer = BulkFridgeIngredientsSerializer(
+                data={"ingredients": [record for _, record in batch]}
+            )
+            if not serializer.is_valid():
+                for (line, _), errors in zip(batch, serializer.errors["ingredients"]):
+                    if errors:
+                        raise InvalidInventory(line, errors)
+            # one transaction, refresh and event for each batch
+            for _, created in add_fridge_ingredients(
+                serializer.validated_data["ingredients"]
+            ):
+                if created:
+                    created_count += 1
+                else:
+                    merged_count += 1
+    except InvalidInventory as error:
+        error.created, error.merged = created_count, merged_count
+        raise
+    return created_count, merged_count
+
+
+def _batches(records):
+    records = iter(records)
+    batch = list(itertools.islice(records, BATCH_SIZE))
+    while batch:
+        yield batch
+        batch = list(itertools.islice(records, BATCH_SIZE))
+
+
+def _records(lines, file_format):
+    if file_format == "csv":
+        reader = csv.DictReader(lines)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            record = None
+        if not isinstance(record, dict):
+            raise InvalidInventory(
+                line_number, {"non_field_errors": ["Invalid JSON object."]}
+            )
+        yield line_number, record
@@ -0,0 +1,111 @@
+import datetime
+import time
+import uuid
+
+from catalogs.models import Ingredient
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from fridge.models import FridgeIngredient
+from units.models import Unit, UnitType
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the aggregation of the fridge stock done in Python with the "
+        "one done by the database. The fridge ingredients needed by the benchmark "
+        "are created in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows", type=int, default=50000, help="Number of fridge ingredients."
+        )
+        parser.add_argument(
+            "--repeat", type=int, default=5, help="Number of runs of each method."
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._create_fridge_ingredients(options["rows"])
+            python_time, python_stock = self._best_time(
+                self._python_stock, options["repeat"]
+            )
+            database_time, database_stock = self._best_time(
+                self._database_stock, options["repeat"]
+            )
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f"{options['rows']} fridge ingredients on {connection.vendor}:\n"
+            f"  python aggregation:   {python_time * 1000:.1f} ms\n"
+            f"  database aggregation: {database_time * 1000:.1f} ms"
+        )
+        if python_stock != database_stock:
+            self.stderr.write("The two aggregations give different results.")
+
+    @staticmethod
+    def _create_fridge_ingredients(rows):
+        mass = UnitType.objects.create(name="benchmark mass")
+        volume = UnitType.objects.create(name="benchmark volume")
+        units = [
+            Unit.objects.create(
+                name=name, abbreviation=name, rapport=rapport, type=type
+            )
+            for name, rapport, type in [
+                ("benchmark g", 1, mass),
+                ("benchmark kg", 1000, mass),
+                ("benchmark ml", 1, volume),
+                ("benchmark l", 1000, volume),
+            ]
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"benchmark ingredient {i}") for i in range(1000)
+        )
+        first_date = datetime.date(2030, 1, 1)
+        FridgeIngredient.objects.bulk_create(
+            (
+                FridgeIngredient(
+                    id=uuid.uuid4(),
+                    ingredient=ingredients[i % len(ingredients)],
+                    amount=i % 500 + 1,
+                    unit=units[i % len(units)],
+                    unit_type=units[i % len(units)].type,
+                    expiration_date=first_date + datetime.timedelta(days=i % 365),
+                )
+                for i in range(rows)
+            ),
+            batch_size=1000,
+        )
+
+    @staticmethod
+    def _best_time(method, repeat):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = method()
+            times.append(time.perf_counter() - start)
+        return min(times), result
+
+    @staticmethod
+    def _python_stock():
+        stock: dict = {}
+        for fridge_ingredient in FridgeIngredient.objects.select_related(
+            "ingredient", "unit__type"
+        ):
+            key = (fridge_ingredient.ingredient.name, fridge_ingredient.unit.type.name)
+            amount = fridge_ingredient.amount * fridge_ingredient.unit.rapport
+            date = fridge_ingredient.expiration_date
+            if key in stock:
+                stock[key] = (stock[key][0] + amount, min(stock[key][1], date))
+            else:
+                stock[key] = (amount, date)
+        return stock
+
+    @staticmethod
+    def _database_stock():
+        return {
+            (row["ingredient__name"], row["unit__type__name"]): (
+                row["canonical_amount"],
+                row["earliest_expiration_date"],
+            )
+            for row in FridgeIngredient.objects.stock()
+        }
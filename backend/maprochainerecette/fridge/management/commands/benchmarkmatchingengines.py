@@ -0,0 +1,145 @@
+import datetime
+import random
+import time
+import uuid
+
+from catalogs.models import Ingredient, IngredientRecipeIndex, Recipe, RecipeIngredient
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from fridge.matching import MATCHING_ENGINES, _get_matching_engine
+from fridge.models import FridgeIngredient
+from units.models import Unit, UnitType
+
+BATCH_SIZE = 5000
+
+
+class Command(BaseCommand):
+    help = (
+        "Compares the time needed by each matching engine to match the whole "
+        "catalog against the fridge. The recipes and fridge ingredients needed by "
+        "the benchmark are created in a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--recipes", type=int, default=100000, help="Number of recipes."
+        )
+        parser.add_argument(
+            "--ingredients", type=int, default=2000, help="Number of ingredients."
+        )
+        parser.add_argument(
+            "--fridge", type=int, default=300, help="Number of fridge ingredients."
+        )
+
+    def handle(self, *args, **options):
+        times: dict = {}
+        results: dict = {}
+        with transaction.atomic():
+            self._create_dataset(
+                options["recipes"], options["ingredients"], options["fridge"]
+            )
+            for engine in MATCHING_ENGINES:
+                with override_settings(FRIDGE_MATCHING_ENGINE=engine):
+                    match = _get_matching_engine()
+                    # the first run of the numpy engine includes the catalog loading
+                    times[engine] = []
+                    for _ in range(2):
+                        start = time.perf_counter()
+                        feasible_recipes = list(match(Recipe.objects.all()))
+                        times[engine].append(time.perf_counter() - start)
+                results[engine] = {
+                    recipe["pk"]: (
+                        recipe["priority_ingredient"],
+                        recipe["priority_date"],
+                        sorted(recipe["unsure_ingredients"] or []),
+                    )
+                    for recipe in feasible_recipes
+                }
+            transaction.set_rollback(True)
+        self.stdout.write(
+            f"{options['recipes']} recipes and {options['fridge']} fridge "
+            f"ingredients on {connection.vendor}, "
+            f"{len(results['sql'])} feasible recipes:"
+        )
+        for engine, (first_time, second_time) in times.items():
+            self.stdout.write(
+                f"  {engine}: first run {first_time * 1000:.1f} ms, "
+                f"second run {second_time * 1000:.1f} ms"
+            )
+        if any(result != results["sql"] for result in results.values()):
+            self.stderr.write("The matching engines give different results.")
+
+    def _create_dataset(self, recipes_count, ingredients_count, fridge_count):
+        generator = random.Random(0)  # noqa: S311
+        mass = UnitType.objects.create(name="benchmark mass")
+        pieces = UnitType.objects.create(name="benchmark pieces")
+        units = [
+            Unit.objects.create(
+                name=name, abbreviation=name, rapport=rapport, type=unit_type
+            )
+            for name, rapport, unit_type in [
+                ("benchmark g", 1, mass),
+                ("benchmark kg", 1000, mass),
+                ("benchmark pieces", 1, pieces),
+            ]
+        ]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f"benchmark ingredient {i}")
+            for i in range(ingredients_count)
+        )
+        FridgeIngredient.objects.bulk_create(
+            FridgeIngredient(
+                id=uuid.uuid4(),
+                ingredient=ingredient,
+                amount=generator.randint(1, 2000),
+                unit=units[i % 5 // 4 * 2],
+                unit_type=units[i % 5 // 4 * 2].type,
+                expiration_date=datetime.date(2030, 1, 1)
+                + datetime.timedelta(days=generator.randint(0, 60)),
+            )
+            for i, ingredient in enumerate(ingredients[:fridge_count])
+        )
+        # half of the recipes only use common ingredients, so that some are feasible
+        common_ingredients = ingredients[: fridge_count * 2]
+        for first_recipe in range(0, recipes_count, BATCH_SIZE):
+            self._create_recipes(
+                generator,
+                range(first_recipe, min(first_recipe + BATCH_SIZE, recipes_count)),
+                [common_ingredients, ingredients],
+                units,
+            )
+        Recipe.objects.filter(description="benchmark").update_ingredients_bitsets()
+
+    @staticmethod
+    def _create_recipes(generator, numbers, ingredients_pools, units):
+        recipes, recipe_ingredients, links, index_entries = [], [], [], []
+        for number in numbers:
+            pool = ingredients_pools[number % 2]
+            recipe_catalog_ingredients = generator.sample(pool, generator.randint(2, 6))
+            recipe = Recipe(
+                title=f"benchmark recipe {number}",
+                description="benchmark",
+                duration=datetime.timedelta(minutes=30),
+                ingredients_count=len(recipe_catalog_ingredients),
+            )
+            recipes.append(recipe)
+            for ingredient in recipe_catalog_ingredients:
+                recipe_ingredient = RecipeIngredient(
+                    ingredient=ingredient,
+                    amount=generator.randint(1, 500),
+                    unit=generator.choice(units),
+                )
+                recipe_ingredients.append(recipe_ingredient)
+                links.append(
+                    Recipe.ingredients.through(
+                        recipe_id=recipe.id, recipeingredient_id=recipe_ingredient.id
+                    )
+                )
+                index_entries.append(
+                    IngredientRecipeIndex(ingredient=ingredient, recipe=recipe)
+                )
+        Recipe.objects.bulk_create(recipes)
+        RecipeIngredient.objects.bulk_create(recipe_ingredients)
+        Recipe.ingredients.through.objects.bulk_create(links)
+        IngredientRecipeIndex.objects.bulk_create(index_entries)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from fridge.inventory import CONTENT_TYPES, export_inventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Exports the fridge inventory, in NDJSON or in CSV, to the standard output "
+        "or to a file. The fridge ingredients are streamed, so that the memory use "
+        "doesn't depend on the size of the fridge."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--format", choices=list(CONTENT_TYPES), default="ndjson", dest="format"
+        )
+        parser.add_argument("--output", help="Path of the file to write.")
+
+    def handle(self, *args, **options):
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8", newline="") as output:
+                output.writelines(export_inventory(options["format"]))
+        else:
+            for line in export_inventory(options["format"]):
+                self.stdout.write(line, ending="")
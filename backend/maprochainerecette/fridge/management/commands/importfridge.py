@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+from fridge.inventory import CONTENT_TYPES, InvalidInventory, import_inventory
+
+
+class Command(BaseCommand):
+    help = (
+        "Imports a fridge inventory, in NDJSON or in CSV, merging its fridge "
+        "ingredients with the ones in the fridge. The inventory is read and merged "
+        "in batches, each in its own transaction: the import stops before the "
+        "batch of an invalid record."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the inventory file.")
+        parser.add_argument(
+            "--format",
+            choices=list(CONTENT_TYPES),
+            dest="format",
+            help="Format of the inventory, guessed from the file extension by default.",
+        )
+
+    def handle(self, *args, **options):
+        file_format = options["format"] or (
+            "csv" if options["path"].lower().endswith(".csv") else "ndjson"
+        )
+        try:
+            with open(options["path"], encoding="utf-8", newline="") as lines:
+                created, merged = import_inventory(lines, file_format)
+        except InvalidInventory as error:
+            raise CommandError(
+                f"{error} ({error.created} fridge ingredients created, "
+                f"{error.merged} merged into existing ones before it)"
+            )
+        self.stdout.write(
+            f"{created} fridge ingredients created, {merged} merged into existing ones."
+        )
@@ -0,0 +1,42 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from fridge.expiration import purge_expired_fridge_ingredients
+
+
+class Command(BaseCommand):
+    help = (
+        "Deletes the fridge ingredients that expired before a date, today by "
+        "default, optionally archiving them to an NDJSON file that importfridge can "
+        "read. The fridge ingredients are deleted in batches, each in its own "
+        "transaction, so that the command can run periodically on a big fridge "
+        "without locking it for long."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--before",
+            type=datetime.date.fromisoformat,
+            help="Date in the format YYYY-MM-DD, today by default.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of fridge ingredients deleted by transaction.",
+        )
+        parser.add_argument(
+            "--archive", help="Path of an NDJSON file to append the deleted rows to."
+        )
+
+    def handle(self, *args, **options):
+        before = options["before"] or timezone.localdate()
+        if options["archive"]:
+            with open(options["archive"], "a", encoding="utf-8") as archive:
+                deleted = purge_expired_fridge_ingredients(
+                    before, options["batch_size"], archive
+                )
+        else:
+            deleted = purge_expired_fridge_ingredients(before, options["batch_size"])
+        self.stdout.write(f"{deleted} expired fridge ingredients deleted.")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from fridge.matching import refresh_feasible_recipes
+from fridge.models import FeasibleRecipe
+from versions.models import VersionStamp
+
+
+class Command(BaseCommand):
+    help = (
+        "Recomputes the stored feasibility and shortage of all the recipes. They are "
+        "kept up to date when the fridge or the catalog change, so this is only "
+        "needed after a migration or a change made outside the application."
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # the stored feasibilities change without any fridge ingredient being
+            # saved, so the clients' cached lists of feasible recipes are
+            # invalidated by hand
+            VersionStamp.objects.bump("fridge")
+            refresh_feasible_recipes()
+        self.stdout.write(f"{FeasibleRecipe.objects.count()} feasible recipes.")
@@ -0,0 +1,395 @@
+"""Matching of the catalog recipes against the fridge stock.
+
+The whole matching is done by the database: each recipe ingredient is compared
+to the fridge stock of its catalog ingredient, and a recipe is feasible when all
+its ingredients are satisfied (relational division).
+
+A recipe ingredient is satisfied when the fridge contains enough of it with the
+same unit type, and unsure when it is not the case but the fridge contains it
+with another unit type, as conversions between unit types are not implemented yet.
+
+As the fridge changes much less often than the feasible recipes are read, the
+result of the matching is stored in the FeasibleRecipe table, and only the
+recipes affected by a change of the fridge or of the catalog are recomputed.
+
+The recomputation is done by the matching engine selected with the
+FRIDGE_MATCHING_ENGINE setting: "sql" (the default) runs the matching in the
+database, "numpy" runs it in memory with vectorized operations (see
+fridge.vectorized).
+
+The number of missing ingredients of every recipe is stored too, in the
+RecipeShortage table, so that the almost feasible recipes, that miss a few
+ingredients, are read with an index.
+
+Changes made in bulk can gather their refreshes with deferred_refresh, so that
+the affected recipes are recomputed once instead of once per changed row.
+
+"""
+import contextlib
+import threading
+from decimal import ROUND_UP, Decimal
+
+from catalogs.models import IngredientRecipeIndex, Recipe, RecipeIngredient
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models, transaction
+from django.utils.module_loading import import_string
+from fridge import events
+from fridge.models import FeasibleRecipe, FridgeIngredient, RecipeShortage
+
+MATCHING_ENGINES = {
+    "sql": "fridge.matching.match_with_sql",
+    "numpy": "fridge.vectorized.match_with_numpy",
+}
+
+_deferred = threading.local()
+
+
+class JSONGroupArray(models.Aggregate):
+    """Aggregate the values of a group into a JSON array."""
+
+    function = "JSON_GROUP_ARRAY"
+    output_field = models.JSONField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        clone = self.copy()
+        clone.function = "JSONB_AGG"
+        return clone.as_sql(compiler, connection, **extra_context)
+
+
+def feasible_recipes():
+    """Read the stored feasible recipes.
+
+    Recipes are annotated like with compute_feasible_recipes, and are ordered
+    by ``priority_date``.
+
+    """
+    return (
+        Recipe.objects.filter(feasibility__isnull=False)
+        .annotate(
+            priority_ingredient=models.F("feasibility__priority_ingredient"),
+            priority_date=models.F("feasibility__priority_date"),
+            unsure_ingredients=models.F("feasibility__unsure_ingredients"),
+        )
+        .order_by("priority_date")
+    )
+
+
+def almost_feasible_recipes(max_missing, limit):
+    """Read the recipes that miss at least one, and at most max_missing, ingredients.
+
+    A recipe ingredient is missing when the fridge does not contain enough of it,
+    neither with the same unit type nor with another one (see the module docstring).
+
+    Recipes are sorted by number of missing ingredients, then by expiration date
+    of their priority ingredient (recipes without any available ingredient are
+    last), and are annotated like with compute_feasible_recipes, plus
+    ``missing_ingredients``: a list of dictionaries with the keys ``ingredient``
+    (its name), ``amount`` (the missing amount, in the unit of the recipe) and
+    ``unit`` (its abbreviation).
+
+    The recipes are read from the RecipeShortage table, and only their own
+    ingredients are compared to the fridge stock, to list the missing ones.
+
+    Args:
+        max_missing: the maximum number of missing ingredients.
+        limit: the maximum number of recipes to return.
+
+    Returns:
+        A list of recipes, with their ingredients and categories prefetched.
+
+    """
+    recipe_ids = list(
+        RecipeShortage.objects.filter(missing_count__range=(1, max_missing))
+        .order_by(
+            "missing_count", models.F("priority_date").asc(nulls_last=True), "recipe"
+        )
+        .values_list("recipe", flat=True)[:limit]
+    )
+    statuses = _compare_to_stock(
+        RecipeIngredient.objects.filter(recipe__in=recipe_ids), _stock()
+    )
+    recipes = Recipe.objects.with_ingredients().in_bulk(recipe_ids)
+    for recipe_id in recipe_ids:
+        recipe = recipes[recipe_id]
+        status = statuses[recipe_id]
+        priority = min(status["available"], default=(None,) * 3)
+        recipe.priority_date, _, recipe.priority_ingredient = priority
+        recipe.unsure_ingredients = sorted(status["unsure"])
+        recipe.missing_ingredients = status["missing"]
+    return [recipes[recipe_id] for recipe_id in recipe_ids]
+
+
+def _stock():
+    return {
+        (row["ingredient"], row["unit__type"]): row
+        for row in FridgeIngredient.objects.stock()
+    }
+
+
+def _compare_to_stock(recipe_ingredients, stock):
+    unit_types: dict = {}
+    for ingredient_id, unit_type_id in stock:
+        unit_types.setdefault(ingredient_id, set()).add(unit_type_id)
+    statuses: dict = {}
+    for (
+        recipe_id,
+        ingredient_id,
+        name,
+        amount,
+        rapport,
+        unit_type_id,
+        abbreviation,
+    ) in recipe_ingredients.values_list(
+        "recipe",
+        "ingredient",
+        "ingredient__name",
+        "amount",
+        "unit__rapport",
+        "unit__type",
+        "unit__abbreviation",
+    ):
+        status = statuses.setdefault(
+            recipe_id, {"missing": [], "unsure": [], "available": []}
+        )
+        needed = amount * rapport
+        same_unit_type = stock.get((ingredient_id, unit_type_id))
+        in_stock = Decimal(same_unit_type["canonical_amount"] if same_unit_type else 0)
+        if same_unit_type and in_stock >= needed:
+            status["available"].append(
+                (same_unit_type["earliest_expiration_date"], ingredient_id, name)
+            )
+        elif unit_types.get(ingredient_id, set()) - {unit_type_id}:
+            earliest_date = min(
+                stock[ingredient_id, other_unit_type]["earliest_expiration_date"]
+                for other_unit_type in unit_types[ingredient_id]
+            )
+            status["available"].append((earliest_date, ingredient_id, name))
+            status["unsure"].append(name)
+        else:
+            status["missing"].append(
+                {
+                    "ingredient": name,
+                    "amount": _missing_amount(amount, rapport, in_stock),
+                    "unit": abbreviation,
+                }
+            )
+    return statuses
+
+
+def _missing_amount(amount, rapport, in_stock):
+    if not in_stock:
+        return amount
+    # rounded up, so that buying the missing amount is enough
+    return ((amount * rapport - in_stock) / rapport).quantize(
+        Decimal("0.01"), rounding=ROUND_UP
+    )
+
+
+@contextlib.contextmanager
+def deferred_refresh():
+    """Gather the refreshes requested in the block, and do them once at its end.
+
+    The refreshes requested by a nested block are done at the end of the
+    outermost one. Nothing is refreshed if the block raises an exception.
+
+    The changes of the fridge and of the feasible recipes are published as a
+    single event too (see fridge.events.batched).
+
+    """
+    if getattr(_deferred, "changes", None) is not None:
+        yield
+        return
+    with events.batched():
+        _deferred.changes = {"all": False, "ingredients": set(), "recipes": set()}
+        try:
+            yield
+            changes = _deferred.changes
+        finally:
+            _deferred.changes = None
+        if changes["all"]:
+            refresh_feasible_recipes()
+        elif changes["ingredients"] or changes["recipes"]:
+            refresh_feasible_recipes(
+                ingredients=list(changes["ingredients"]),
+                recipes=list(changes["recipes"]),
+            )
+
+
+def refresh_feasible_recipes(ingredients=None, recipes=None):
+    """Recompute the stored feasibility and coverage of the recipes affected by a change.
+
+    When neither ingredients nor recipes are given, all the recipes are recomputed.
+    Inside a deferred_refresh block, the recomputation is postponed to its end.
+
+    Args:
+        ingredients: the ids of the catalog ingredients whose fridge stock changed.
+        recipes: the ids of the recipes whose ingredients changed.
+
+    """
+    changes = getattr(_deferred, "changes", None)
+    if changes is not None:
+        if ingredients is None and recipes is None:
+            changes["all"] = True
+        changes["ingredients"].update(ingredients or [])
+        changes["recipes"].update(recipes or [])
+        return
+    affected_recipes = Recipe.objects.all()
+    if ingredients is not None or recipes is not None:
+        affected_recipes = affected_recipes.filter(
+            models.Q(pk__in=recipes or [])
+            | models.Q(
+                pk__in=IngredientRecipeIndex.objects.filter(
+                    ingredient__in=ingredients or []
+                ).values("recipe")
+            )
+        )
+    match = _get_matching_engine()
+    with transaction.atomic():
+        # Writing first takes the database write lock at once on SQLite, instead
+        # of upgrading a read lock, which fails when refreshes run concurrently.
+        RecipeShortage.objects.filter(recipe__in=affected_recipes).delete()
+        previous_feasibilities = FeasibleRecipe.objects.filter(
+            recipe__in=affected_recipes
+        )
+        previously_feasible = set(
+            previous_feasibilities.values_list("recipe", flat=True)
+        )
+        previous_feasibilities.delete()
+        feasibilities = FeasibleRecipe.objects.bulk_create(
+            FeasibleRecipe(
+                recipe_id=recipe["pk"],
+                priority_ingredient=recipe["priority_ingredient"],
+                priority_date=recipe["priority_date"],
+                unsure_ingredients=sorted(recipe["unsure_ingredients"] or []),
+            )
+            for recipe in match(affected_recipes)
+        )
+        feasible = {feasibility.recipe_id for feasibility in feasibilities}
+        events.record_feasibility_changes(
+            feasible=feasible - previously_feasible,
+            unfeasible=previously_feasible - feasible,
+        )
+        RecipeShortage.objects.bulk_create(
+            (
+                RecipeShortage(
+                    recipe_id=recipe_id,
+                    missing_count=len(status["missing"]),
+                    priority_date=min(status["available"], default=(None,))[0],
+                )
+                for recipe_id, status in _compare_to_stock(
+                    RecipeIngredient.objects.filter(recipe__in=affected_recipes),
+                    _stock(),
+                ).items()
+            ),
+            batch_size=1000,
+        )
+
+
+def _get_matching_engine():
+    engine = settings.FRIDGE_MATCHING_ENGINE
+    if engine not in MATCHING_ENGINES:
+        raise ImproperlyConfigured(
+            f"Unknown FRIDGE_MATCHING_ENGINE {engine!r}, "
+            f"choose among {', '.join(MATCHING_ENGINES)}."
+        )
+    return import_string(MATCHING_ENGINES[engine])
+
+
+def match_with_sql(recipes):
+    """Match the given recipes against the fridge stock with the database.
+
+    Args:
+        recipes: the queryset of the recipes to match.
+
+    Returns:
+        An iterable of dictionaries, one for each feasible recipe, with the keys
+        ``pk``, ``priority_ingredient``, ``priority_date`` and ``unsure_ingredients``.
+
+    """
+    return (
+        compute_feasible_recipes()
+        .filter(pk__in=recipes)
+        .values("pk", "priority_ingredient", "priority_date", "unsure_ingredients")
+    )
+
+
+def compute_feasible_recipes():
+    """Build the queryset of the recipes that are feasible with the fridge stock.
+
+    Recipes are annotated with ``priority_ingredient`` (the name of the ingredient
+    that will expire the sooner, the first one by id in case of a tie),
+    ``priority_date`` (its expiration date) and ``unsure_ingredients`` (the list
+    of the names of the unsure ingredients, or None if there is no such
+    ingredient), and are ordered by ``priority_date``.
+
+    Only the recipes whose ingredients are all in the fridge are compared to the
+    stock, thanks to the ingredient to recipes index.
+
+    """
+    statuses = _recipe_ingredients_statuses().filter(recipe=models.OuterRef("pk"))
+    available = statuses.filter(models.Q(enough=True) | models.Q(other_unit_type=True))
+    # ties are broken by ingredient id so that all the matching engines agree
+    first_available = available.order_by("stock_date", "ingredient")
+    return (
+        Recipe.objects.covered_by(FridgeIngredient.objects.values("ingredient"))
+        .annotate(
+            ingredients_total=_count(statuses),
+            satisfied_ingredients_count=_count(available),
+            priority_ingredient=models.Subquery(
+                first_available.values("ingredient__name")[:1]
+            ),
+            priority_date=models.Subquery(first_available.values("stock_date")[:1]),
+            unsure_ingredients=models.Subquery(
+                statuses.filter(enough=False, other_unit_type=True)
+                .values("recipe")
+                .annotate(names=JSONGroupArray("ingredient__name"))
+                .values("names")
+            ),
+        )
+        .filter(satisfied_ingredients_count=models.F("ingredients_total"))
+        .order_by("priority_date")
+    )
+
+
+def _recipe_ingredients_statuses():
+    ingredient_stock = FridgeIngredient.objects.filter(
+        ingredient=models.OuterRef("ingredient")
+    )
+    same_unit_type_stock = ingredient_stock.filter(
+        unit__type=models.OuterRef("unit__type")
+    )
+    return RecipeIngredient.objects.annotate(
+        canonical_amount=models.F("amount") * models.F("unit__rapport"),
+        same_unit_type_amount=models.Subquery(
+            same_unit_type_stock.stock().values("canonical_amount")
+        ),
+        enough=models.ExpressionWrapper(
+            models.Q(same_unit_type_amount__isnull=False)
+            & models.Q(same_unit_type_amount__gte=models.F("canonical_amount")),
+            output_field=models.BooleanField(),
+        ),
+        other_unit_type=models.Exists(
+            ingredient_stock.exclude(unit__type=models.OuterRef("unit__type"))
+        ),
+        stock_date=models.Case(
+            models.When(enough=True, then=_earliest_date(same_unit_type_stock)),
+            default=_earliest_date(ingredient_stock),
+        ),
+    )
+
+
+def _earliest_date(fridge_ingredients):
+    return models.Subquery(
+        fridge_ingredients.order_by("expiration_date").values("expiration_date")[:1]
+    )
+
+
+def _count(recipe_ingredients):
+    return models.Subquery(
+        recipe_ingredients.order_by()
+        .values("recipe")
+        .annotate(count=models.Count("pk"))
+        .values("count"),
+        output_field=models.IntegerField(),
+    )
@@ -0,0 +1,78 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0002_ingredientrecipeindex"),
+        ("fridge", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FeasibleRecipe",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "priority_ingredient",
+                    models.CharField(
+                        max_length=255, verbose_name="Most priority ingredient"
+                    ),
+                ),
+                (
+                    "priority_date",
+                    models.DateField(
+                        verbose_name="Expiration date of the priority ingredient"
+                    ),
+                ),
+                (
+                    "unsure_ingredients",
+                    models.JSONField(default=list, verbose_name="Unsure ingredients"),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="feasibility",
+                        to="catalogs.recipe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="feasiblerecipe",
+            index=models.Index(
+                fields=["priority_date"], name="fridge_feas_priorit_8f13fb_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 4.1.2 on 2026-10-18 13:51
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import model_utils.fields
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("catalogs", "0003_ingredients_bitsets"),
+        ("fridge", "0002_feasiblerecipe"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecipeShortage",
+            fields=[
+                (
+                    "created",
+                    model_utils.fields.AutoCreatedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="created",
+                    ),
+                ),
+                (
+                    "modified",
+                    model_utils.fields.AutoLastModifiedField(
+                        default=django.utils.timezone.now,
+                        editable=False,
+                        verbose_name="modified",
+                    ),
+                ),
+                (
+                    "missing_count",
+                    models.PositiveIntegerField(
+                        verbose_name="Number of missing ingredients"
+                    ),
+                ),
+                (
+                    "priority_date",
+                    models.DateField(
+                        null=True,
+                        verbose_name="Expiration date of the priority ingredient",
+                    ),
+                ),
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "recipe",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="shortage",
+                        to="catalogs.recipe",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="recipeshortage",
+            index=models.Index(
+                fields=["missing_count", "priority_date"],
+                name="fridge_reci_missing_582746_idx",
+            ),
+        ),
+    ]
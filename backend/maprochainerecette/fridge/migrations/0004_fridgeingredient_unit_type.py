@@ -0,0 +1,56 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:02
+
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def merge_duplicates(apps, schema_editor):
+    """Fill the unit types, and merge the fridge ingredients that should have been."""
+    FridgeIngredient = apps.get_model("fridge", "FridgeIngredient")
+    groups: dict = {}
+    for fridge_ingredient in FridgeIngredient.objects.select_related("unit"):
+        fridge_ingredient.unit_type_id = fridge_ingredient.unit.type_id
+        fridge_ingredient.save(update_fields=["unit_type"])
+        key = (
+            fridge_ingredient.ingredient_id,
+            fridge_ingredient.expiration_date,
+            fridge_ingredient.unit_type_id,
+        )
+        groups.setdefault(key, []).append(fridge_ingredient)
+    for duplicates in groups.values():
+        if len(duplicates) == 1:
+            continue
+        kept = max(duplicates, key=lambda duplicate: duplicate.unit.rapport)
+        kept.amount = (
+            sum(duplicate.amount * duplicate.unit.rapport for duplicate in duplicates)
+            / kept.unit.rapport
+        ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+        kept.save(update_fields=["amount"])
+        FridgeIngredient.objects.filter(
+            pk__in=[duplicate.pk for duplicate in duplicates if duplicate != kept]
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("units", "0001_initial"),
+        ("fridge", "0003_recipeshortage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fridgeingredient",
+            name="unit_type",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="units.unittype",
+            ),
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("units", "0001_initial"),
+        ("fridge", "0004_fridgeingredient_unit_type"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="fridgeingredient",
+            name="unit_type",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="units.unittype",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="fridgeingredient",
+            constraint=models.UniqueConstraint(
+                fields=("ingredient", "expiration_date", "unit_type"),
+                name="unique_fridge_ingredient",
+            ),
+        ),
+    ]
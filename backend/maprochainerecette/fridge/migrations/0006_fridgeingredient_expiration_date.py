@@ -0,0 +1,19 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fridge", "0005_unique_fridge_ingredient"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="fridgeingredient",
+            index=models.Index(
+                fields=["expiration_date"], name="fridge_frid_expirat_d3d034_idx"
+            ),
+        ),
+    ]
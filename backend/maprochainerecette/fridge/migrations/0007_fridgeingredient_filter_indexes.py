@@ -0,0 +1,30 @@
+# Generated by Django 4.1.2 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("fridge", "0006_fridgeingredient_expiration_date"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="fridgeingredient",
+            name="fridge_frid_expirat_d3d034_idx",
+        ),
+        migrations.AddIndex(
+            model_name="fridgeingredient",
+            index=models.Index(
+                fields=["expiration_date", "id"], name="fridge_frid_expirat_8eb2ed_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="fridgeingredient",
+            index=models.Index(
+                fields=["unit_type", "expiration_date", "id"],
+                name="fridge_frid_unit_ty_4fe9c3_idx",
+            ),
+        ),
+    ]
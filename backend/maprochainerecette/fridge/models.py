@@ -1,58 +1,240 @@
 import uuid
-from decimal import Decimal
+from decimal import ROUND_HALF_UP
 
-from catalogs.models import Ingredient
-from django.db import models
+from catalogs.models import Ingredient, Recipe
+from django.db import NotSupportedError, connections, models, router
+from django.db.models.signals import post_save, pre_save
 from model_utils.models import TimeStampedModel
-from units.models import Unit
+from units.models import Unit, UnitType
+
+# The amounts are summed in the unit that has the biggest ratio (see
+# FridgeIngredient.save), the ratios being read from the units table. The
+# multiplications by 1.0 avoid integer divisions on SQLite. ROUND rounds half
+# away from zero, like MERGED_AMOUNT_ROUNDING, on SQLite and PostgreSQL. The
+# upsert returns the merged row, which needs SQLite 3.35 or later.
+MERGED_AMOUNT_ROUNDING = ROUND_HALF_UP
+MERGE_FRIDGE_INGREDIENT_SQL = """
+    INSERT INTO fridge_fridgeingredient (
+        id, created, modified, ingredient_id, amount, expiration_date,
+        unit_id, unit_type_id
+    )
+    SELECT %s, %s, %s, %s, %s, %s, id, type_id FROM units_unit WHERE id = %s
+    ON CONFLICT (ingredient_id, expiration_date, unit_type_id) DO UPDATE SET
+        amount = ROUND(
+            CASE
+                WHEN (
+                    SELECT rapport FROM units_unit
+                    WHERE id = fridge_fridgeingredient.unit_id
+                ) > (SELECT rapport FROM units_unit WHERE id = excluded.unit_id)
+                THEN fridge_fridgeingredient.amount + excluded.amount * 1.0 * (
+                    SELECT rapport FROM units_unit WHERE id = excluded.unit_id
+                ) / (
+                    SELECT rapport FROM units_unit
+                    WHERE id = fridge_fridgeingredient.unit_id
+                )
+                ELSE excluded.amount + fridge_fridgeingredient.amount * 1.0 * (
+                    SELECT rapport FROM units_unit
+                    WHERE id = fridge_fridgeingredient.unit_id
+                ) / (SELECT rapport FROM units_unit WHERE id = excluded.unit_id)
+            END,
+            2
+        ),
+        unit_id = CASE
+            WHEN (
+                SELECT rapport FROM units_unit
+                WHERE id = fridge_fridgeingredient.unit_id
+            ) > (SELECT rapport FROM units_unit WHERE id = excluded.unit_id)
+            THEN fridge_fridgeingredient.unit_id
+            ELSE excluded.unit_id
+        END,
+        modified = excluded.modified
+    RETURNING
+        id, created, modified, ingredient_id, amount, expiration_date, unit_id,
+        unit_type_id
+"""
+
+
+class FridgeIngredientQuerySet(models.QuerySet):
+    def stock(self):
+        """Aggregate the fridge ingredients by catalog ingredient and unit type.
+
+        The aggregation is done by the database, in a single query. Amounts are
+        converted into the unit of their unit type that has a ratio equal to 1.
+
+        Returns:
+            A values queryset of dictionaries with the keys ``ingredient``,
+            ``ingredient__name``, ``unit__type``, ``unit__type__name``,
+            ``canonical_amount`` (the summed converted amount) and
+            ``earliest_expiration_date``.
+
+        """
+        return (
+            self.order_by()
+            .values("ingredient", "ingredient__name", "unit__type", "unit__type__name")
+            .annotate(
+                canonical_amount=models.Sum(
+                    models.F("amount") * models.F("unit__rapport"),
+                    output_field=models.DecimalField(max_digits=40, decimal_places=12),
+                ),
+                earliest_expiration_date=models.Min("expiration_date"),
+            )
+        )
 
 
 class FridgeIngredient(TimeStampedModel):
     ingredient = models.ForeignKey(Ingredient, on_delete=models.PROTECT)
     amount = models.DecimalField(max_digits=10, decimal_places=2)
     unit = models.ForeignKey(Unit, on_delete=models.PROTECT)
+    # copy of unit.type, so that the database guarantees the uniqueness below
+    unit_type = models.ForeignKey(
+        UnitType, on_delete=models.PROTECT, editable=False, related_name="+"
+    )
     expiration_date = models.DateField("Expiration date")
     id = models.UUIDField(primary_key=True, default=None, editable=False)
 
+    objects = models.Manager.from_queryset(FridgeIngredientQuerySet)()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["ingredient", "expiration_date", "unit_type"],
+                name="unique_fridge_ingredient",
+            )
+        ]
+        # for the filters and orderings of fridge.filters.FridgeIngredientFilter
+        indexes = [
+            models.Index(fields=["expiration_date", "id"]),
+            models.Index(fields=["unit_type", "expiration_date", "id"]),
+        ]
+
     def __str__(self) -> str:
         return self.ingredient.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so that the recipes needing the stored catalog ingredient are
+        # refreshed too when it is changed (see fridge.signals)
+        instance._stored_ingredient_id = instance.__dict__.get("ingredient_id")
+        return instance
+
     def save(self, *args, **kwargs):
         """Save the fridge ingredient or update the corresponding exsisting ingredient.
 
         Fridge ingredients having the same catalog ingredient, expiration date and unit type
         should be merged together, and their value summed.
 
+        A new fridge ingredient is inserted, or merged into the existing one, by a
+        single upsert statement, so that concurrent additions are merged too. The
+        summed amount is expressed in the unit that has the biggest ratio. After
+        a merge, the fridge ingredient has the fields of the merged one.
+
         """
-        if not self.pk:
-            mergeable = FridgeIngredient.objects.filter(
-                ingredient=self.ingredient,
-                expiration_date=self.expiration_date,
-                unit__type=self.unit.type,
-            ).first()
-            if mergeable:
-                self._update_mergeable_with_new_ingredient(mergeable)
-            else:
-                self._set_pk()
-                super(FridgeIngredient, self).save(*args, **kwargs)
-        else:
+        if self.pk:
+            self.unit_type_id = self.unit.type_id
             super(FridgeIngredient, self).save(*args, **kwargs)
-
-    def _update_mergeable_with_new_ingredient(self, mergeable):
-        if mergeable.unit.rapport > self.unit.rapport:
-            amount = self._compute_amount(mergeable, self)
+            self._stored_ingredient_id = self.ingredient_id
         else:
-            amount = self._compute_amount(self, mergeable)
-            mergeable.unit = self.unit
-        mergeable.amount = amount
-        mergeable.save()
+            self._merge_or_insert(kwargs.get("using"))
+
+    def _merge_or_insert(self, using):
+        using = using or router.db_for_write(FridgeIngredient, instance=self)
+        connection = connections[using]
+        if not connection.features.can_return_columns_from_insert:
+            raise NotSupportedError(
+                "Adding fridge ingredients needs INSERT ... RETURNING, which is "
+                f"not supported by this {connection.display_name} version "
+                "(SQLite 3.35 or later is required)."
+            )
+        self._set_pk()
+        new_pk = self.pk
+        pre_save.send(
+            sender=FridgeIngredient,
+            instance=self,
+            raw=False,
+            using=using,
+            update_fields=None,
+        )
+        fields = [
+            self._meta.get_field(name)
+            for name in [
+                "id",
+                "created",
+                "modified",
+                "ingredient",
+                "amount",
+                "expiration_date",
+                "unit",
+            ]
+        ]
+        params = [
+            field.get_db_prep_save(field.pre_save(self, add=True), connection)
+            for field in fields
+        ]
+        # raw() converts the returned columns like the ones of a select
+        (merged,) = FridgeIngredient.objects.db_manager(using).raw(
+            MERGE_FRIDGE_INGREDIENT_SQL, params
+        )
+        for field in self._meta.concrete_fields:
+            setattr(self, field.attname, getattr(merged, field.attname))
+        self._state.adding = False
+        self._state.db = using
+        self._stored_ingredient_id = self.ingredient_id
+        post_save.send(
+            sender=FridgeIngredient,
+            instance=self,
+            created=self.pk == new_pk,
+            raw=False,
+            using=using,
+            update_fields=None,
+        )
 
     def _set_pk(self):
         self.pk = uuid.uuid4()
 
-    @staticmethod
-    def _compute_amount(big_element, small_element):
-        rapport = Decimal(small_element.unit.rapport) / Decimal(
-            big_element.unit.rapport
-        )
-        return Decimal(big_element.amount) + Decimal(small_element.amount) * rapport
+
+class FeasibleRecipe(TimeStampedModel):
+    """Stored result of the matching of a feasible recipe against the fridge stock.
+
+    The rows are kept up to date by fridge.matching.refresh_feasible_recipes.
+
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name="feasibility"
+    )
+    priority_ingredient = models.CharField("Most priority ingredient", max_length=255)
+    priority_date = models.DateField("Expiration date of the priority ingredient")
+    unsure_ingredients = models.JSONField("Unsure ingredients", default=list)
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["priority_date"])]
+
+    def __str__(self) -> str:
+        return str(self.recipe)
+
+
+class RecipeShortage(TimeStampedModel):
+    """Stored number of the ingredients of a recipe that are missing from the fridge.
+
+    The rows are kept up to date by fridge.matching.refresh_feasible_recipes, and
+    index the recipes by number of missing ingredients, to find the almost
+    feasible ones. Recipes without any ingredient have no row.
+
+    """
+
+    recipe = models.OneToOneField(
+        Recipe, on_delete=models.CASCADE, related_name="shortage"
+    )
+    missing_count = models.PositiveIntegerField("Number of missing ingredients")
+    priority_date = models.DateField(
+        "Expiration date of the priority ingredient", null=True
+    )
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    class Meta:
+        indexes = [models.Index(fields=["missing_count", "priority_date"])]
+
+    def __str__(self) -> str:
+        return str(self.recipe)
@@ -0,0 +1,21 @@
+from catalogs.pagination import OptionalCursorPagination
+
+
+class FeasibleRecipesPagination(OptionalCursorPagination):
+    """Cursor pagination of the feasible recipes, by expiration date of their priority ingredient."""
+
+    ordering = ("priority_date", "pk")
+    page_size = 20
+    max_page_size = 100
+
+
+class FridgeIngredientsPagination(OptionalCursorPagination):
+    """Cursor pagination of the fridge ingredients.
+
+    The ordering is given by the ``ordering`` query parameter (see
+    fridge.filters.FridgeIngredientFilter).
+
+    """
+
+    page_size = 50
+    max_page_size = 200
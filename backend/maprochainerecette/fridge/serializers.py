@@ -1,13 +1,19 @@
-from catalogs.models import Category, Ingredient, Recipe, Unit
-from catalogs.serializers import RecipeIngredientSerializer
+from decimal import Decimal
+
+from catalogs.models import Category, Recipe, Unit
+from catalogs.names import resolve_ingredient_names, unknown_ingredient_message
+from catalogs.serializers import IngredientNameField, RecipeIngredientSerializer
+from django.db import IntegrityError, transaction
 from fridge.models import FridgeIngredient
 from rest_framework import serializers
 
+# The largest servings multiplier of a consumed recipe, repeated entries of a
+# recipe included, as given back with 5 digits.
+MAX_SERVINGS = Decimal("999.99")
+
 
 class FridgeIngredientSerializer(serializers.ModelSerializer):
-    ingredient = serializers.SlugRelatedField(
-        queryset=Ingredient.objects.all(), slug_field="name"
-    )
+    ingredient = IngredientNameField()
     unit = serializers.SlugRelatedField(
         queryset=Unit.objects.all(), slug_field="abbreviation"
     )
@@ -17,21 +23,99 @@ class FridgeIngredientSerializer(serializers.ModelSerializer):
         fields = ["id", "ingredient", "expiration_date", "amount", "unit"]
 
     def create(self, validated_data):
-        """Create the fridge ingredient and solve the bug when the ingredient is merged.
+        """Create the fridge ingredient, or merge it into the existing one.
 
-        When the ingredient is merged (ie. an old instance is updated), the model
-        returns a badly formed object.
-        To solve that, we look for the updated ingredient and return it.
+        After a merge, the saved fridge ingredient is the merged one (see
+        FridgeIngredient.save).
 
         """
-        ingredient = FridgeIngredient.objects.create(**validated_data)
-        if ingredient.id is None:
-            ingredient = FridgeIngredient.objects.filter(
-                ingredient=ingredient.ingredient,
-                expiration_date=ingredient.expiration_date,
-                unit__type=ingredient.unit.type,
-            ).first()
-        return ingredient
+        return FridgeIngredient.objects.create(**validated_data)
+
+    def update(self, instance, validated_data):
+        try:
+            with transaction.atomic():
+                return super().update(instance, validated_data)
+        except IntegrityError:
+            raise serializers.ValidationError(
+                "The fridge already contains this ingredient with the same "
+                "expiration date and unit type."
+            )
+
+
+class FridgeIngredientItemSerializer(serializers.Serializer):
+    ingredient = serializers.CharField(max_length=255)
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    unit = serializers.CharField(max_length=255)
+    expiration_date = serializers.DateField()
+
+
+class BulkFridgeIngredientsSerializer(serializers.Serializer):
+    ingredients = FridgeIngredientItemSerializer(
+        many=True, allow_empty=False, max_length=500
+    )
+
+    def validate_ingredients(self, value):
+        """Resolve the ingredient names and the unit abbreviations.
+
+        The names with typos are matched with the closest ingredient names, like
+        with IngredientNameField, with one more query for all of them.
+
+        """
+        ingredients, suggestions = resolve_ingredient_names(
+            item["ingredient"] for item in value
+        )
+        units = Unit.objects.in_bulk(
+            {item["unit"] for item in value}, field_name="abbreviation"
+        )
+        errors = []
+        for item in value:
+            item_errors = {}
+            if item["ingredient"] not in ingredients:
+                item_errors["ingredient"] = [
+                    unknown_ingredient_message(
+                        item["ingredient"], suggestions[item["ingredient"]]
+                    )
+                ]
+            if item["unit"] not in units:
+                item_errors["unit"] = [
+                    f"Object with abbreviation={item['unit']} does not exist."
+                ]
+            errors.append(item_errors)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [
+            {
+                **item,
+                "ingredient": ingredients[item["ingredient"]],
+                "unit": units[item["unit"]],
+            }
+            for item in value
+        ]
+
+
+class AddedFridgeIngredientSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    outcome = serializers.ChoiceField(choices=["created", "merged"])
+
+
+class ExpiringParametersSerializer(serializers.Serializer):
+    days = serializers.IntegerField(min_value=0, max_value=365, default=3)
+
+
+class ExpiringFridgeIngredientSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    unit = serializers.CharField()
+    expiration_date = serializers.DateField()
+
+
+class ExpiringStockSerializer(serializers.Serializer):
+    ingredient = serializers.CharField()
+    unit_type = serializers.CharField()
+    canonical_unit = serializers.CharField(allow_null=True)
+    canonical_amount = serializers.DecimalField(max_digits=40, decimal_places=2)
+    earliest_expiration_date = serializers.DateField()
+    fridge_ingredients = ExpiringFridgeIngredientSerializer(many=True)
 
 
 class RecipeFridgeSerializer(serializers.ModelSerializer):
@@ -43,13 +127,15 @@ class RecipeFridgeSerializer(serializers.ModelSerializer):
     priority_ingredients = serializers.SerializerMethodField()
 
     def get_unsure_ingredients(self, obj):
-        if "unsure_ingredients" in self.context:
-            return self.context["unsure_ingredients"][obj.id]
+        if hasattr(obj, "unsure_ingredients"):
+            return obj.unsure_ingredients or []
         return None
 
     def get_priority_ingredients(self, obj):
-        if "priority_ingredients" in self.context:
-            return [self.context["priority_ingredients"][obj.id]["name"]]
+        if hasattr(obj, "priority_ingredient"):
+            if obj.priority_ingredient is None:
+                return []
+            return [obj.priority_ingredient]
         return None
 
     class Meta:
@@ -64,3 +150,88 @@ class RecipeFridgeSerializer(serializers.ModelSerializer):
             "priority_ingredients",
             "unsure_ingredients",
         ]
+
+
+class MissingIngredientSerializer(serializers.Serializer):
+    ingredient = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    unit = serializers.CharField()
+
+
+class AlmostFeasibleRecipeSerializer(RecipeFridgeSerializer):
+    missing_ingredients = MissingIngredientSerializer(many=True, read_only=True)
+
+    class Meta(RecipeFridgeSerializer.Meta):
+        fields = RecipeFridgeSerializer.Meta.fields + ["missing_ingredients"]
+
+
+class AlmostFeasibleRecipesParametersSerializer(serializers.Serializer):
+    max_missing = serializers.IntegerField(min_value=1, max_value=5, default=2)
+    limit = serializers.IntegerField(min_value=1, max_value=100, default=20)
+
+
+class RecipeServingsSerializer(serializers.Serializer):
+    recipe = serializers.UUIDField()
+    servings = serializers.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        min_value=Decimal("0.01"),
+        max_value=MAX_SERVINGS,
+        default=1,
+    )
+
+
+class ConsumeRecipesSerializer(serializers.Serializer):
+    recipes = RecipeServingsSerializer(many=True, allow_empty=False)
+
+    def validate_recipes(self, value):
+        """Check that the recipes exist, and sum the servings of a repeated recipe."""
+        servings: dict = {}
+        for item in value:
+            servings[item["recipe"]] = (
+                servings.get(item["recipe"], 0) + item["servings"]
+            )
+        too_many = [
+            str(recipe_id)
+            for recipe_id, amount in servings.items()
+            if amount > MAX_SERVINGS
+        ]
+        if too_many:
+            raise serializers.ValidationError(
+                f"More than {MAX_SERVINGS} servings of recipes: {', '.join(too_many)}."
+            )
+        recipes = Recipe.objects.in_bulk(servings)
+        unknown = [str(recipe_id) for recipe_id in servings if recipe_id not in recipes]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown recipes: {', '.join(unknown)}.")
+        return {recipes[recipe_id]: amount for recipe_id, amount in servings.items()}
+
+
+class ConsumedIngredientSerializer(serializers.Serializer):
+    ingredient = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    unit = serializers.CharField()
+
+
+class ConsumedRecipeSerializer(serializers.ModelSerializer):
+    servings = serializers.DecimalField(max_digits=5, decimal_places=2)
+    consumed_ingredients = ConsumedIngredientSerializer(many=True)
+    unsure_ingredients = serializers.ListField(child=serializers.CharField())
+
+    class Meta:
+        model = Recipe
+        fields = [
+            "id",
+            "title",
+            "servings",
+            "consumed_ingredients",
+            "unsure_ingredients",
+        ]
+
+
+class PlannedDeductionSerializer(serializers.Serializer):
+    id = serializers.UUIDField()
+    ingredient = serializers.CharField()
+    unit = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=10, decimal_places=2)
+    remaining_amount = serializers.DecimalField(max_digits=10, decimal_places=2)
@@ -0,0 +1,116 @@
+from catalogs.models import Ingredient, Recipe, RecipeIngredient
+from catalogs.signals import recipe_ingredients_changed
+from django.db.models.signals import post_delete, post_migrate, post_save, pre_delete
+from django.dispatch import receiver
+from fridge import events
+from fridge.bulk import move_fridge_ingredients_to_unit_type
+from fridge.matching import refresh_feasible_recipes
+from fridge.models import FeasibleRecipe, FridgeIngredient
+from units.models import Unit
+
+# Migrations creating the tables of the stored feasibilities and shortages, which
+# are computed from the whole catalog and fridge, so once all the migrations are
+# applied rather than with the historical models.
+STORED_FEASIBILITY_MIGRATIONS = {"0002_feasiblerecipe", "0003_recipeshortage"}
+
+
+@receiver(post_save, sender=FridgeIngredient)
+@receiver(post_delete, sender=FridgeIngredient)
+def refresh_feasible_recipes_of_fridge_ingredient(
+    sender, instance, signal, created=False, **kwargs
+):
+    """Recompute the feasibility of the recipes needing a changed fridge ingredient.
+
+    This covers the merge of a new fridge ingredient into an existing one, as the
+    existing one is saved. When the catalog ingredient of the fridge ingredient
+    is changed, the recipes needing the previous one are recomputed too. The
+    change is published with the resulting changes of the feasible recipes, as a
+    single event (see fridge.events).
+
+    """
+    ingredients = {
+        instance.ingredient_id,
+        getattr(instance, "_stored_ingredient_id", None),
+    } - {None}
+    with events.batched():
+        if signal is post_delete:
+            events.record_fridge_changes(removed=[instance.pk])
+        elif created:
+            events.record_fridge_changes(added=[instance.pk])
+        else:
+            events.record_fridge_changes(changed=[instance.pk])
+        refresh_feasible_recipes(ingredients=list(ingredients))
+
+
+@receiver(recipe_ingredients_changed)
+def refresh_feasibility_of_recipe(sender, recipe, **kwargs):
+    refresh_feasible_recipes(recipes=[recipe.pk])
+
+
+@receiver(pre_delete, sender=Recipe)
+def record_unfeasibility_of_deleted_recipe(sender, instance, **kwargs):
+    """Publish that a deleted feasible recipe is not feasible anymore.
+
+    Its stored feasibility is deleted by cascade, without any refresh. The
+    version stamp of the catalog is bumped by the deletion itself (see
+    versions.signals).
+
+    """
+    if FeasibleRecipe.objects.filter(recipe=instance).exists():
+        events.record_feasibility_changes(unfeasible=[instance.pk])
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_feasibility_of_ingredient_recipes(sender, instance, created, **kwargs):
+    """Recompute the recipes needing a changed catalog ingredient.
+
+    The stored feasible recipes keep the name of their priority ingredient.
+
+    """
+    if not created:
+        refresh_feasible_recipes(ingredients=[instance.pk])
+
+
+@receiver(post_save, sender=Unit)
+def update_unit_type_of_fridge_ingredients(sender, instance, created, **kwargs):
+    """Keep the unit type copied in the fridge ingredients up to date.
+
+    When the type of the unit is changed, the fridge ingredients that the new
+    unit type makes mergeable are merged (see
+    fridge.bulk.move_fridge_ingredients_to_unit_type). The recipes needing an
+    ingredient stocked, or required by a recipe, in the unit are recomputed, as
+    its ratio or its type may have changed.
+
+    """
+    if not created and instance.type_id != getattr(instance, "_stored_type_id", None):
+        move_fridge_ingredients_to_unit_type(instance)
+    ingredients = set(
+        FridgeIngredient.objects.filter(unit=instance).values_list(
+            "ingredient", flat=True
+        )
+    ) | set(
+        RecipeIngredient.objects.filter(unit=instance).values_list(
+            "ingredient", flat=True
+        )
+    )
+    if ingredients:
+        refresh_feasible_recipes(ingredients=list(ingredients))
+
+
+@receiver(post_migrate)
+def fill_stored_feasibility_after_migration(sender, plan=None, **kwargs):
+    """Compute the stored feasibilities and shortages once their tables are created.
+
+    Otherwise a database upgraded with existing recipes and fridge ingredients
+    would have no feasible recipes until the fridge changes.
+
+    """
+    if sender.name != "fridge" or not plan:
+        return
+    if any(
+        migration.app_label == "fridge"
+        and migration.name in STORED_FEASIBILITY_MIGRATIONS
+        and not backwards
+        for migration, backwards in plan
+    ):
+        refresh_feasible_recipes()
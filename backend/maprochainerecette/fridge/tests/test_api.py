@@ -10,6 +10,7 @@ from fridge.tests.factories import FridgeIngredientFactory
 from pytest_django.asserts import assertContains
 from rest_framework.test import APIRequestFactory
 from units.tests.factories import UnitFactory, UnitTypeFactory
+from versions.models import VersionStamp
 
 pytestmark = pytest.mark.django_db
 
@@ -25,6 +26,16 @@ def test_fridge_ingredient_list_contains_2_ingredients():
     assertContains(response, ingredient2.ingredient)
 
 
+def test_fridge_ingredient_list_etag_changes_when_an_ingredient_is_deleted():
+    fridge_ingredient = FridgeIngredientFactory()
+    url = _get_fridge_ingredients_list_absolute_url()
+    view = FridgeIngredientViewSet.as_view({"get": "list"})
+    etag = view(APIRequestFactory().get(url))["ETag"]
+    assert view(APIRequestFactory().get(url))["ETag"] == etag
+    fridge_ingredient.delete()
+    assert view(APIRequestFactory().get(url))["ETag"] != etag
+
+
 def _get_fridge_ingredients_list_absolute_url():
     view = FridgeIngredientViewSet()
     view.basename = "ingredients_fridge"
@@ -47,6 +58,99 @@ def test_fridge_ingredients_list_has_correct_fields(fridge_ingredient):
     assert fridge_ingredient_data["unit"] == fridge_ingredient.unit.abbreviation
 
 
+@pytest.fixture()
+def stocked_fridge():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    piece = UnitFactory(abbreviation="p", rapport=1, type=UnitTypeFactory(name="pièce"))
+    ingredients = {
+        name: IngredientFactory(name=name) for name in ["carottes", "cardons", "navets"]
+    }
+    for name, unit, day in [
+        ("carottes", gramme, 20),
+        ("carottes", piece, 22),
+        ("cardons", gramme, 21),
+        ("navets", gramme, 23),
+        ("navets", gramme, 19),
+    ]:
+        FridgeIngredientFactory(
+            ingredient=ingredients[name],
+            unit=unit,
+            expiration_date=datetime.date(2030, 7, day),
+        )
+
+
+def test_fridge_ingredients_list_is_filtered(stocked_fridge):
+    response = _list_fridge_ingredients(
+        {"ingredient": "car", "unit_type": "masse", "expires_before": "2030-07-20"}
+    )
+    assert response.status_code == 200
+    assert [
+        (fridge_ingredient["ingredient"], fridge_ingredient["expiration_date"])
+        for fridge_ingredient in response.data
+    ] == [("carottes", "2030-07-20")]
+
+
+def test_fridge_ingredients_list_is_filtered_by_name_prefix_with_its_case(
+    stocked_fridge,
+):
+    names = [
+        [fridge_ingredient["ingredient"] for fridge_ingredient in response.data]
+        for response in (
+            _list_fridge_ingredients({"ingredient": prefix, "ordering": "ingredient"})
+            for prefix in ("card", "Car", "navets")
+        )
+    ]
+    assert names == [["cardons"], [], ["navets", "navets"]]
+
+
+def test_fridge_ingredients_list_is_ordered_by_name(stocked_fridge):
+    response = _list_fridge_ingredients(
+        {"ordering": "ingredient", "expires_after": "2030-07-20"}
+    )
+    assert [
+        (fridge_ingredient["ingredient"], fridge_ingredient["expiration_date"])
+        for fridge_ingredient in response.data
+    ] == [
+        ("cardons", "2030-07-21"),
+        ("carottes", "2030-07-20"),
+        ("carottes", "2030-07-22"),
+        ("navets", "2030-07-23"),
+    ]
+
+
+def test_fridge_ingredients_list_rejects_unknown_ordering():
+    assert _list_fridge_ingredients({"ordering": "amount"}).status_code == 400
+
+
+def test_fridge_ingredients_list_is_paginated_with_a_fixed_number_of_queries(
+    stocked_fridge, django_assert_num_queries
+):
+    view = FridgeIngredientViewSet.as_view({"get": "list"})
+    dates = []
+    request = APIRequestFactory().get(
+        _get_fridge_ingredients_list_absolute_url(), {"limit": 2}
+    )
+    while request is not None:
+        with django_assert_num_queries(2):
+            response = view(request)
+        dates += [
+            fridge_ingredient["expiration_date"]
+            for fridge_ingredient in response.data["results"]
+        ]
+        request = response.data["next"] and APIRequestFactory().get(
+            response.data["next"]
+        )
+    assert dates == [f"2030-07-{day}" for day in range(19, 24)]
+
+
+def _list_fridge_ingredients(parameters):
+    request = APIRequestFactory().get(
+        _get_fridge_ingredients_list_absolute_url(), parameters
+    )
+    return FridgeIngredientViewSet.as_view({"get": "list"})(request)
+
+
 def test_adding_fridge_ingredient():
     IngredientFactory(name="premier ingrédient")
     UnitFactory(abbreviation="g")
@@ -142,6 +246,175 @@ def test_delete_fridge_ingredient(fridge_ingredient):
     assert FridgeIngredient.objects.count() == 0
 
 
+def test_updating_fridge_ingredient_into_a_duplicate_is_rejected():
+    unit_type = UnitTypeFactory(name="masse")
+    UnitFactory(abbreviation="g", rapport=1, type=unit_type)
+    kilogramme = UnitFactory(abbreviation="kg", rapport=1000, type=unit_type)
+    existing = FridgeIngredientFactory(
+        unit=kilogramme, expiration_date=datetime.date(2030, 7, 20)
+    )
+    fridge_ingredient = FridgeIngredientFactory(
+        ingredient=existing.ingredient,
+        unit=kilogramme,
+        expiration_date=datetime.date(2030, 7, 27),
+    )
+    detail_url = _get_fridge_ingredients_detail_absolute_url(fridge_ingredient.id)
+    request_patch = APIRequestFactory().patch(
+        detail_url, {"expiration_date": "2030-07-20", "unit": "g"}
+    )
+    response_patch = FridgeIngredientViewSet.as_view({"patch": "partial_update"})(
+        request_patch, pk=fridge_ingredient.id
+    )
+    assert response_patch.status_code == 400
+    fridge_ingredient.refresh_from_db()
+    assert fridge_ingredient.expiration_date == datetime.date(2030, 7, 27)
+
+
+def test_bulk_adding_fridge_ingredients_merges_them_with_each_other_and_the_stock():
+    unit_type = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=unit_type)
+    UnitFactory(abbreviation="kg", rapport=1000, type=unit_type)
+    carottes = IngredientFactory(name="carottes")
+    IngredientFactory(name="navets")
+    existing = FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=500,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    response = _bulk_add_fridge_ingredients(
+        [
+            {
+                "ingredient": "carottes",
+                "amount": "1",
+                "unit": "kg",
+                "expiration_date": "2030-07-20",
+            },
+            {
+                "ingredient": "navets",
+                "amount": "200",
+                "unit": "g",
+                "expiration_date": "2030-07-27",
+            },
+            {
+                "ingredient": "navets",
+                "amount": "0.3",
+                "unit": "kg",
+                "expiration_date": "2030-07-27",
+            },
+        ]
+    )
+    assert response.status_code == 201
+    outcomes = response.data["ingredients"]
+    assert [outcome["outcome"] for outcome in outcomes] == [
+        "merged",
+        "created",
+        "merged",
+    ]
+    assert outcomes[0]["id"] == str(existing.id)
+    assert outcomes[1]["id"] == outcomes[2]["id"]
+    assert sorted(
+        (
+            fridge_ingredient.ingredient.name,
+            fridge_ingredient.amount,
+            fridge_ingredient.unit.abbreviation,
+        )
+        for fridge_ingredient in FridgeIngredient.objects.all()
+    ) == [("carottes", Decimal("1.5"), "kg"), ("navets", Decimal("0.5"), "kg")]
+    assert len(response.data["fridge_ingredients"]) == 2
+
+
+def test_bulk_adding_fridge_ingredients_does_not_query_for_each_ingredient(
+    django_assert_max_num_queries,
+):
+    unit_type = UnitTypeFactory(name="masse")
+    UnitFactory(abbreviation="g", rapport=1, type=unit_type)
+    items = []
+    for i in range(40):
+        IngredientFactory(name=f"ingrédient {i}")
+        items.append(
+            {
+                "ingredient": f"ingrédient {i}",
+                "amount": "100",
+                "unit": "g",
+                "expiration_date": "2030-07-20",
+            }
+        )
+    # the stamp of the fridge exists once the fridge has been changed
+    VersionStamp.objects.bump("fridge")
+    with django_assert_max_num_queries(20) as captured:
+        response = _bulk_add_fridge_ingredients(items)
+    assert response.status_code == 201
+    assert FridgeIngredient.objects.count() == 40
+    inserts = [
+        query
+        for query in captured.captured_queries
+        if query["sql"].startswith('INSERT INTO "fridge_fridgeingredient"')
+    ]
+    assert len(inserts) == 1
+
+
+def test_bulk_adding_fridge_ingredients_rejects_unknown_names():
+    unit_type = UnitTypeFactory(name="masse")
+    UnitFactory(abbreviation="g", rapport=1, type=unit_type)
+    IngredientFactory(name="carottes")
+    response = _bulk_add_fridge_ingredients(
+        [
+            {
+                "ingredient": "carottes",
+                "amount": "100",
+                "unit": "g",
+                "expiration_date": "2030-07-20",
+            },
+            {
+                "ingredient": "inconnu",
+                "amount": "100",
+                "unit": "l",
+                "expiration_date": "2030-07-20",
+            },
+        ]
+    )
+    assert response.status_code == 400
+    assert response.data["ingredients"][0] == {}
+    assert set(response.data["ingredients"][1]) == {"ingredient", "unit"}
+    assert not FridgeIngredient.objects.exists()
+
+
+def test_bulk_adding_fridge_ingredients_resolves_names_with_typos():
+    unit_type = UnitTypeFactory(name="masse")
+    UnitFactory(abbreviation="g", rapport=1, type=unit_type)
+    IngredientFactory(name="échalotte")
+    IngredientFactory(name="pâte")
+    IngredientFactory(name="pâté")
+    items = [
+        {
+            "ingredient": name,
+            "amount": "100",
+            "unit": "g",
+            "expiration_date": "2030-07-20",
+        }
+        for name in ("Echalote", "pate")
+    ]
+    response = _bulk_add_fridge_ingredients(items)
+    assert response.status_code == 400
+    assert response.data["ingredients"][0] == {}
+    assert response.data["ingredients"][1]["ingredient"] == [
+        "Object with name=pate does not exist. Did you mean pâte or pâté?"
+    ]
+    response = _bulk_add_fridge_ingredients(items[:1])
+    assert response.status_code == 201
+    assert FridgeIngredient.objects.get().ingredient.name == "échalotte"
+
+
+def _bulk_add_fridge_ingredients(items):
+    view = FridgeIngredientViewSet()
+    view.basename = "ingredients_fridge"
+    view.request = None
+    url = view.reverse_action("bulk")
+    request = APIRequestFactory().post(url, {"ingredients": items}, format="json")
+    return FridgeIngredientViewSet.as_view({"post": "bulk"})(request)
+
+
 def _get_fridge_ingredients_detail_absolute_url(id):
     view = FridgeIngredientViewSet()
     view.basename = "ingredients_fridge"
@@ -0,0 +1,212 @@
+import datetime
+
+import pytest
+from catalogs.tests.factories import (
+    IngredientFactory,
+    RecipeFactory,
+    RecipeIngredientFactory,
+)
+from django.urls import reverse
+from fridge.api import AlmostFeasibleRecipes
+from fridge.tests.factories import FridgeIngredientFactory
+from rest_framework.test import APIRequestFactory
+from units.tests.factories import UnitFactory, UnitTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_get_almost_feasible_recipes_returns_missing_ingredients():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_almost_feasible_tests()
+    poivrons = IngredientFactory(name="Poivrons")
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme),
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    response = _get_almost_feasible_recipes()
+    assert response.status_code == 200
+    assert len(response.data) == 1
+    assert response.data[0]["title"] == "Recipe 1"
+    assert response.data[0]["missing_ingredients"] == [
+        {"ingredient": "Poivrons", "amount": "200.00", "unit": "g"}
+    ]
+    assert response.data[0]["priority_ingredients"] == ["Carottes"]
+
+
+def test_get_almost_feasible_recipes_returns_missing_amount_in_recipe_unit():
+    carottes, tomates, oignons, gramme, masse = _dataset_for_almost_feasible_tests()
+    kg = UnitFactory(abbreviation="kg", rapport=1000, type=masse)
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=2, unit=kg),
+            RecipeIngredientFactory(ingredient=tomates, amount=50, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    response = _get_almost_feasible_recipes()
+    assert response.data[0]["missing_ingredients"] == [
+        {"ingredient": "Carottes", "amount": "1.50", "unit": "kg"}
+    ]
+    assert response.data[0]["priority_ingredients"] == ["Tomates"]
+
+
+def test_get_almost_feasible_recipes_does_not_return_recipes_missing_too_many_ingredients():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_almost_feasible_tests()
+    poivrons = IngredientFactory(name="Poivrons")
+    courgettes = IngredientFactory(name="Courgettes")
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme),
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme),
+            RecipeIngredientFactory(ingredient=courgettes, amount=200, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme)
+        ],
+        title="Recipe 2",
+    )
+    response = _get_almost_feasible_recipes(max_missing=1)
+    assert [recipe["title"] for recipe in response.data] == ["Recipe 2"]
+    assert response.data[0]["priority_ingredients"] == []
+    response = _get_almost_feasible_recipes(max_missing=2)
+    assert [recipe["title"] for recipe in response.data] == ["Recipe 2", "Recipe 1"]
+
+
+def test_get_almost_feasible_recipes_returns_correctly_ordered_recipes():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_almost_feasible_tests()
+    poivrons = IngredientFactory(name="Poivrons")
+    courgettes = IngredientFactory(name="Courgettes")
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme),
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme),
+            RecipeIngredientFactory(ingredient=courgettes, amount=200, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=oignons, amount=60, unit=gramme),
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme),
+        ],
+        title="Recipe 2",
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=tomates, amount=50, unit=gramme),
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme),
+        ],
+        title="Recipe 3",
+    )
+    response = _get_almost_feasible_recipes()
+    assert [recipe["title"] for recipe in response.data] == [
+        "Recipe 3",
+        "Recipe 2",
+        "Recipe 1",
+    ]
+    response = _get_almost_feasible_recipes(limit=2)
+    assert [recipe["title"] for recipe in response.data] == ["Recipe 3", "Recipe 2"]
+
+
+def test_get_almost_feasible_recipes_does_not_return_feasible_recipes():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_almost_feasible_tests()
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=tomates, amount=50, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=tomates, amount=60, unit=gramme),
+        ],
+        title="Recipe 2",
+    )
+    response = _get_almost_feasible_recipes()
+    assert [recipe["title"] for recipe in response.data] == ["Recipe 2"]
+    assert response.data[0]["missing_ingredients"] == [
+        {"ingredient": "Tomates", "amount": "10.00", "unit": "g"}
+    ]
+
+
+def test_get_almost_feasible_recipes_does_not_count_unsure_ingredients_as_missing():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_almost_feasible_tests()
+    pieces = UnitFactory(
+        abbreviation="pièce(s)", rapport=1, type=UnitTypeFactory(name="pièce(s)")
+    )
+    poivrons = IngredientFactory(name="Poivrons")
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=oignons, amount=2, unit=pieces),
+            RecipeIngredientFactory(ingredient=poivrons, amount=200, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    response = _get_almost_feasible_recipes(max_missing=1)
+    assert response.data[0]["missing_ingredients"] == [
+        {"ingredient": "Poivrons", "amount": "200.00", "unit": "g"}
+    ]
+    assert response.data[0]["unsure_ingredients"] == ["Oignons"]
+
+
+def test_get_almost_feasible_recipes_with_invalid_parameters_returns_400():
+    response = _get_almost_feasible_recipes(max_missing=0)
+    assert response.status_code == 400
+    response = _get_almost_feasible_recipes(limit="many")
+    assert response.status_code == 400
+
+
+def test_get_almost_feasible_recipes_number_of_queries_does_not_depend_on_recipes(
+    django_assert_num_queries,
+):
+    carottes, tomates, oignons, gramme, _ = _dataset_for_almost_feasible_tests()
+    poivrons = IngredientFactory(name="Poivrons")
+    for i in range(10):
+        RecipeFactory(
+            ingredients=[
+                RecipeIngredientFactory(ingredient=carottes, amount=i, unit=gramme),
+                RecipeIngredientFactory(ingredient=poivrons, amount=i, unit=gramme),
+            ],
+        )
+    # shortages, stock, missing ingredients, recipes, recipes ingredients and categories
+    with django_assert_num_queries(6):
+        response = _get_almost_feasible_recipes()
+    assert len(response.data) == 10
+
+
+def _get_almost_feasible_recipes(**parameters):
+    url = reverse("recipes_fridge_almost_feasible")
+    request = APIRequestFactory().get(url, parameters)
+    return AlmostFeasibleRecipes.as_view()(request)
+
+
+def _dataset_for_almost_feasible_tests():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    tomates = IngredientFactory(name="Tomates")
+    oignons = IngredientFactory(name="Oignons")
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=500,
+        unit=gramme,
+        expiration_date=datetime.date(2130, 1, 1),
+    )
+    FridgeIngredientFactory(
+        ingredient=tomates,
+        amount=50,
+        unit=gramme,
+        expiration_date=datetime.date(2130, 2, 2),
+    )
+    FridgeIngredientFactory(
+        ingredient=oignons,
+        amount=60,
+        unit=gramme,
+        expiration_date=datetime.date(2131, 1, 1),
+    )
+    return carottes, tomates, oignons, gramme, masse
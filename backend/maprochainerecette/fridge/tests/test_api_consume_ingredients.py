@@ -1,4 +1,5 @@
 import datetime
+from decimal import Decimal
 
 import pytest
 from catalogs.tests.factories import (
@@ -7,7 +8,7 @@ from catalogs.tests.factories import (
     RecipeIngredientFactory,
 )
 from django.urls import reverse
-from fridge.api import ConsumeIngredients
+from fridge.api import ConsumeIngredients, ConsumeIngredientsPreview, ConsumeRecipes
 from fridge.tests.factories import FridgeIngredientFactory
 from rest_framework.test import APIRequestFactory
 from units.tests.factories import UnitFactory, UnitTypeFactory
@@ -106,6 +107,91 @@ def test_consume_ingredients_removes_correctly_fridge_ingredients_with_different
     assert fridge_ingredient_recipe3.amount == 10
 
 
+def test_consume_ingredients_preview_gives_the_deductions_of_the_consumption(
+    django_assert_num_queries,
+):
+    carottes, tomates, oignons, gramme, masse = _dataset_for_fridge_recipes_tests()
+    kilogramme = UnitFactory(abbreviation="kg", rapport=1000, type=masse)
+    carottes_first = FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=300,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    carottes_last = FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=1,
+        unit=kilogramme,
+        expiration_date=datetime.date(2030, 7, 27),
+    )
+    FridgeIngredientFactory(ingredient=tomates, amount=60, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+        ]
+    )
+    url = reverse("recipes_consume_preview", args=[recipe.id])
+    request = APIRequestFactory().get(url)
+    with django_assert_num_queries(1):
+        response = ConsumeIngredientsPreview.as_view()(request, recipe.id)
+    assert response.status_code == 200
+    assert [dict(deduction) for deduction in response.data] == [
+        {
+            "id": str(carottes_first.id),
+            "ingredient": "Carottes",
+            "unit": "g",
+            "amount": "300.00",
+            "remaining_amount": "0.00",
+        },
+        {
+            "id": str(carottes_last.id),
+            "ingredient": "Carottes",
+            "unit": "kg",
+            "amount": "1.00",
+            "remaining_amount": "0.80",
+        },
+    ]
+    assert FridgeIngredient.objects.count() == 3
+    url = reverse("recipes_consume", args=[recipe.id])
+    request = APIRequestFactory().post(url, {"recipe_id": recipe.id})
+    ConsumeIngredients.as_view()(request, recipe.id)
+    assert list(
+        FridgeIngredient.objects.filter(ingredient=carottes).values_list("id", "amount")
+    ) == [(carottes_last.id, Decimal("0.8"))]
+
+
+def test_consumptions_of_a_recipe_agree_on_its_unsure_ingredients():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    piece = UnitFactory(abbreviation="pièce(s)", rapport=1)
+    FridgeIngredientFactory(ingredient=carottes, amount=100, unit=gramme)
+    FridgeIngredientFactory(ingredient=carottes, amount=2, unit=piece)
+    FridgeIngredientFactory(ingredient=oignons, amount=50, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=200, unit=gramme),
+            RecipeIngredientFactory(ingredient=oignons, amount=20, unit=gramme),
+        ]
+    )
+    url = reverse("recipes_consume_preview", args=[recipe.id])
+    request = APIRequestFactory().get(url)
+    response = ConsumeIngredientsPreview.as_view()(request, recipe.id)
+    assert [deduction["ingredient"] for deduction in response.data] == ["Oignons"]
+    url = reverse("recipes_consume_batch")
+    request = APIRequestFactory().post(
+        url, {"recipes": [{"recipe": recipe.id}]}, format="json"
+    )
+    response = ConsumeRecipes.as_view()(request)
+    assert response.status_code == 200
+    assert response.data["recipes"][0]["unsure_ingredients"] == ["Carottes"]
+    url = reverse("recipes_consume", args=[recipe.id])
+    request = APIRequestFactory().post(url, {"recipe_id": recipe.id})
+    response = ConsumeIngredients.as_view()(request, recipe.id)
+    assert response.status_code == 200
+    assert sorted(
+        FridgeIngredient.objects.values_list("ingredient__name", "amount")
+    ) == [("Carottes", 2), ("Carottes", 100), ("Oignons", 10)]
+
+
 def _dataset_for_fridge_recipes_tests():
     masse = UnitTypeFactory(name="masse")
     gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
@@ -0,0 +1,170 @@
+import pytest
+from catalogs.tests.factories import (
+    IngredientFactory,
+    RecipeFactory,
+    RecipeIngredientFactory,
+)
+from django.urls import reverse
+from fridge.api import ConsumeRecipes
+from fridge.models import FridgeIngredient
+from fridge.tests.factories import FridgeIngredientFactory
+from rest_framework.test import APIRequestFactory
+from units.tests.factories import UnitFactory, UnitTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_consume_recipes_consumes_all_the_recipes_with_their_servings():
+    carottes, oignons, gramme = _dataset_for_consume_recipes_tests()
+    carottes_in_fridge = FridgeIngredientFactory(
+        ingredient=carottes, amount=500, unit=gramme
+    )
+    FridgeIngredientFactory(ingredient=oignons, amount=100, unit=gramme)
+    recipe1 = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme),
+            RecipeIngredientFactory(ingredient=oignons, amount=50, unit=gramme),
+        ],
+        title="Recipe 1",
+    )
+    recipe2 = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=150, unit=gramme)
+        ],
+        title="Recipe 2",
+    )
+    response = _consume_recipes(
+        [{"recipe": recipe1.id, "servings": 2}, {"recipe": recipe2.id}]
+    )
+    assert response.status_code == 200
+    assert [
+        (recipe["title"], recipe["servings"], recipe["consumed_ingredients"])
+        for recipe in response.data["recipes"]
+    ] == [
+        (
+            "Recipe 1",
+            "2.00",
+            [
+                {"ingredient": "Carottes", "amount": "200.00", "unit": "g"},
+                {"ingredient": "Oignons", "amount": "100.00", "unit": "g"},
+            ],
+        ),
+        (
+            "Recipe 2",
+            "1.00",
+            [{"ingredient": "Carottes", "amount": "150.00", "unit": "g"}],
+        ),
+    ]
+    assert [
+        (ingredient["ingredient"], ingredient["amount"])
+        for ingredient in response.data["fridge"]
+    ] == [("Carottes", "150.00")]
+    carottes_in_fridge.refresh_from_db()
+    assert carottes_in_fridge.amount == 150
+
+
+def test_consume_recipes_consumes_nothing_when_the_recipes_are_not_jointly_feasible():
+    carottes, oignons, gramme = _dataset_for_consume_recipes_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=300, unit=gramme)
+    FridgeIngredientFactory(ingredient=oignons, amount=100, unit=gramme)
+    recipe1 = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=200, unit=gramme),
+            RecipeIngredientFactory(ingredient=oignons, amount=50, unit=gramme),
+        ]
+    )
+    recipe2 = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=200, unit=gramme)
+        ]
+    )
+    response = _consume_recipes([{"recipe": recipe1.id}, {"recipe": recipe2.id}])
+    assert response.status_code == 409
+    assert response.data == {"missing_ingredients": ["Carottes"]}
+    assert sorted(FridgeIngredient.objects.values_list("amount", flat=True)) == [
+        100,
+        300,
+    ]
+
+
+def test_consume_recipes_does_not_consume_unsure_ingredients():
+    carottes, oignons, gramme = _dataset_for_consume_recipes_tests()
+    piece = UnitFactory(abbreviation="pièce(s)", rapport=1)
+    FridgeIngredientFactory(ingredient=carottes, amount=3, unit=piece)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=200, unit=gramme)
+        ]
+    )
+    response = _consume_recipes([{"recipe": recipe.id}])
+    assert response.status_code == 200
+    assert response.data["recipes"][0]["consumed_ingredients"] == []
+    assert response.data["recipes"][0]["unsure_ingredients"] == ["Carottes"]
+    assert FridgeIngredient.objects.get().amount == 3
+
+
+def test_consume_recipes_does_not_consume_short_ingredients_stocked_in_another_unit_type():
+    carottes, oignons, gramme = _dataset_for_consume_recipes_tests()
+    piece = UnitFactory(abbreviation="pièce(s)", rapport=1)
+    FridgeIngredientFactory(ingredient=carottes, amount=3, unit=piece)
+    FridgeIngredientFactory(ingredient=carottes, amount=100, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=200, unit=gramme)
+        ]
+    )
+    response = _consume_recipes([{"recipe": recipe.id}])
+    assert response.status_code == 200
+    assert response.data["recipes"][0]["consumed_ingredients"] == []
+    assert response.data["recipes"][0]["unsure_ingredients"] == ["Carottes"]
+    assert sorted(FridgeIngredient.objects.values_list("amount", flat=True)) == [
+        3,
+        100,
+    ]
+
+
+def test_consume_recipes_rejects_unknown_recipes():
+    carottes, oignons, gramme = _dataset_for_consume_recipes_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=300, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=200, unit=gramme)
+        ]
+    )
+    response = _consume_recipes(
+        [{"recipe": recipe.id}, {"recipe": "6c2b9f5e-7b1a-4d3c-9f0e-2a1b3c4d5e6f"}]
+    )
+    assert response.status_code == 400
+    assert FridgeIngredient.objects.get().amount == 300
+
+
+def test_consume_recipes_rejects_too_many_servings_of_a_repeated_recipe():
+    carottes, oignons, gramme = _dataset_for_consume_recipes_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=300, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=0.1, unit=gramme)
+        ]
+    )
+    response = _consume_recipes(
+        [
+            {"recipe": recipe.id, "servings": 600},
+            {"recipe": recipe.id, "servings": 600},
+        ]
+    )
+    assert response.status_code == 400
+    assert FridgeIngredient.objects.get().amount == 300
+
+
+def _consume_recipes(recipes):
+    url = reverse("recipes_consume_batch")
+    request = APIRequestFactory().post(url, {"recipes": recipes}, format="json")
+    return ConsumeRecipes.as_view()(request)
+
+
+def _dataset_for_consume_recipes_tests():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    oignons = IngredientFactory(name="Oignons")
+    return carottes, oignons, gramme
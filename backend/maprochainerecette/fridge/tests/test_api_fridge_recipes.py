@@ -2,13 +2,16 @@ import datetime
 import uuid
 
 import pytest
+from catalogs.models import Ingredient, IngredientRecipeIndex, Recipe, RecipeIngredient
 from catalogs.tests.factories import (
+    CategoryFactory,
     IngredientFactory,
     RecipeFactory,
     RecipeIngredientFactory,
 )
 from django.urls import reverse
 from fridge.api import FridgeRecipes
+from fridge.matching import refresh_feasible_recipes
 from fridge.tests.factories import FridgeIngredientFactory
 from pytest_django.asserts import assertContains, assertNotContains
 from rest_framework.test import APIRequestFactory
@@ -17,6 +20,14 @@ from units.tests.factories import UnitFactory, UnitTypeFactory
 pytestmark = pytest.mark.django_db
 
 
+@pytest.fixture(autouse=True, params=["sql", "numpy"])
+def matching_engine(request, settings):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    settings.FRIDGE_MATCHING_ENGINE = request.param
+    return request.param
+
+
 def test_get_fridge_recipes_returns_feasible_recipes():
     carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
     ingredients_recipes1 = [
@@ -248,6 +259,243 @@ def test_get_fridge_recipes_returns_correct_fields_with_unsure_ingredients():
     assert set(response.data[0]["unsure_ingredients"]) == {"Carottes", "Oignons"}
 
 
+def test_get_fridge_recipes_responses_are_identical_with_all_matching_engines(
+    settings,
+):
+    pytest.importorskip("numpy")
+    carottes, tomates, oignons, gramme, masse = _dataset_for_fridge_recipes_tests()
+    kg = UnitFactory(abbreviation="kg", rapport=1000, type=masse)
+    pieces_type = UnitTypeFactory(name="pièce(s)")
+    pieces = UnitFactory(abbreviation="pièce(s)", rapport=1, type=pieces_type)
+    FridgeIngredientFactory(
+        ingredient=oignons,
+        amount=2,
+        unit=pieces,
+        expiration_date=datetime.date(2129, 1, 1),
+    )
+    recipes_ingredients: list = [
+        [(carottes, 0.5, kg), (tomates, 50, gramme)],
+        [(carottes, 600, gramme), (tomates, 10, gramme)],
+        [(oignons, 3, pieces), (tomates, 10, gramme), (carottes, 3, pieces)],
+        [(oignons, 60, gramme)],
+    ]
+    for i, ingredients in enumerate(recipes_ingredients):
+        RecipeFactory(
+            ingredients=[
+                RecipeIngredientFactory(ingredient=ingredient, amount=amount, unit=unit)
+                for ingredient, amount, unit in ingredients
+            ],
+            title=f"Recipe {i}",
+        )
+    contents = []
+    for engine in ["sql", "numpy"]:
+        settings.FRIDGE_MATCHING_ENGINE = engine
+        refresh_feasible_recipes()
+        request = APIRequestFactory().get(reverse("recipes_fridge_list"))
+        response = FridgeRecipes.as_view()(request)
+        contents.append(response.render().content)
+    assert contents[0] == contents[1]
+    assert len(response.data) == 3
+
+
+def test_get_fridge_recipes_gives_the_new_name_of_a_renamed_ingredient():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme),
+            RecipeIngredientFactory(ingredient=tomates, amount=50, unit=gramme),
+            RecipeIngredientFactory(ingredient=oignons, amount=60, unit=gramme),
+        ]
+    )
+    carottes.name = "Carottes nouvelles"
+    carottes.save()
+    request = APIRequestFactory().get(reverse("recipes_fridge_list"))
+    response = FridgeRecipes.as_view()(request)
+    assert response.data[0]["priority_ingredients"] == ["Carottes nouvelles"]
+
+
+def test_get_fridge_recipes_matches_ingredients_beyond_the_first_bitset_word():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    poireaux = IngredientFactory(name="Poireaux")
+    Ingredient.objects.filter(pk=carottes.pk).update(bit=100)
+    Ingredient.objects.filter(pk=poireaux.pk).update(bit=200)
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+        ],
+        title="Recipe 1",
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme),
+            RecipeIngredientFactory(ingredient=poireaux, amount=10, unit=gramme),
+        ],
+        title="Recipe 2",
+    )
+    request = APIRequestFactory().get(reverse("recipes_fridge_list"))
+    response = FridgeRecipes.as_view()(request)
+    assert [recipe["title"] for recipe in response.data] == ["Recipe 1"]
+
+
+def test_get_fridge_recipes_with_stocked_ingredients_without_bit():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+        ],
+        title="Recipe 1",
+    )
+    # added like from the admin, without updating the ingredients index
+    recipe.ingredients.add(
+        RecipeIngredientFactory(ingredient=tomates, amount=50, unit=gramme)
+    )
+    assert Ingredient.objects.get(pk=tomates.pk).bit is None
+    refresh_feasible_recipes()
+    request = APIRequestFactory().get(reverse("recipes_fridge_list"))
+    response = FridgeRecipes.as_view()(request)
+    assert [recipe["title"] for recipe in response.data] == ["Recipe 1"]
+
+
+def test_get_fridge_recipes_with_limit_returns_first_recipes_and_cursor():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    for title, ingredient in [
+        ("Recipe 3", oignons),
+        ("Recipe 1", carottes),
+        ("Recipe 2", tomates),
+    ]:
+        RecipeFactory(
+            ingredients=[
+                RecipeIngredientFactory(ingredient=ingredient, amount=10, unit=gramme)
+            ],
+            title=title,
+        )
+    url = reverse("recipes_fridge_list")
+    request = APIRequestFactory().get(url, {"limit": 2})
+    response = FridgeRecipes.as_view()(request)
+    assert [recipe["title"] for recipe in response.data["results"]] == [
+        "Recipe 1",
+        "Recipe 2",
+    ]
+    request = APIRequestFactory().get(response.data["next"])
+    response = FridgeRecipes.as_view()(request)
+    assert [recipe["title"] for recipe in response.data["results"]] == ["Recipe 3"]
+    assert response.data["next"] is None
+
+
+def test_get_fridge_recipes_with_limit_reads_only_the_first_recipes(
+    django_assert_num_queries,
+):
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    _bulk_create_recipes(1000, [carottes, tomates, oignons], gramme)
+    refresh_feasible_recipes()
+    url = reverse("recipes_fridge_list")
+    request = APIRequestFactory().get(url, {"limit": 5})
+    # version stamps, feasible recipes, recipes ingredients and recipes categories
+    with django_assert_num_queries(4) as captured:
+        response = FridgeRecipes.as_view()(request)
+    assert len(response.data["results"]) == 5
+    assert "LIMIT 6" in captured.captured_queries[1]["sql"]
+
+
+def test_get_fridge_recipes_returns_304_without_matching_when_nothing_changed(
+    django_assert_num_queries,
+):
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+        ]
+    )
+    url = reverse("recipes_fridge_list")
+    etag = FridgeRecipes.as_view()(APIRequestFactory().get(url))["ETag"]
+    request = APIRequestFactory().get(url, HTTP_IF_NONE_MATCH=etag)
+    # version stamps only
+    with django_assert_num_queries(1):
+        response = FridgeRecipes.as_view()(request)
+    assert response.status_code == 304
+    request = APIRequestFactory().get(url, {"limit": 5}, HTTP_IF_NONE_MATCH=etag)
+    assert FridgeRecipes.as_view()(request).status_code == 200
+    FridgeIngredientFactory(ingredient=tomates, amount=10, unit=gramme)
+    request = APIRequestFactory().get(url, HTTP_IF_NONE_MATCH=etag)
+    assert FridgeRecipes.as_view()(request).status_code == 200
+
+
+def test_get_fridge_recipes_returns_200_after_a_feasible_recipe_is_deleted():
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+        ]
+    )
+    url = reverse("recipes_fridge_list")
+    etag = FridgeRecipes.as_view()(APIRequestFactory().get(url))["ETag"]
+    recipe.delete()
+    request = APIRequestFactory().get(url, HTTP_IF_NONE_MATCH=etag)
+    response = FridgeRecipes.as_view()(request)
+    assert response.status_code == 200
+    assert response.data == []
+
+
+@pytest.mark.parametrize("recipes_count", [1000, 10000])
+def test_get_fridge_recipes_number_of_queries_does_not_depend_on_catalog_size(
+    django_assert_num_queries, recipes_count
+):
+    carottes, tomates, oignons, gramme, _ = _dataset_for_fridge_recipes_tests()
+    _bulk_create_recipes(recipes_count, [carottes, tomates, oignons], gramme)
+    refresh_feasible_recipes()
+    url = reverse("recipes_fridge_list")
+    request = APIRequestFactory().get(url)
+    # version stamps, feasible recipes, recipes ingredients and recipes categories
+    with django_assert_num_queries(4):
+        response = FridgeRecipes.as_view()(request)
+        assert len(response.data) == recipes_count
+        assert len(response.data[0]["ingredients"]) == 3
+        assert len(response.data[0]["categories"]) == 1
+
+
+def _bulk_create_recipes(recipes_count, ingredients, unit):
+    category = CategoryFactory()
+    recipes, recipe_ingredients, recipes_ingredients, recipes_categories = (
+        [],
+        [],
+        [],
+        [],
+    )
+    index_entries = []
+    for i in range(recipes_count):
+        recipe = Recipe(
+            title=f"Recipe {i}",
+            description="description",
+            duration=datetime.timedelta(minutes=30),
+            ingredients_count=len(ingredients),
+        )
+        recipes.append(recipe)
+        recipes_categories.append(
+            Recipe.categories.through(recipe_id=recipe.id, category_id=category.id)
+        )
+        for ingredient in ingredients:
+            recipe_ingredient = RecipeIngredient(
+                ingredient=ingredient, amount=10, unit=unit
+            )
+            recipe_ingredients.append(recipe_ingredient)
+            recipes_ingredients.append(
+                Recipe.ingredients.through(
+                    recipe_id=recipe.id, recipeingredient_id=recipe_ingredient.id
+                )
+            )
+            index_entries.append(
+                IngredientRecipeIndex(ingredient=ingredient, recipe=recipe)
+            )
+    Recipe.objects.bulk_create(recipes)
+    RecipeIngredient.objects.bulk_create(recipe_ingredients)
+    Recipe.ingredients.through.objects.bulk_create(recipes_ingredients)
+    IngredientRecipeIndex.objects.bulk_create(index_entries)
+    Recipe.categories.through.objects.bulk_create(recipes_categories)
+    Recipe.objects.all().update_ingredients_bitsets()
+    return recipes
+
+
 def _check_recipe_fields(response, recipe):
     assert len(response.data) == 1
     recipe_data = response.data[0]
@@ -0,0 +1,103 @@
+import datetime
+from io import StringIO
+
+import pytest
+from catalogs.tests.factories import (
+    IngredientFactory,
+    RecipeFactory,
+    RecipeIngredientFactory,
+)
+from django.core.management import CommandError, call_command
+from fridge.models import FeasibleRecipe, FridgeIngredient
+from fridge.tests.factories import FridgeIngredientFactory
+from units.tests.factories import UnitFactory, UnitTypeFactory
+from versions.models import VersionStamp
+
+pytestmark = pytest.mark.django_db
+
+
+def test_benchmarkfridgestock_gives_same_results_and_leaves_database_unchanged():
+    out, err = StringIO(), StringIO()
+    call_command("benchmarkfridgestock", rows=200, repeat=1, stdout=out, stderr=err)
+    assert "database aggregation" in out.getvalue()
+    assert err.getvalue() == ""
+    assert FridgeIngredient.objects.count() == 0
+
+
+def test_refreshfeasiblerecipes_recomputes_all_recipes():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme)
+        ]
+    )
+    FeasibleRecipe.objects.all().delete()
+    versions = VersionStamp.objects.validators(["fridge"])[0]
+    call_command("refreshfeasiblerecipes", stdout=StringIO())
+    assert FeasibleRecipe.objects.count() == 1
+    assert VersionStamp.objects.validators(["fridge"])[0] != versions
+
+
+def test_benchmarkmatchingengines_gives_same_results_and_leaves_database_unchanged():
+    pytest.importorskip("numpy")
+    out, err = StringIO(), StringIO()
+    call_command(
+        "benchmarkmatchingengines",
+        recipes=300,
+        ingredients=50,
+        fridge=20,
+        stdout=out,
+        stderr=err,
+    )
+    assert "numpy: first run" in out.getvalue()
+    assert err.getvalue() == ""
+    assert FridgeIngredient.objects.count() == 0
+
+
+def test_exportfridge_and_importfridge_round_trip(tmp_path):
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    path = tmp_path / "fridge.csv"
+    call_command("exportfridge", format="csv", output=str(path))
+    FridgeIngredient.objects.all().delete()
+    out = StringIO()
+    call_command("importfridge", str(path), stdout=out)
+    assert "1 fridge ingredients created, 0 merged" in out.getvalue()
+    assert FridgeIngredient.objects.get().amount == 500
+
+
+def test_importfridge_reports_invalid_records(tmp_path):
+    path = tmp_path / "fridge.ndjson"
+    path.write_text('{"ingredient": "Inconnu"}\n')
+    with pytest.raises(CommandError, match="line 1"):
+        call_command("importfridge", str(path))
+
+
+def test_purgeexpiredfridge_archives_and_deletes_expired_ingredients(tmp_path):
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    FridgeIngredientFactory(
+        ingredient=IngredientFactory(name="Carottes"),
+        unit=gramme,
+        expiration_date=datetime.date(2020, 1, 1),
+    )
+    FridgeIngredientFactory(
+        ingredient=IngredientFactory(name="Navets"),
+        unit=gramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    archive = tmp_path / "expired.ndjson"
+    out = StringIO()
+    call_command(
+        "purgeexpiredfridge", before="2025-01-01", archive=str(archive), stdout=out
+    )
+    assert "1 expired fridge ingredients deleted" in out.getvalue()
+    assert FridgeIngredient.objects.get().ingredient.name == "Navets"
+    FridgeIngredient.objects.all().delete()
+    call_command("importfridge", str(archive), stdout=StringIO())
+    assert FridgeIngredient.objects.get().ingredient.name == "Carottes"
@@ -0,0 +1,175 @@
+import datetime
+import threading
+from decimal import Decimal
+
+import pytest
+from catalogs.tests.factories import (
+    IngredientFactory,
+    RecipeFactory,
+    RecipeIngredientFactory,
+)
+from django.db import connection
+from fridge.consumption import consume_recipe
+from fridge.models import FridgeIngredient
+from fridge.tests.factories import FridgeIngredientFactory
+from units.tests.factories import UnitFactory, UnitTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_consume_recipe_sums_the_amounts_of_a_repeated_ingredient():
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[100, 100])
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=60, unit=gramme),
+            RecipeIngredientFactory(ingredient=carottes, amount=60, unit=gramme),
+        ]
+    )
+    consume_recipe(recipe)
+    assert list(FridgeIngredient.objects.values_list("amount", flat=True)) == [80]
+
+
+def test_consume_recipe_converts_the_amounts_within_a_unit_type():
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[])
+    kilogramme = UnitFactory(abbreviation="kg", rapport=1000, type=gramme.type)
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=2,
+        unit=kilogramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+        ]
+    )
+    consume_recipe(recipe)
+    fridge_ingredient = FridgeIngredient.objects.get()
+    assert fridge_ingredient.amount == Decimal("1.5")
+    assert fridge_ingredient.unit == kilogramme
+
+
+def test_consume_recipe_rounds_the_remaining_amount_down():
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[])
+    kilogramme = UnitFactory(abbreviation="kg", rapport=1000, type=gramme.type)
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=1,
+        unit=kilogramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=4, unit=gramme)
+        ]
+    )
+    consume_recipe(recipe)
+    assert FridgeIngredient.objects.get().amount == Decimal("0.99")
+
+
+def test_consume_recipe_consumes_the_earliest_expiration_first_across_units():
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[300])
+    kilogramme = UnitFactory(abbreviation="kg", rapport=1000, type=gramme.type)
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=1,
+        unit=kilogramme,
+        expiration_date=datetime.date(2030, 2, 1),
+    )
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=0.5, unit=kilogramme)
+        ]
+    )
+    consume_recipe(recipe)
+    assert list(FridgeIngredient.objects.values_list("amount", "unit")) == [
+        (Decimal("0.8"), kilogramme.id)
+    ]
+
+
+def test_consume_recipe_does_not_consume_another_unit_type():
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[])
+    piece = UnitFactory(abbreviation="pièce(s)", rapport=1)
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=3,
+        unit=piece,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=2, unit=gramme)
+        ]
+    )
+    consume_recipe(recipe)
+    assert FridgeIngredient.objects.get().amount == 3
+
+
+def test_consume_recipe_writes_with_one_bulk_update_and_one_bulk_delete(
+    django_assert_max_num_queries,
+):
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[10] * 20 + [100])
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=250, unit=gramme)
+        ]
+    )
+    with django_assert_max_num_queries(50) as captured:
+        consume_recipe(recipe)
+    fridge_writes = [
+        query["sql"].split()[0]
+        for query in captured.captured_queries
+        if query["sql"].startswith(
+            (
+                'UPDATE "fridge_fridgeingredient"',
+                'DELETE FROM "fridge_fridgeingredient"',
+            )
+        )
+    ]
+    assert fridge_writes == ["UPDATE", "DELETE"]
+    assert FridgeIngredient.objects.get().amount == 50
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_consumptions_consume_each_amount_once():
+    gramme, carottes = _dataset_for_consumption_tests(amounts=[200] * 5)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=15, unit=gramme)
+        ]
+    )
+    errors = []
+
+    def consume():
+        try:
+            consume_recipe(recipe)
+        except Exception as error:  # noqa: B902
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=consume) for _ in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert list(
+        FridgeIngredient.objects.order_by("expiration_date").values_list(
+            "amount", flat=True
+        )
+    ) == [50, 200]
+
+
+def _dataset_for_consumption_tests(amounts):
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    for day, amount in enumerate(amounts, start=1):
+        FridgeIngredientFactory(
+            ingredient=carottes,
+            amount=amount,
+            unit=gramme,
+            expiration_date=datetime.date(2030, 1, day),
+        )
+    return gramme, carottes
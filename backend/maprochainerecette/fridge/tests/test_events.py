@@ -0,0 +1,249 @@
+import asyncio
+import time
+
+import pytest
+from catalogs.tests.factories import (
+    IngredientFactory,
+    RecipeFactory,
+    RecipeIngredientFactory,
+)
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from fridge import events
+from fridge.api import FridgeEvents
+from fridge.checks import check_event_broker
+from fridge.consumption import consume_recipe
+from fridge.events import InProcessBroker
+from fridge.tests.factories import FridgeIngredientFactory
+from maprochainerecette.asgi import StreamingASGIHandler
+from rest_framework.test import APIRequestFactory
+from units.tests.factories import UnitFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def broker():
+    events.get_broker.cache_clear()
+    yield events.get_broker()
+    events.get_broker.cache_clear()
+
+
+def test_broker_publishes_to_the_subscribers():
+    broker = InProcessBroker()
+    subscription = broker.subscribe()
+    broker.publish({"a": 1})
+    assert subscription.get(timeout=0) == (f"{broker.epoch}-1", {"a": 1})
+    assert subscription.get(timeout=0) is None
+    broker.unsubscribe(subscription)
+    broker.publish({"a": 2})
+    assert subscription.get(timeout=0) is None
+
+
+def test_broker_sends_the_missed_events_to_a_reconnecting_subscriber():
+    broker = InProcessBroker()
+    for i in range(3):
+        broker.publish({"a": i})
+    subscription = broker.subscribe(last_event_id=f"{broker.epoch}-1")
+    assert [subscription.get(timeout=0) for _ in range(2)] == [
+        (f"{broker.epoch}-2", {"a": 1}),
+        (f"{broker.epoch}-3", {"a": 2}),
+    ]
+    assert not subscription.overflowed
+    assert broker.subscribe(last_event_id=f"{broker.epoch}-10").overflowed
+    assert broker.subscribe(last_event_id="1").overflowed
+
+
+def test_broker_resets_the_subscribers_of_a_previous_epoch():
+    previous_broker = InProcessBroker()
+    previous_broker.publish({"a": 1})
+    broker = InProcessBroker()
+    broker.publish({"a": 2})
+    assert broker.epoch != previous_broker.epoch
+    assert broker.subscribe(last_event_id=f"{previous_broker.epoch}-1").overflowed
+
+
+def test_broker_flags_the_subscriptions_that_overflow():
+    broker = InProcessBroker()
+    broker.subscription_size = 2
+    subscription = broker.subscribe()
+    for i in range(3):
+        broker.publish({"a": i})
+    assert subscription.overflowed
+
+
+def test_adding_a_fridge_ingredient_publishes_it_with_the_feasible_recipes(
+    broker, django_capture_on_commit_callbacks
+):
+    carottes = IngredientFactory(name="carottes")
+    gramme = UnitFactory(abbreviation="g", rapport=1)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme)
+        ]
+    )
+    subscription = broker.subscribe()
+    with django_capture_on_commit_callbacks(execute=True):
+        fridge_ingredient = FridgeIngredientFactory(
+            ingredient=carottes, amount=500, unit=gramme
+        )
+    _, data = subscription.get(timeout=0)
+    assert [row["id"] for row in data["fridge_ingredients"]["added"]] == [
+        str(fridge_ingredient.id)
+    ]
+    assert data["recipes"] == {"feasible": [str(recipe.id)], "unfeasible": []}
+    assert subscription.get(timeout=0) is None
+
+
+def test_consuming_a_recipe_publishes_a_single_event(
+    broker, django_capture_on_commit_callbacks
+):
+    carottes = IngredientFactory(name="carottes")
+    gramme = UnitFactory(abbreviation="g", rapport=1)
+    kept = FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    consumed = FridgeIngredientFactory(
+        ingredient=IngredientFactory(name="navets"), amount=100, unit=gramme
+    )
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme),
+            RecipeIngredientFactory(
+                ingredient=consumed.ingredient, amount=100, unit=gramme
+            ),
+        ]
+    )
+    subscription = broker.subscribe()
+    with django_capture_on_commit_callbacks(execute=True):
+        consume_recipe(recipe)
+    _, data = subscription.get(timeout=0)
+    assert data["fridge_ingredients"]["added"] == []
+    assert [
+        (row["id"], row["amount"]) for row in data["fridge_ingredients"]["changed"]
+    ] == [(str(kept.id), "400.00")]
+    assert data["fridge_ingredients"]["removed"] == [str(consumed.id)]
+    assert data["recipes"] == {"feasible": [], "unfeasible": [str(recipe.id)]}
+    assert subscription.get(timeout=0) is None
+
+
+def test_deleting_a_feasible_recipe_publishes_it_as_unfeasible(
+    broker, django_capture_on_commit_callbacks
+):
+    carottes = IngredientFactory(name="carottes")
+    gramme = UnitFactory(abbreviation="g", rapport=1)
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme)
+        ]
+    )
+    recipe_id = recipe.id
+    subscription = broker.subscribe()
+    with django_capture_on_commit_callbacks(execute=True):
+        recipe.delete()
+    _, data = subscription.get(timeout=0)
+    assert data["recipes"] == {"feasible": [], "unfeasible": [str(recipe_id)]}
+    assert subscription.get(timeout=0) is None
+
+
+def test_too_large_changes_are_published_as_a_reset(
+    broker, django_capture_on_commit_callbacks, monkeypatch
+):
+    monkeypatch.setattr("fridge.events.MAX_DELTA_SIZE", 2)
+    subscription = broker.subscribe()
+    with django_capture_on_commit_callbacks(execute=True), events.batched():
+        for _ in range(3):
+            FridgeIngredientFactory()
+    _, data = subscription.get(timeout=0)
+    assert data is None
+    assert subscription.get(timeout=0) is None
+
+
+def test_rolled_back_changes_are_not_published(
+    broker, django_capture_on_commit_callbacks
+):
+    subscription = broker.subscribe()
+    with django_capture_on_commit_callbacks(execute=True):
+        with pytest.raises(ValueError), transaction.atomic():
+            FridgeIngredientFactory()
+            raise ValueError()
+    assert subscription.get(timeout=0) is None
+
+
+def test_fridge_events_view_streams_the_events(broker):
+    broker.publish({"a": 1})
+    broker.publish({"a": 2})
+    request = APIRequestFactory().get(
+        "/api/fridge/events/", HTTP_LAST_EVENT_ID=f"{broker.epoch}-1"
+    )
+    response = FridgeEvents.as_view(keep_alive=0)(request)
+    assert response["Content-Type"] == "text/event-stream"
+    stream = iter(response.streaming_content)
+    assert next(stream) == (
+        f'id: {broker.epoch}-2\nevent: fridge\ndata: {{"a":2}}\n\n'.encode()
+    )
+    assert next(stream) == b": keep-alive\n\n"
+    response.close()
+    broker.publish({"a": 3})
+    assert not broker._subscriptions
+
+
+def test_fridge_events_view_streams_reset_events(broker):
+    broker.publish(None)
+    broker.publish({"a": 2})
+    request = APIRequestFactory().get(
+        "/api/fridge/events/", HTTP_LAST_EVENT_ID=f"{broker.epoch}-0"
+    )
+    response = FridgeEvents.as_view(keep_alive=0)(request)
+    stream = iter(response.streaming_content)
+    assert (
+        next(stream) == f"id: {broker.epoch}-1\nevent: reset\ndata: {{}}\n\n".encode()
+    )
+    assert next(stream) == (
+        f'id: {broker.epoch}-2\nevent: fridge\ndata: {{"a":2}}\n\n'.encode()
+    )
+    response.close()
+
+
+def test_fridge_events_view_resets_the_clients_of_a_previous_epoch(broker):
+    request = APIRequestFactory().get("/api/fridge/events/", HTTP_LAST_EVENT_ID="1")
+    response = FridgeEvents.as_view(keep_alive=0)(request)
+    assert list(response.streaming_content) == [b"event: reset\ndata: {}\n\n"]
+
+
+def test_asgi_handler_reads_the_streams_out_of_the_event_loop():
+    def parts():
+        time.sleep(0.2)
+        yield "data"
+
+    response = StreamingHttpResponse(parts())
+    messages: list = []
+    sent_counts = []
+
+    async def send(message):
+        messages.append(message)
+
+    async def count_sent_messages():
+        for _ in range(5):
+            sent_counts.append(len(messages))
+            await asyncio.sleep(0.02)
+
+    async def serve():
+        await asyncio.gather(
+            StreamingASGIHandler().send_response(response, send),
+            count_sent_messages(),
+        )
+
+    asyncio.run(serve())
+    # the event loop ran while the first part was awaited
+    assert sent_counts == [1] * 5
+    assert [message.get("body") for message in messages] == [None, b"data", None]
+
+
+def test_in_process_broker_is_rejected_with_several_worker_processes(settings):
+    settings.FRIDGE_EVENT_BROKER = "fridge.events.InProcessBroker"
+    settings.WEB_CONCURRENCY = 1
+    assert check_event_broker(None) == []
+    settings.WEB_CONCURRENCY = 4
+    assert [error.id for error in check_event_broker(None)] == ["fridge.E001"]
+    settings.FRIDGE_EVENT_BROKER = "project.brokers.RedisBroker"
+    assert check_event_broker(None) == []
@@ -0,0 +1,123 @@
+import contextlib
+import datetime
+import io
+import json
+from decimal import Decimal
+
+import pytest
+from catalogs.tests.factories import IngredientFactory
+from django.db import DatabaseError
+from django.utils import timezone
+from fridge.api import FridgeIngredientViewSet
+from fridge.expiration import purge_expired_fridge_ingredients
+from fridge.models import FridgeIngredient
+from fridge.tests.factories import FridgeIngredientFactory
+from rest_framework.test import APIRequestFactory
+from units.tests.factories import UnitFactory, UnitTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def units():
+    masse = UnitTypeFactory(name="masse")
+    return {
+        "g": UnitFactory(abbreviation="g", rapport=1, type=masse),
+        "kg": UnitFactory(abbreviation="kg", rapport=1000, type=masse),
+    }
+
+
+def _in_days(days):
+    return timezone.localdate() + datetime.timedelta(days=days)
+
+
+def test_expiring_groups_fridge_ingredients_with_canonical_totals(units):
+    carottes = IngredientFactory(name="carottes")
+    navets = IngredientFactory(name="navets")
+    FridgeIngredientFactory(
+        ingredient=carottes, amount=500, unit=units["g"], expiration_date=_in_days(2)
+    )
+    FridgeIngredientFactory(
+        ingredient=carottes, amount=1, unit=units["kg"], expiration_date=_in_days(3)
+    )
+    FridgeIngredientFactory(
+        ingredient=navets, amount=200, unit=units["g"], expiration_date=_in_days(-1)
+    )
+    FridgeIngredientFactory(
+        ingredient=navets, amount=300, unit=units["g"], expiration_date=_in_days(10)
+    )
+    response = _get_expiring({"days": 3})
+    assert response.status_code == 200
+    assert [
+        (group["ingredient"], group["canonical_unit"], group["canonical_amount"])
+        for group in response.data
+    ] == [("navets", "g", "200.00"), ("carottes", "g", "1500.00")]
+    assert [
+        (fridge_ingredient["amount"], fridge_ingredient["unit"])
+        for fridge_ingredient in response.data[1]["fridge_ingredients"]
+    ] == [("500.00", "g"), ("1.00", "kg")]
+    assert response.data[1]["earliest_expiration_date"] == str(_in_days(2))
+
+
+def test_expiring_rejects_a_negative_number_of_days():
+    assert _get_expiring({"days": -1}).status_code == 400
+
+
+def test_expiring_is_read_with_two_queries(units, django_assert_num_queries):
+    for i in range(5):
+        FridgeIngredientFactory(
+            ingredient=IngredientFactory(name=f"ingrédient {i}"),
+            unit=units["g"],
+            expiration_date=_in_days(i),
+        )
+    with django_assert_num_queries(2):
+        response = _get_expiring({"days": 7})
+    assert len(response.data) == 5
+
+
+def test_purge_deletes_expired_fridge_ingredients_in_batches(units):
+    carottes = IngredientFactory(name="carottes")
+    for days in range(-5, 2):
+        FridgeIngredientFactory(
+            ingredient=carottes,
+            amount=100,
+            unit=units["g"],
+            expiration_date=_in_days(days),
+        )
+    archive = io.StringIO()
+    assert purge_expired_fridge_ingredients(timezone.localdate(), 2, archive) == 5
+    assert sorted(
+        FridgeIngredient.objects.values_list("expiration_date", flat=True)
+    ) == [
+        _in_days(0),
+        _in_days(1),
+    ]
+    archived = [json.loads(line) for line in archive.getvalue().splitlines()]
+    assert [record["expiration_date"] for record in archived] == [
+        str(_in_days(days)) for days in range(-5, 0)
+    ]
+    assert Decimal(archived[0]["amount"]) == 100
+
+
+def test_purge_does_not_archive_a_batch_that_is_not_committed(units, monkeypatch):
+    FridgeIngredientFactory(unit=units["g"], expiration_date=_in_days(-1))
+
+    @contextlib.contextmanager
+    def failing_refresh():
+        yield
+        raise DatabaseError()
+
+    monkeypatch.setattr("fridge.expiration.deferred_refresh", failing_refresh)
+    archive = io.StringIO()
+    with pytest.raises(DatabaseError):
+        purge_expired_fridge_ingredients(timezone.localdate(), 2, archive)
+    assert archive.getvalue() == ""
+    assert FridgeIngredient.objects.count() == 1
+
+
+def _get_expiring(parameters):
+    view = FridgeIngredientViewSet()
+    view.basename = "ingredients_fridge"
+    view.request = None
+    request = APIRequestFactory().get(view.reverse_action("expiring"), parameters)
+    return FridgeIngredientViewSet.as_view({"get": "expiring"})(request)
@@ -0,0 +1,189 @@
+import datetime
+import json
+from decimal import Decimal
+
+import pytest
+from catalogs.tests.factories import IngredientFactory
+from fridge.api import FridgeIngredientViewSet
+from fridge.inventory import InvalidInventory, export_inventory, import_inventory
+from fridge.models import FridgeIngredient
+from fridge.tests.factories import FridgeIngredientFactory
+from rest_framework.test import APIRequestFactory
+from units.tests.factories import UnitFactory, UnitTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture()
+def fridge():
+    unit_type = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=unit_type)
+    UnitFactory(abbreviation="kg", rapport=1000, type=unit_type)
+    carottes = IngredientFactory(name="carottes")
+    IngredientFactory(name="navets")
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=500,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+
+
+@pytest.mark.parametrize("file_format", ["ndjson", "csv"])
+def test_exported_inventory_imports_back(fridge, file_format):
+    lines = list(export_inventory(file_format))
+    assert import_inventory(lines, file_format) == (0, 1)
+    fridge_ingredient = FridgeIngredient.objects.get()
+    assert (fridge_ingredient.amount, fridge_ingredient.unit.abbreviation) == (
+        Decimal("1000"),
+        "g",
+    )
+
+
+def test_export_in_csv(fridge):
+    assert list(export_inventory("csv")) == [
+        "ingredient,amount,unit,expiration_date\n",
+        "carottes,500.00,g,2030-07-20\n",
+    ]
+
+
+def test_export_in_ndjson(fridge):
+    assert [json.loads(line) for line in export_inventory("ndjson")] == [
+        {
+            "ingredient": "carottes",
+            "amount": "500.00",
+            "unit": "g",
+            "expiration_date": "2030-07-20",
+        }
+    ]
+
+
+def test_import_merges_records_across_batches(fridge, monkeypatch):
+    monkeypatch.setattr("fridge.inventory.BATCH_SIZE", 2)
+    lines = [
+        '{"ingredient": "navets", "amount": "200", "unit": "g", '
+        '"expiration_date": "2030-07-27"}\n'
+    ] * 5
+    assert import_inventory(lines, "ndjson") == (1, 4)
+    fridge_ingredient = FridgeIngredient.objects.get(ingredient__name="navets")
+    assert fridge_ingredient.amount == Decimal("1000")
+
+
+def test_import_of_an_invalid_record_imports_nothing(fridge):
+    lines = [
+        "ingredient,amount,unit,expiration_date\n",
+        "navets,200,g,2030-07-27\n",
+        "inconnu,200,g,2030-07-27\n",
+    ]
+    with pytest.raises(InvalidInventory) as error:
+        import_inventory(lines, "csv")
+    assert error.value.line == 3
+    assert set(error.value.errors) == {"ingredient"}
+    assert FridgeIngredient.objects.count() == 1
+
+
+def test_import_of_an_invalid_record_keeps_the_previous_batches(fridge, monkeypatch):
+    monkeypatch.setattr("fridge.inventory.BATCH_SIZE", 2)
+    lines = [
+        "ingredient,amount,unit,expiration_date\n",
+        "navets,200,g,2030-07-27\n",
+        "carottes,1,kg,2030-07-20\n",
+        "navets,200,g,2030-07-27\n",
+        "inconnu,200,g,2030-07-27\n",
+    ]
+    with pytest.raises(InvalidInventory) as error:
+        import_inventory(lines, "csv")
+    assert (error.value.line, error.value.created, error.value.merged) == (5, 1, 1)
+    assert sorted(
+        FridgeIngredient.objects.values_list("ingredient__name", "amount")
+    ) == [("carottes", Decimal("1.5")), ("navets", Decimal("200"))]
+
+
+def test_import_of_invalid_json_gives_the_line(fridge):
+    with pytest.raises(InvalidInventory) as error:
+        import_inventory(["\n", "[1, 2]\n"], "ndjson")
+    assert error.value.line == 2
+
+
+def test_api_export_streams_the_inventory(fridge):
+    request = APIRequestFactory().get(_get_url("export"), {"output": "csv"})
+    response = FridgeIngredientViewSet.as_view({"get": "export"})(request)
+    assert response.status_code == 200
+    assert response.streaming
+    assert response["Content-Type"] == "text/csv"
+    assert b"".join(response.streaming_content).decode() == (
+        "ingredient,amount,unit,expiration_date\ncarottes,500.00,g,2030-07-20\n"
+    )
+
+
+def test_api_export_rejects_an_unknown_output(fridge):
+    request = APIRequestFactory().get(_get_url("export"), {"output": "xml"})
+    response = FridgeIngredientViewSet.as_view({"get": "export"})(request)
+    assert response.status_code == 400
+
+
+def test_api_import_adds_the_inventory(fridge):
+    body = "".join(
+        json.dumps(record) + "\n"
+        for record in [
+            {
+                "ingredient": "carottes",
+                "amount": "1",
+                "unit": "kg",
+                "expiration_date": "2030-07-20",
+            },
+            {
+                "ingredient": "navets",
+                "amount": "200",
+                "unit": "g",
+                "expiration_date": "2030-07-27",
+            },
+        ]
+    )
+    response = _import(body, "application/x-ndjson")
+    assert response.status_code == 200
+    assert response.data == {"created": 1, "merged": 1}
+    assert FridgeIngredient.objects.get(ingredient__name="carottes").amount == Decimal(
+        "1.5"
+    )
+
+
+def test_api_import_rejects_an_invalid_record(fridge):
+    response = _import(
+        "ingredient,amount,unit,expiration_date\nnavets,beaucoup,g,2030-07-27\n",
+        "text/csv",
+    )
+    assert response.status_code == 400
+    assert response.data["line"] == 2
+    assert "amount" in response.data["errors"]
+    assert (response.data["created"], response.data["merged"]) == (0, 0)
+    assert FridgeIngredient.objects.count() == 1
+
+
+def test_api_import_rejects_other_content_types(fridge):
+    response = _import("{}", "application/json")
+    assert response.status_code == 415
+
+
+def test_api_import_requires_the_content_length(fridge):
+    response = _import(
+        '{"ingredient": "Carottes"}\n', "application/x-ndjson", chunked=True
+    )
+    assert response.status_code == 411
+
+
+def _import(body, content_type, chunked=False):
+    request = APIRequestFactory().post(
+        _get_url("import-inventory"), body, content_type=content_type
+    )
+    if chunked:
+        del request.META["CONTENT_LENGTH"]
+        request.META["HTTP_TRANSFER_ENCODING"] = "chunked"
+    return FridgeIngredientViewSet.as_view({"post": "import_inventory"})(request)
+
+
+def _get_url(action):
+    view = FridgeIngredientViewSet()
+    view.basename = "ingredients_fridge"
+    view.request = None
+    return view.reverse_action(action)
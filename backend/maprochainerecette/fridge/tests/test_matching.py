@@ -0,0 +1,257 @@
+import datetime
+
+import pytest
+from catalogs.models import Recipe
+from catalogs.tests.factories import (
+    IngredientFactory,
+    RecipeFactory,
+    RecipeIngredientFactory,
+)
+from django.apps import apps
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.db.migrations.loader import MigrationLoader
+from fridge.matching import compute_feasible_recipes, refresh_feasible_recipes
+from fridge.models import FeasibleRecipe, FridgeIngredient, RecipeShortage
+from fridge.signals import fill_stored_feasibility_after_migration
+from fridge.tests.factories import FridgeIngredientFactory
+from fridge.vectorized import get_catalog_matrix
+from units.tests.factories import UnitFactory, UnitTypeFactory
+
+pytestmark = pytest.mark.django_db
+
+
+def test_feasible_recipes_are_annotated_with_priority_ingredient_and_date():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    navet = IngredientFactory(name="Navet")
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=100,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    FridgeIngredientFactory(
+        ingredient=navet,
+        amount=100,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 1, 2),
+    )
+    FridgeIngredientFactory(
+        ingredient=navet,
+        amount=100,
+        unit=gramme,
+        expiration_date=datetime.date(2029, 12, 1),
+    )
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme),
+            RecipeIngredientFactory(ingredient=navet, amount=150, unit=gramme),
+        ]
+    )
+    recipes = list(compute_feasible_recipes())
+    assert recipes == [recipe]
+    assert recipes[0].ingredients_total == 2
+    assert recipes[0].satisfied_ingredients_count == 2
+    assert recipes[0].priority_ingredient == "Navet"
+    assert recipes[0].priority_date == datetime.date(2029, 12, 1)
+    assert recipes[0].unsure_ingredients is None
+
+
+def test_unsure_ingredient_priority_date_is_the_earliest_of_all_unit_types():
+    masse = UnitTypeFactory(name="masse")
+    pieces_type = UnitTypeFactory(name="pièce(s)")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    pieces = UnitFactory(abbreviation="pièce(s)", rapport=1, type=pieces_type)
+    navet = IngredientFactory(name="Navet")
+    FridgeIngredientFactory(
+        ingredient=navet,
+        amount=10,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    FridgeIngredientFactory(
+        ingredient=navet,
+        amount=1,
+        unit=pieces,
+        expiration_date=datetime.date(2030, 3, 1),
+    )
+    RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=navet, amount=400, unit=gramme),
+        ]
+    )
+    recipe = compute_feasible_recipes().get()
+    assert recipe.unsure_ingredients == ["Navet"]
+    assert recipe.priority_date == datetime.date(2030, 1, 1)
+
+
+def test_adding_fridge_ingredient_stores_newly_feasible_recipes():
+    gramme, carottes, recipe = _dataset_for_stored_feasibility_tests()
+    assert not FeasibleRecipe.objects.exists()
+    FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=500,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    feasibility = FeasibleRecipe.objects.get()
+    assert feasibility.recipe == recipe
+    assert feasibility.priority_ingredient == "Carottes"
+    assert feasibility.priority_date == datetime.date(2030, 1, 1)
+    assert feasibility.unsure_ingredients == []
+
+
+def test_merging_fridge_ingredient_updates_stored_feasibility():
+    gramme, carottes, _ = _dataset_for_stored_feasibility_tests()
+    date = datetime.date(2030, 1, 1)
+    FridgeIngredientFactory(
+        ingredient=carottes, amount=50, unit=gramme, expiration_date=date
+    )
+    assert not FeasibleRecipe.objects.exists()
+    FridgeIngredientFactory(
+        ingredient=carottes, amount=50, unit=gramme, expiration_date=date
+    )
+    assert FeasibleRecipe.objects.count() == 1
+
+
+def test_deleting_fridge_ingredient_removes_stored_feasibility():
+    gramme, carottes, _ = _dataset_for_stored_feasibility_tests()
+    fridge_ingredient = FridgeIngredientFactory(
+        ingredient=carottes, amount=500, unit=gramme
+    )
+    assert FeasibleRecipe.objects.count() == 1
+    fridge_ingredient.delete()
+    assert not FeasibleRecipe.objects.exists()
+
+
+def test_changing_recipe_ingredients_updates_stored_feasibility():
+    gramme, carottes, recipe = _dataset_for_stored_feasibility_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    assert FeasibleRecipe.objects.count() == 1
+    recipe.ingredients.set(
+        [RecipeIngredientFactory(ingredient=carottes, amount=600, unit=gramme)]
+    )
+    recipe.update_ingredients_index()
+    assert not FeasibleRecipe.objects.exists()
+
+
+def test_deleting_recipe_removes_stored_feasibility():
+    gramme, carottes, recipe = _dataset_for_stored_feasibility_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    recipe.delete()
+    assert not FeasibleRecipe.objects.exists()
+
+
+def test_migrations_creating_the_stored_feasibility_fill_it():
+    gramme, carottes, recipe = _dataset_for_stored_feasibility_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    FeasibleRecipe.objects.all().delete()
+    RecipeShortage.objects.all().delete()
+    migrations = MigrationLoader(connection).graph.nodes
+    fridge = apps.get_app_config("fridge")
+    fill_stored_feasibility_after_migration(
+        sender=fridge,
+        plan=[(migrations["fridge", "0007_fridgeingredient_filter_indexes"], False)],
+    )
+    assert not FeasibleRecipe.objects.exists()
+    fill_stored_feasibility_after_migration(
+        sender=fridge, plan=[(migrations["fridge", "0003_recipeshortage"], False)]
+    )
+    assert FeasibleRecipe.objects.get().recipe == recipe
+    assert RecipeShortage.objects.get().missing_count == 0
+
+
+def test_refreshing_an_ingredient_only_recomputes_recipes_that_need_it():
+    gramme, carottes, _ = _dataset_for_stored_feasibility_tests()
+    tomates = IngredientFactory(name="Tomates")
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    FridgeIngredientFactory(ingredient=tomates, amount=500, unit=gramme)
+    other_recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=tomates, amount=100, unit=gramme)
+        ]
+    )
+    FeasibleRecipe.objects.all().delete()
+    refresh_feasible_recipes(ingredients=[carottes.id])
+    assert FeasibleRecipe.objects.count() == 1
+    assert not FeasibleRecipe.objects.filter(recipe=other_recipe).exists()
+
+
+def test_fridge_changes_update_stored_shortage_of_recipes():
+    gramme, carottes, recipe = _dataset_for_stored_feasibility_tests()
+    shortage = RecipeShortage.objects.get(recipe=recipe)
+    assert shortage.missing_count == 1
+    assert shortage.priority_date is None
+    fridge_ingredient = FridgeIngredientFactory(
+        ingredient=carottes,
+        amount=50,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 1, 1),
+    )
+    assert RecipeShortage.objects.get(recipe=recipe).missing_count == 1
+    fridge_ingredient.amount = 100
+    fridge_ingredient.save()
+    shortage = RecipeShortage.objects.get(recipe=recipe)
+    assert shortage.missing_count == 0
+    assert shortage.priority_date == datetime.date(2030, 1, 1)
+
+
+def _dataset_for_stored_feasibility_tests():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(abbreviation="g", rapport=1, type=masse)
+    carottes = IngredientFactory(name="Carottes")
+    recipe = RecipeFactory(
+        ingredients=[
+            RecipeIngredientFactory(ingredient=carottes, amount=100, unit=gramme)
+        ]
+    )
+    return gramme, carottes, recipe
+
+
+def test_refreshing_with_unknown_matching_engine_raises_exception(settings):
+    settings.FRIDGE_MATCHING_ENGINE = "unknown"
+    with pytest.raises(ImproperlyConfigured):
+        refresh_feasible_recipes()
+
+
+def test_rebuilding_the_bitsets_reloads_the_catalog_matrix():
+    pytest.importorskip("numpy")
+    _dataset_for_stored_feasibility_tests()
+    matrix = get_catalog_matrix()
+    assert get_catalog_matrix() is matrix
+    Recipe.objects.all().update_ingredients_bitsets()
+    assert get_catalog_matrix() is not matrix
+
+
+def test_changing_the_ingredient_of_a_fridge_ingredient_refreshes_both():
+    gramme, carottes, _ = _dataset_for_stored_feasibility_tests()
+    fridge_ingredient = FridgeIngredientFactory(
+        ingredient=carottes, amount=500, unit=gramme
+    )
+    assert FeasibleRecipe.objects.count() == 1
+    fridge_ingredient = FridgeIngredient.objects.get(pk=fridge_ingredient.pk)
+    fridge_ingredient.ingredient = IngredientFactory(name="Navets")
+    fridge_ingredient.save()
+    assert not FeasibleRecipe.objects.exists()
+    assert not compute_feasible_recipes().exists()
+
+
+def test_changing_the_ratio_of_a_unit_refreshes_the_recipes():
+    gramme, carottes, _ = _dataset_for_stored_feasibility_tests()
+    kilogramme = UnitFactory(abbreviation="kg", rapport=1000, type=gramme.type)
+    FridgeIngredientFactory(ingredient=carottes, amount=1, unit=kilogramme)
+    assert FeasibleRecipe.objects.count() == 1
+    kilogramme.rapport = 1
+    kilogramme.save()
+    assert not FeasibleRecipe.objects.exists()
+    assert not compute_feasible_recipes().exists()
+
+
+def test_renaming_an_ingredient_refreshes_the_priority_ingredient():
+    gramme, carottes, _ = _dataset_for_stored_feasibility_tests()
+    FridgeIngredientFactory(ingredient=carottes, amount=500, unit=gramme)
+    carottes.name = "Carottes nouvelles"
+    carottes.save()
+    assert FeasibleRecipe.objects.get().priority_ingredient == "Carottes nouvelles"
@@ -1,9 +1,15 @@
 import datetime
+import threading
+import uuid
+from decimal import Decimal
 
 import pytest
 from catalogs.tests.factories import IngredientFactory
+from django.db import IntegrityError, NotSupportedError, connection
+from fridge import bulk
 from fridge.models import FridgeIngredient
 from units.tests.factories import UnitFactory, UnitTypeFactory
+from versions.models import VersionStamp
 
 from .factories import FridgeIngredientFactory
 
@@ -79,3 +85,260 @@ def test_adding_ingredients_that_are_merged_sets_the_amount_to_the_sum_of_all_qu
     )
     assert float(FridgeIngredient.objects.first().amount) == 13.54
     assert FridgeIngredient.objects.first().unit.abbreviation == "kg"
+
+
+def test_adding_a_mergeable_ingredient_gives_the_merged_one_with_a_single_statement(
+    django_assert_max_num_queries,
+):
+    type_mass = UnitTypeFactory(name="masse")
+    unit_kg = UnitFactory(type=type_mass, abbreviation="kg", rapport=1000)
+    unit_g = UnitFactory(type=type_mass, abbreviation="g", rapport=1)
+    ingredient = IngredientFactory()
+    existing = FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=2,
+        unit=unit_kg,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    with django_assert_max_num_queries(20) as captured:
+        merged = FridgeIngredient.objects.create(
+            ingredient=ingredient,
+            amount=500,
+            unit=unit_g,
+            expiration_date=datetime.date(2030, 7, 20),
+        )
+    fridge_writes = [
+        query["sql"].split()[0]
+        for query in captured.captured_queries
+        if query["sql"].split()[:3]
+        in (
+            ["INSERT", "INTO", "fridge_fridgeingredient"],
+            ["UPDATE", '"fridge_fridgeingredient"', "SET"],
+        )
+    ]
+    assert fridge_writes == ["INSERT"]
+    assert merged.pk == existing.pk
+    assert merged.amount == Decimal("2.5")
+    assert merged.unit_id == unit_kg.id
+    assert merged.created == existing.created
+
+
+def test_merges_round_the_amounts_alike_in_the_database_and_in_bulk():
+    type_mass = UnitTypeFactory(name="masse")
+    unit_kg = UnitFactory(type=type_mass, abbreviation="kg", rapport=1000)
+    unit_g = UnitFactory(type=type_mass, abbreviation="g", rapport=1)
+    ingredients = [IngredientFactory(), IngredientFactory()]
+    for ingredient in ingredients:
+        FridgeIngredientFactory(
+            ingredient=ingredient,
+            amount=1,
+            unit=unit_kg,
+            expiration_date=datetime.date(2030, 7, 20),
+        )
+    FridgeIngredientFactory(
+        ingredient=ingredients[0],
+        amount=5,
+        unit=unit_g,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    bulk.add_fridge_ingredients(
+        [
+            {
+                "ingredient": ingredients[1],
+                "amount": Decimal("5"),
+                "unit": unit_g,
+                "expiration_date": datetime.date(2030, 7, 20),
+            }
+        ]
+    )
+    assert list(FridgeIngredient.objects.values_list("amount", flat=True)) == [
+        Decimal("1.01"),
+        Decimal("1.01"),
+    ]
+
+
+def test_bulk_additions_merge_the_fridge_ingredients_inserted_meanwhile(monkeypatch):
+    unit_g = UnitFactory(abbreviation="g", rapport=1)
+    ingredient = IngredientFactory()
+    FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=100,
+        unit=unit_g,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    lock_fridge_ingredients = bulk._lock_fridge_ingredients
+    reads = []
+
+    def lock_fridge_ingredients_before_the_concurrent_insertion(keys):
+        reads.append(keys)
+        # the first read misses the fridge ingredient, as if it were inserted
+        # by a concurrent transaction just after it
+        return lock_fridge_ingredients(keys) if len(reads) > 1 else {}
+
+    monkeypatch.setattr(
+        bulk,
+        "_lock_fridge_ingredients",
+        lock_fridge_ingredients_before_the_concurrent_insertion,
+    )
+    [(fridge_ingredient, created)] = bulk.add_fridge_ingredients(
+        [
+            {
+                "ingredient": ingredient,
+                "amount": Decimal("50"),
+                "unit": unit_g,
+                "expiration_date": datetime.date(2030, 7, 20),
+            }
+        ]
+    )
+    assert (len(reads), created, fridge_ingredient.amount) == (2, False, 150)
+    assert list(FridgeIngredient.objects.values_list("amount", flat=True)) == [150]
+
+
+def test_the_database_rejects_unmerged_duplicates():
+    fridge_ingredient = FridgeIngredientFactory()
+    duplicate = FridgeIngredient(
+        id=uuid.uuid4(),
+        ingredient=fridge_ingredient.ingredient,
+        amount=1,
+        unit=fridge_ingredient.unit,
+        unit_type=fridge_ingredient.unit_type,
+        expiration_date=fridge_ingredient.expiration_date,
+    )
+    with pytest.raises(IntegrityError):
+        FridgeIngredient.objects.bulk_create([duplicate])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_additions_of_mergeable_ingredients_are_merged():
+    type_mass = UnitTypeFactory(name="masse")
+    unit_g = UnitFactory(type=type_mass, abbreviation="g", rapport=1)
+    ingredient = IngredientFactory()
+    errors = []
+
+    def add():
+        try:
+            FridgeIngredient.objects.create(
+                ingredient=ingredient,
+                amount=1,
+                unit=unit_g,
+                expiration_date=datetime.date(2030, 7, 20),
+            )
+        except Exception as error:  # noqa: B902
+            errors.append(error)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=add) for _ in range(30)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert list(FridgeIngredient.objects.values_list("amount", flat=True)) == [30]
+
+
+def test_changing_the_type_of_a_unit_changes_the_unit_type_of_fridge_ingredients():
+    fridge_ingredient = FridgeIngredientFactory()
+    other_type = UnitTypeFactory(name="volume")
+    fridge_ingredient.unit.type = other_type
+    fridge_ingredient.unit.save()
+    fridge_ingredient.refresh_from_db()
+    assert fridge_ingredient.unit_type == other_type
+
+
+def test_saving_a_unit_with_the_same_type_leaves_the_fridge_ingredients_alone():
+    fridge_ingredient = FridgeIngredientFactory()
+    unit = type(fridge_ingredient.unit).objects.get(pk=fridge_ingredient.unit_id)
+    versions = VersionStamp.objects.validators(["fridge"])[0]
+    unit.name = "Autre nom"
+    unit.save()
+    assert VersionStamp.objects.validators(["fridge"])[0] == versions
+
+
+def test_adding_a_fridge_ingredient_requires_insert_returning(monkeypatch):
+    monkeypatch.setattr(connection.features, "can_return_columns_from_insert", False)
+    with pytest.raises(NotSupportedError):
+        FridgeIngredientFactory()
+    assert not FridgeIngredient.objects.exists()
+
+
+def test_changing_the_type_of_a_unit_merges_the_fridge_ingredients_it_makes_mergeable():
+    masse = UnitTypeFactory(name="masse")
+    gramme = UnitFactory(type=masse, abbreviation="g", rapport=1)
+    piece = UnitFactory(abbreviation="pièce(s)", rapport=50)
+    ingredient = IngredientFactory()
+    FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=100,
+        unit=gramme,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=2,
+        unit=piece,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    moved = FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=1,
+        unit=piece,
+        expiration_date=datetime.date(2030, 7, 27),
+    )
+    piece.type = masse
+    piece.save()
+    assert sorted(
+        FridgeIngredient.objects.values_list(
+            "expiration_date", "amount", "unit", "unit_type"
+        )
+    ) == [
+        (datetime.date(2030, 7, 20), Decimal("4"), piece.id, masse.id),
+        (datetime.date(2030, 7, 27), Decimal("1"), piece.id, masse.id),
+    ]
+    assert FridgeIngredient.objects.filter(pk=moved.pk).exists()
+
+
+def test_stock_sums_converted_amounts_of_same_ingredient_and_unit_type():
+    type_mass = UnitTypeFactory(name="masse")
+    unit_kg = UnitFactory(type=type_mass, abbreviation="kg", rapport=1000)
+    unit_g = UnitFactory(type=type_mass, abbreviation="g", rapport=1)
+    ingredient = IngredientFactory(name="Navet")
+    FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=2,
+        unit=unit_kg,
+        expiration_date=datetime.date(2030, 7, 20),
+    )
+    FridgeIngredientFactory(
+        ingredient=ingredient,
+        amount=400,
+        unit=unit_g,
+        expiration_date=datetime.date(2030, 7, 10),
+    )
+    stock = list(FridgeIngredient.objects.stock())
+    assert len(stock) == 1
+    assert stock[0]["ingredient__name"] == "Navet"
+    assert stock[0]["unit__type__name"] == "masse"
+    assert stock[0]["canonical_amount"] == 2400
+    assert stock[0]["earliest_expiration_date"] == datetime.date(2030, 7, 10)
+
+
+def test_stock_separates_ingredients_and_unit_types():
+    type_mass = UnitTypeFactory(name="masse")
+    type_pieces = UnitTypeFactory(name="pièce(s)")
+    unit_g = UnitFactory(type=type_mass, abbreviation="g", rapport=1)
+    unit_pieces = UnitFactory(type=type_pieces, abbreviation="pièce(s)", rapport=1)
+    navet = IngredientFactory(name="Navet")
+    carottes = IngredientFactory(name="Carottes")
+    FridgeIngredientFactory(ingredient=navet, amount=100, unit=unit_g)
+    FridgeIngredientFactory(ingredient=navet, amount=3, unit=unit_pieces)
+    FridgeIngredientFactory(ingredient=carottes, amount=200, unit=unit_g)
+    stock = {
+        (row["ingredient__name"], row["unit__type__name"]): row["canonical_amount"]
+        for row in FridgeIngredient.objects.stock()
+    }
+    assert stock == {
+        ("Navet", "masse"): 100,
+        ("Navet", "pièce(s)"): 3,
+        ("Carottes", "masse"): 200,
+    }
@@ -12,3 +12,23 @@ def test_recipe_detail_resolve_does_not_raise_404(fridge_ingredient):
 def test_consume_ingredients_recipe_resolve_does_not_raise_404(recipe_id):
     url = f"/api/fridge/recipes/{recipe_id}/consume/"
     assert resolve(url)
+
+
+def test_almost_feasible_recipes_resolve_does_not_raise_404():
+    assert resolve("/api/fridge/recipes/almost-feasible/")
+
+
+def test_consume_recipes_resolve_does_not_raise_404():
+    assert resolve("/api/fridge/recipes/consume/")
+
+
+def test_consume_ingredients_preview_resolve_does_not_raise_404(recipe_id):
+    assert resolve(f"/api/fridge/recipes/{recipe_id}/consume/preview/")
+
+
+def test_expiring_fridge_ingredients_resolve_does_not_raise_404():
+    assert resolve("/api/fridge/ingredients/expiring/")
+
+
+def test_fridge_events_resolve_does_not_raise_404():
+    assert resolve("/api/fridge/events/")
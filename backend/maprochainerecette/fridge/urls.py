@@ -1,5 +1,13 @@
 from django.urls import path
-from fridge.api import ConsumeIngredients, FridgeIngredientViewSet, FridgeRecipes
+from fridge.api import (
+    AlmostFeasibleRecipes,
+    ConsumeIngredients,
+    ConsumeIngredientsPreview,
+    ConsumeRecipes,
+    FridgeEvents,
+    FridgeIngredientViewSet,
+    FridgeRecipes,
+)
 from rest_framework import routers
 
 router = routers.DefaultRouter()
@@ -8,10 +16,26 @@ router.register("ingredients", FridgeIngredientViewSet, "ingredients_fridge")
 urlpatterns = router.urls
 
 urlpatterns += [
+    path(route="events/", view=FridgeEvents.as_view(), name="fridge_events"),
     path(route="recipes/", view=FridgeRecipes.as_view(), name="recipes_fridge_list"),
+    path(
+        route="recipes/almost-feasible/",
+        view=AlmostFeasibleRecipes.as_view(),
+        name="recipes_fridge_almost_feasible",
+    ),
+    path(
+        route="recipes/consume/",
+        view=ConsumeRecipes.as_view(),
+        name="recipes_consume_batch",
+    ),
     path(
         route="recipes/<uuid:recipe_id>/consume/",
         view=ConsumeIngredients.as_view(),
         name="recipes_consume",
     ),
+    path(
+        route="recipes/<uuid:recipe_id>/consume/preview/",
+        view=ConsumeIngredientsPreview.as_view(),
+        name="recipes_consume_preview",
+    ),
 ]
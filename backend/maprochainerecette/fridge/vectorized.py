@@ -0,0 +1,279 @@
+"""Vectorized matching engine, selected with FRIDGE_MATCHING_ENGINE = "numpy".
+
+The catalog is kept in memory as a sparse recipe × (ingredient, unit type) matrix
+of the canonical amounts of the recipe ingredients (amount * Unit.rapport), in
+coordinate format: one entry for each recipe ingredient. At each matching, the
+fridge stock is turned into vectors indexed like the columns of the matrix, and
+the feasibility, the unsure ingredients and the priority ingredient of every
+recipe are computed with vectorized operations. Only the recipes whose stored
+ingredients bitset is covered by the fridge ingredients are compared to the stock.
+The bitsets are kept as a recipe × word matrix of 64 bits words, so that they are
+all checked at once.
+
+The matrix is rebuilt when the catalog signature changes, so that a process
+never uses a catalog modified by another process.
+
+"""
+import datetime
+
+from catalogs import bitsets
+from catalogs.models import Ingredient, Recipe, RecipeIngredient
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from fridge.models import FridgeIngredient
+from units.models import Unit
+from versions.models import VersionStamp
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None  # type: ignore
+
+NO_DATE = datetime.date.max
+
+
+class CatalogMatrix:
+    """Sparse matrix of the canonical amounts of the ingredients of the recipes.
+
+    Args:
+        entries: an iterable of tuples (recipe id, ingredient id, ingredient name,
+            ingredient bit, unit type id, canonical amount), one for each recipe
+            ingredient.
+        recipe_bitsets: a dictionary giving the stored ingredients bitset of each
+            recipe id.
+
+    """
+
+    def __init__(self, entries, recipe_bitsets):
+        self.recipe_positions: dict = {}
+        self.ingredient_names: list = []
+        self.ingredient_bits: dict = {}
+        self.ingredient_positions: dict = {}
+        self.column_positions: dict = {}
+        recipes, ingredients, columns, amounts = [], [], [], []
+        for recipe_id, ingredient_id, name, bit, unit_type_id, amount in entries:
+            recipes.append(self._position(self.recipe_positions, recipe_id))
+            ingredient = self._position(self.ingredient_positions, ingredient_id)
+            if ingredient == len(self.ingredient_names):
+                self.ingredient_names.append(name)
+                self.ingredient_bits[ingredient_id] = bit
+            ingredients.append(ingredient)
+            columns.append(
+                self._position(self.column_positions, (ingredient_id, unit_type_id))
+            )
+            amounts.append(float(amount))
+        self.recipe_ids = list(self.recipe_positions)
+        decoded_bitsets = [
+            bitsets.decode(recipe_bitsets[recipe_id]) for recipe_id in self.recipe_ids
+        ]
+        self.words_count = (
+            max((bitset.bit_length() for bitset in decoded_bitsets), default=0) // 64
+            + 1
+        )
+        self.recipe_words = self._words(decoded_bitsets).reshape(
+            len(self.recipe_ids), self.words_count
+        )
+        ingredient_ids = list(self.ingredient_positions)
+        self.ingredient_ranks = np.argsort(
+            sorted(range(len(ingredient_ids)), key=ingredient_ids.__getitem__)
+        )
+        self.entry_recipes = np.array(recipes, dtype=np.int64)
+        self.entry_ingredients = np.array(ingredients, dtype=np.int64)
+        self.entry_columns = np.array(columns, dtype=np.int64)
+        self.entry_amounts = np.array(amounts, dtype=np.float64)
+
+    @staticmethod
+    def _position(positions, key):
+        return positions.setdefault(key, len(positions))
+
+    def _words(self, bitsets_list):
+        # the bits beyond the words of the recipes bitsets are needed by no recipe
+        mask = (1 << (64 * self.words_count)) - 1
+        return np.frombuffer(
+            b"".join(
+                (bitset & mask).to_bytes(8 * self.words_count, "little")
+                for bitset in bitsets_list
+            ),
+            dtype="<u8",
+        )
+
+    @classmethod
+    def load(cls):
+        """Build the matrix of the whole catalog, with two queries."""
+        recipe_ingredients = Recipe.ingredients.through.objects.annotate(
+            canonical_amount=models.F("recipeingredient__amount")
+            * models.F("recipeingredient__unit__rapport")
+        ).values_list(
+            "recipe_id",
+            "recipeingredient__ingredient_id",
+            "recipeingredient__ingredient__name",
+            "recipeingredient__ingredient__bit",
+            "recipeingredient__unit__type_id",
+            "canonical_amount",
+        )
+        recipe_bitsets = dict(Recipe.objects.values_list("id", "ingredients_bitset"))
+        return cls(recipe_ingredients.iterator(), recipe_bitsets)
+
+    def match(self, recipe_ids):
+        """Match the given recipes against the current fridge stock.
+
+        The recipes whose ingredients are not all in the fridge are discarded
+        with their bitsets, before any amount is compared.
+
+        Args:
+            recipe_ids: the ids of the recipes to match.
+
+        Returns:
+            A list of dictionaries, one for each feasible recipe, with the keys
+            ``pk``, ``priority_ingredient``, ``priority_date`` and ``unsure_ingredients``.
+
+        """
+        (
+            stock_amounts,
+            stock_dates,
+            unit_types_counts,
+            ingredient_dates,
+            available_bitset,
+        ) = self._stock_vectors()
+        covered = self._covered(available_bitset) & self._selection(recipe_ids)
+        entries = np.flatnonzero(covered[self.entry_recipes])
+        if not len(entries):
+            return []
+        entry_recipes = self.entry_recipes[entries]
+        entry_ingredients = self.entry_ingredients[entries]
+        entry_columns = self.entry_columns[entries]
+        same_unit_type = stock_dates[entry_columns] != np.datetime64(NO_DATE)
+        enough = same_unit_type & (
+            stock_amounts[entry_columns] >= self.entry_amounts[entries]
+        )
+        other_unit_type = unit_types_counts[entry_ingredients] - same_unit_type > 0
+        unsure = ~enough & other_unit_type
+        entry_dates = np.where(
+            enough, stock_dates[entry_columns], ingredient_dates[entry_ingredients]
+        )
+        missing = np.bincount(
+            entry_recipes[~(enough | other_unit_type)], minlength=len(self.recipe_ids)
+        )
+        feasible = (missing == 0) & covered
+        # the first entry of each recipe once sorted by date, then by ingredient id,
+        # is its priority ingredient
+        order = np.lexsort(
+            (self.ingredient_ranks[entry_ingredients], entry_dates, entry_recipes)
+        )
+        sorted_recipes = entry_recipes[order]
+        first_entries = order[np.r_[True, sorted_recipes[1:] != sorted_recipes[:-1]]]
+        priority_entries = first_entries[feasible[entry_recipes[first_entries]]]
+        unsure_names: dict = {}
+        for entry in np.flatnonzero(unsure & feasible[entry_recipes]).tolist():
+            unsure_names.setdefault(int(entry_recipes[entry]), []).append(
+                self.ingredient_names[entry_ingredients[entry]]
+            )
+        return [
+            {
+                "pk": self.recipe_ids[recipe],
+                "priority_ingredient": self.ingredient_names[ingredient],
+                "priority_date": date,
+                "unsure_ingredients": unsure_names.get(recipe, []),
+            }
+            for recipe, ingredient, date in zip(
+                entry_recipes[priority_entries].tolist(),
+                entry_ingredients[priority_entries].tolist(),
+                entry_dates[priority_entries].astype(object),
+            )
+        ]
+
+    def _stock_vectors(self):
+        columns_count = len(self.column_positions)
+        ingredients_count = len(self.ingredient_positions)
+        stock_amounts = np.zeros(columns_count, dtype=np.float64)
+        stock_dates = np.full(columns_count, NO_DATE, dtype="datetime64[D]")
+        unit_types_counts = np.zeros(ingredients_count, dtype=np.int64)
+        ingredient_dates = np.full(ingredients_count, NO_DATE, dtype="datetime64[D]")
+        available_bits = set()
+        for stock in FridgeIngredient.objects.stock():
+            ingredient = self.ingredient_positions.get(stock["ingredient"])
+            if ingredient is None:
+                continue
+            bit = self.ingredient_bits[stock["ingredient"]]
+            # the ingredients added to a recipe without updating its ingredients
+            # index (in bulk, from the admin) have no bit yet, and are not in any
+            # recipe bitset
+            if bit is not None:
+                available_bits.add(bit)
+            date = np.datetime64(stock["earliest_expiration_date"])
+            unit_types_counts[ingredient] += 1
+            ingredient_dates[ingredient] = min(ingredient_dates[ingredient], date)
+            column = self.column_positions.get(
+                (stock["ingredient"], stock["unit__type"])
+            )
+            if column is not None:
+                stock_amounts[column] = float(stock["canonical_amount"])
+                stock_dates[column] = date
+        return (
+            stock_amounts,
+            stock_dates,
+            unit_types_counts,
+            ingredient_dates,
+            bitsets.to_bitset(available_bits),
+        )
+
+    def _covered(self, available_bitset):
+        available_words = self._words([available_bitset])
+        return ~np.any(self.recipe_words & ~available_words, axis=1)
+
+    def _selection(self, recipe_ids):
+        selection = np.zeros(len(self.recipe_ids), dtype=bool)
+        positions = [
+            self.recipe_positions[recipe_id]
+            for recipe_id in recipe_ids
+            if recipe_id in self.recipe_positions
+        ]
+        selection[positions] = True
+        return selection
+
+
+_catalog_cache: dict = {"signature": None, "matrix": None}
+
+
+def get_catalog_matrix():
+    """Give the matrix of the catalog, rebuilding it if the catalog has changed."""
+    signature = _catalog_signature()
+    if _catalog_cache["signature"] != signature:
+        _catalog_cache["matrix"] = CatalogMatrix.load()
+        _catalog_cache["signature"] = signature
+    return _catalog_cache["matrix"]
+
+
+def _catalog_signature():
+    # Recipe ingredients are recreated when a recipe is updated and unlinked when
+    # it is deleted, units rapports can be changed from the admin, and the matrix
+    # keeps the names of the ingredients. The bits and the bitsets are written
+    # with bulk updates, which bump the "ingredient_bits" stamp instead.
+    return (
+        VersionStamp.objects.validators(["ingredient_bits"])[0],
+        Recipe.ingredients.through.objects.count(),
+        RecipeIngredient.objects.aggregate(models.Max("modified"))["modified__max"],
+        Unit.objects.aggregate(models.Max("modified"))["modified__max"],
+        Ingredient.objects.aggregate(models.Max("modified"))["modified__max"],
+    )
+
+
+def match_with_numpy(recipes):
+    """Match the given recipes against the fridge stock with vectorized operations.
+
+    Args:
+        recipes: the queryset of the recipes to match.
+
+    Returns:
+        A list of dictionaries, one for each feasible recipe, with the keys
+        ``pk``, ``priority_ingredient``, ``priority_date`` and ``unsure_ingredients``.
+
+    Raises:
+        ImproperlyConfigured: NumPy is not installed.
+
+    """
+    if np is None:
+        raise ImproperlyConfigured(
+            'NumPy must be installed to use the "numpy" FRIDGE_MATCHING_ENGINE.'
+        )
+    return get_catalog_matrix().match(recipes.values_list("pk", flat=True))
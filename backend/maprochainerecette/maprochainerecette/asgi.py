@@ -9,8 +9,60 @@ https://docs.djangoproject.com/en/3.0/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "maprochainerecette.settings")
 
+
+class StreamingASGIHandler(ASGIHandler):
+    """ASGI handler that reads the streaming responses out of the event loop.
+
+    The handler of Django 4.1 iterates the streaming responses in the event loop,
+    so that a response whose iterator waits, like the stream of the fridge events
+    (see fridge.api.FridgeEvents), would stall all the other requests of the
+    process. Each part of a streaming response is read in a thread instead, like
+    Django 4.2 does for synchronous iterators.
+
+    """
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode("ascii")
+            if isinstance(value, str):
+                value = value.encode("latin1")
+            response_headers.append((bytes(header), bytes(value)))
+        for cookie in response.cookies.values():
+            response_headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": response_headers,
+            }
+        )
+        parts = iter(response)
+        read = sync_to_async(next, thread_sensitive=False)
+        while (part := await read(parts, None)) is not None:
+            for chunk, _ in self.chunk_bytes(part):
+                await send(
+                    {"type": "http.response.body", "body": chunk, "more_body": True}
+                )
+        await send({"type": "http.response.body"})
+        await sync_to_async(response.close, thread_sensitive=True)()
+
+
+def get_asgi_application():
+    django.setup(set_prefix=False)
+    return StreamingASGIHandler()
+
+
 application = get_asgi_application()
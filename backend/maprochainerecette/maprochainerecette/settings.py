@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     "fridge",
     "units",
     "users",
+    "versions",
 ]
 
 MIDDLEWARE = [
@@ -126,6 +127,22 @@ USE_TZ = True
 STATIC_URL = "/static/"
 
 
+# Engine used to match the recipes against the fridge: "sql" or "numpy"
+
+FRIDGE_MATCHING_ENGINE = env("FRIDGE_MATCHING_ENGINE", default="sql")
+
+# Broker of the events of the fridge (see fridge.events). The in-process one only
+# works when the application runs in a single process: a subscriber only gets
+# the changes made by its own process. The system checks reject it when the
+# number of worker processes, read by gunicorn and uvicorn from WEB_CONCURRENCY,
+# is more than 1.
+
+FRIDGE_EVENT_BROKER = env(
+    "FRIDGE_EVENT_BROKER", default="fridge.events.InProcessBroker"
+)
+WEB_CONCURRENCY = env.int("WEB_CONCURRENCY", default=1)
+
+
 DJOSER = {
     "PASSWORD_RESET_CONFIRM_URL": "reset-password/confirm/{uid}/{token}",
     "USERNAME_RESET_CONFIRM_URL": "username/reset/confirm/{uid}/{token}",
@@ -1,10 +1,12 @@
 from rest_framework import authentication, permissions, viewsets
 from units.models import Unit
 from units.serializers import UnitSerializer
+from versions.mixins import ConditionalListMixin
 
 
-class UnitViewSet(viewsets.ReadOnlyModelViewSet):
+class UnitViewSet(ConditionalListMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Unit.objects.all()
     permission_classes = [permissions.AllowAny]
     authentication_classes = [authentication.TokenAuthentication]
     serializer_class = UnitSerializer
+    versioned_by = ("units",)
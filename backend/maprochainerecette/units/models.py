@@ -14,6 +14,18 @@ class Unit(TimeStampedModel):
     def __str__(self) -> str:
         return self.abbreviation
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remembered so that the fridge ingredients in the unit are only moved to
+        # its unit type when it is changed (see fridge.signals)
+        instance._stored_type_id = instance.__dict__.get("type_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._stored_type_id = self.type_id
+
 
 class UnitType(TimeStampedModel):
     name = models.CharField(
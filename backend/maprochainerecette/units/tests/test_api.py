@@ -27,6 +27,15 @@ def test_unit_list_has_correct_fields():
     assert response.data[0] == "kg"
 
 
+def test_unit_list_returns_304_when_not_modified_since_last_request():
+    UnitFactory(abbreviation="kg")
+    url = _get_unit_list_absolute_url()
+    view = UnitViewSet.as_view({"get": "list"})
+    last_modified = view(APIRequestFactory().get(url))["Last-Modified"]
+    request = APIRequestFactory().get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+    assert view(request).status_code == 304
+
+
 def _get_unit_list_absolute_url():
     view = UnitViewSet()
     view.basename = "units"
@@ -0,0 +1,8 @@
+from django.apps import AppConfig
+
+
+class VersionsConfig(AppConfig):
+    name = "versions"
+
+    def ready(self):
+        from versions import signals  # noqa: F401
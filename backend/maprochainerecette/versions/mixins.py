@@ -0,0 +1,28 @@
+import hashlib
+
+from django.views.decorators.http import condition
+from versions.models import VersionStamp
+
+
+class ConditionalListMixin:
+    """Answer the conditional GET requests of a list view with a 304 when possible.
+
+    The ETag and Last-Modified validators of the list are built from the version
+    stamps named in ``versioned_by`` (see versions.signals.VERSIONED_MODELS), so
+    that checking them costs a single query, and a client that already has the
+    current list gets a 304 without any queryset being evaluated or serialized.
+
+    """
+
+    versioned_by: tuple = ()
+
+    def list(self, request, *args, **kwargs):
+        versions, last_modified = VersionStamp.objects.validators(self.versioned_by)
+        etag = hashlib.sha256(
+            f"{request.get_full_path()} {versions}".encode()
+        ).hexdigest()
+        list_view = super().list  # type: ignore[misc]
+        return condition(
+            etag_func=lambda *args, **kwargs: etag,
+            last_modified_func=lambda *args, **kwargs: last_modified,
+        )(list_view)(request, *args, **kwargs)
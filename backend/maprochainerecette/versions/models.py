@@ -0,0 +1,59 @@
+import uuid
+
+from django.db import models
+from django.utils import timezone
+from model_utils.models import TimeStampedModel
+
+
+class VersionStampQuerySet(models.QuerySet):
+    def bump(self, name):
+        """Increment the version stamp with the given name, creating it if needed."""
+        updated = self.filter(name=name).update(
+            version=models.F("version") + 1, modified=timezone.now()
+        )
+        if not updated:
+            _, created = self.get_or_create(name=name, defaults={"version": 1})
+            if not created:
+                # created by a concurrent bump in the meantime
+                self.bump(name)
+
+    def validators(self, names):
+        """Give the validators of the data versioned by the given stamps.
+
+        Args:
+            names: the names of the version stamps.
+
+        Returns:
+            A tuple (versions, last_modified): the versions of the stamps, in the
+            order of the names, and the date of the last modification of one of
+            them (None if none of them has been bumped yet).
+
+        """
+        stamps = {
+            name: (version, modified)
+            for name, version, modified in self.filter(name__in=names).values_list(
+                "name", "version", "modified"
+            )
+        }
+        versions = tuple(stamps.get(name, (0, None))[0] for name in names)
+        dates = [modified for _, modified in stamps.values()]
+        return versions, max(dates, default=None)
+
+
+class VersionStamp(TimeStampedModel):
+    """Version of a group of models, bumped each time one of their rows is saved or deleted.
+
+    The groups and their models are listed in versions.signals.VERSIONED_MODELS.
+    Changes that do not send the model signals (bulk_create, update on a
+    queryset, ...) do not bump the version.
+
+    """
+
+    name = models.CharField("Name of the group of models", max_length=255, unique=True)
+    version = models.PositiveBigIntegerField("Version", default=0)
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    objects = models.Manager.from_queryset(VersionStampQuerySet)()
+
+    def __str__(self) -> str:
+        return f"{self.name} v{self.version}"
@@ -0,0 +1,46 @@
+from django.apps import apps
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from versions.models import VersionStamp
+
+# Models whose changes bump each version stamp, many to many fields included.
+VERSIONED_MODELS = {
+    "catalogs": [
+        "catalogs.Category",
+        "catalogs.Ingredient",
+        "catalogs.Recipe",
+        "catalogs.Recipe.categories",
+        "catalogs.Recipe.ingredients",
+        "catalogs.RecipeIngredient",
+    ],
+    "fridge": ["fridge.FridgeIngredient"],
+    "units": ["units.Unit", "units.UnitType"],
+}
+
+
+def _bump_receiver(name):
+    def bump_version_stamp(sender, action=None, **kwargs):
+        # m2m_changed is sent before and after each change
+        if action is None or action.startswith("post_"):
+            VersionStamp.objects.bump(name)
+
+    return bump_version_stamp
+
+
+for name, models in VERSIONED_MODELS.items():
+    receiver = _bump_receiver(name)
+    for model_path in models:
+        app_label, model_name, *field_name = model_path.split(".")
+        model = apps.get_model(app_label, model_name)
+        if field_name:
+            m2m_changed.connect(
+                receiver,
+                sender=getattr(model, field_name[0]).through,
+                dispatch_uid=f"versions_{model_path}",
+            )
+        else:
+            post_save.connect(
+                receiver, sender=model, dispatch_uid=f"versions_save_{model_path}"
+            )
+            post_delete.connect(
+                receiver, sender=model, dispatch_uid=f"versions_delete_{model_path}"
+            )
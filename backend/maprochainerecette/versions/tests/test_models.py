@@ -0,0 +1,41 @@
+import pytest
+from catalogs.tests.factories import CategoryFactory, RecipeFactory
+from units.tests.factories import UnitFactory
+from versions.models import VersionStamp
+
+pytestmark = pytest.mark.django_db
+
+
+def test_bump_creates_then_increments_version_stamp():
+    VersionStamp.objects.bump("stamp")
+    assert VersionStamp.objects.get(name="stamp").version == 1
+    VersionStamp.objects.bump("stamp")
+    assert VersionStamp.objects.get(name="stamp").version == 2
+
+
+def test_saving_and_deleting_versioned_models_bumps_their_version_stamp():
+    recipe = RecipeFactory()
+    versions, _ = VersionStamp.objects.validators(["catalogs", "units"])
+    recipe.title = "New title"
+    recipe.save()
+    new_versions, _ = VersionStamp.objects.validators(["catalogs", "units"])
+    assert new_versions[0] > versions[0]
+    assert new_versions[1] == versions[1]
+    recipe.delete()
+    assert VersionStamp.objects.validators(["catalogs"])[0][0] > new_versions[0]
+
+
+def test_changing_many_to_many_fields_bumps_version_stamp():
+    recipe = RecipeFactory()
+    category = CategoryFactory()
+    versions, _ = VersionStamp.objects.validators(["catalogs"])
+    recipe.categories.add(category)
+    assert VersionStamp.objects.validators(["catalogs"])[0][0] == versions[0] + 1
+
+
+def test_validators_of_unknown_stamps_have_version_0_and_no_date():
+    UnitFactory()
+    versions, last_modified = VersionStamp.objects.validators(["unknown", "units"])
+    assert versions[0] == 0
+    assert versions[1] > 0
+    assert last_modified == VersionStamp.objects.get(name="units").modified